@@ -7,9 +7,9 @@
 
 # 导出主要组件
 from .config import load_config, get_config, get_value
-from .llm import LLMInterface, get_llm_interface, send_message
+from .llm import LLMInterface, get_llm_interface, send_message, send_message_async
 from .workflow import WorkflowManager, get_workflow_manager
 
 # 添加 ↓
 from .core.runner import run_main_loop
-from .interaction.cli import get_user_input, show_response, show_error
+from .interaction.cli import get_user_input, get_user_input_async, show_response, show_error
@@ -12,15 +12,36 @@
 import logging
 import json
 import datetime  # 添加datetime模块导入
-from typing import Dict, Any, List, Optional
+import re
+from typing import Dict, Any, List, Optional, Tuple
 
+from ..config import get_value
 from ..workflow import get_workflow_manager
 from ..prompt import SYSTEM_PROMPT
+from ..prompt.ACC import (
+    DATE_TIME_IN_CONTEXT,
+    INLINE_SCHEMA_RULE,
+    MORE_TOOLS_STUB,
+    NATIVE_TASK_DESCRIPTION,
+    SEARCH_FIRST_PATTERNS,
+)
+from ..prompt.compiler import PromptTemplate
+from ..prompt.tools import ACC_FUNCTION_TOOLS, ACC_FUNCTION_TOOLS_INLINE, ACC_FUNCTION_NAMES
+from ..prompt.user import CURRENT_CONTEXT_PROMPT
 from ..core.tool_discovery import ToolDiscovery
+from ..core.tool_index import ToolIndex
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
 
+# OpenAI函数名称的合法格式
+_FUNCTION_NAME_RE = re.compile(r"^[a-zA-Z0-9_-]{1,64}$")
+
+# 系统提示词中的占位符
+_PROMPT_FIELDS = ("system_info", "user_name", "tools_list", "date_time")
+# 易变上下文模板
+_CONTEXT_TEMPLATE = PromptTemplate.compile(CURRENT_CONTEXT_PROMPT, ("date_time", "user_status"))
+
 
 class ACCAgent:
     """ACC代理类，负责处理用户请求"""
@@ -31,6 +52,33 @@ class ACCAgent:
         self.workflow_manager = get_workflow_manager()
         # 初始化工具注册表
         self.tool_registry = {}
+        # 工具注册表版本号，每次注册表变化时递增
+        self.registry_version = 0
+        # 格式化工具列表缓存: (注册表版本, 文本)
+        self._tools_list_cache = None
+        # 提示词布局: classic（原有布局）或 prefix_cache（稳定前缀 + 尾部易变上下文）
+        self.prompt_layout = get_value("prompt", "layout", "classic")
+        # 工具调用模式: json 或 native；native 下是否把MCP工具也作为函数定义直接发送
+        self.tool_mode = get_value("llm", "tool_mode", "json")
+        self.native_mcp_tools = get_value("llm", "native_mcp_tools", False)
+        # 工具格式模式: search（先调用 search_tool_info）或 inline（直接调用，本地校验参数）
+        self.schema_mode = get_value("tools", "schema_mode", "search")
+        # 原生函数定义缓存: ((注册表版本, 工具键元组), 定义列表)
+        self._tool_definitions_cache = None
+        # 工具注册表索引缓存: ((注册表版本, 注册表id, 工具数量), 索引)
+        self._tool_index_cache = None
+        # 工具列表模式: all（列出全部工具）或 ranked（只列出与当前任务最相关的 top_k 个工具）
+        self.tool_list_mode = get_value("tools", "list_mode", "all")
+        self.tool_top_k = get_value("tools", "top_k", 12)
+        self.pinned_tools = get_value("tools", "pinned", [])
+        # 各会话当前任务选出的工具键: 会话ID -> 工具键元组（None 表示列出全部工具）
+        self._tool_selections: Dict[str, Optional[Tuple[str, ...]]] = {}
+        # 部分工具列表缓存: ((注册表版本, 工具键元组), 文本)
+        self._ranked_list_cache = None
+        # 按当前模式编译的系统提示词模板（模式在初始化后不变，只编译一次）
+        self._prompt_template: Optional[PromptTemplate] = None
+        # 填入系统信息、用户名和工具列表后的模板: ((注册表版本, 工具键元组), 模板)
+        self._static_prompt_cache = None
         logger.info("ACC代理初始化完成")
 
     async def set_tool_registry(self, tool_registry: Dict[str, Any] = None):
@@ -56,21 +104,116 @@ class ACCAgent:
             except Exception as e:
                 logger.warning(f"从MCP API获取工具注册表失败: {str(e)}")
         
+        if tool_registry != self.tool_registry:
+            self.registry_version += 1
         self.tool_registry = tool_registry
-        logger.debug(f"工具注册表已设置，工具数量: {len(self.tool_registry)}")
+        logger.debug(f"工具注册表已设置，工具数量: {len(self.tool_registry)}，版本: {self.registry_version}")
         logger.info(f"已更新工具注册表，共 {len(self.tool_registry)} 个工具")
 
-    def get_formatted_tools_list(self) -> str:
+    def get_tool_index(self) -> ToolIndex:
+        """获取工具注册表索引（注册表变化时重建）
+
+        Returns:
+            工具注册表索引
+        """
+        stamp = (self.registry_version, id(self.tool_registry), len(self.tool_registry))
+        if self._tool_index_cache is None or self._tool_index_cache[0] != stamp:
+            self._tool_index_cache = (stamp, ToolIndex.from_config(self.tool_registry))
+            logger.debug(f"工具注册表索引已重建，工具数量: {len(self.tool_registry)}")
+        return self._tool_index_cache[1]
+
+    def select_tools(self, query: str) -> Optional[Tuple[str, ...]]:
+        """按任务描述选出系统提示词中列出的工具（tools.list_mode = "ranked"）
+
+        固定列出的工具（tools.pinned）之外，再按BM25相关度选出最多 top_k 个工具，
+        结果按注册表顺序排列。
+
+        Args:
+            query: 任务描述（通常为用户消息）
+
+        Returns:
+            工具键元组；不需要筛选（all 模式或工具总数不超过上限）时返回None
+        """
+        if self.tool_list_mode != "ranked":
+            return None
+        if len(self.tool_registry) <= self.tool_top_k + len(self.pinned_tools):
+            return None
+
+        index = self.get_tool_index()
+        selected = set()
+        for name in self.pinned_tools:
+            found = index.lookup(name)
+            if found:
+                selected.add(found[0])
+        for key, _ in index.search(query, self.tool_top_k):
+            selected.add(key)
+        selection = tuple(key for key in self.tool_registry if key in selected)
+        logger.debug(f"已为当前任务选出 {len(selection)}/{len(self.tool_registry)} 个工具: {', '.join(selection)}")
+        return selection
+
+    def _current_selection(self) -> Optional[Tuple[str, ...]]:
+        """当前会话的工具选择（由 _prepare_request 按请求内容选出），尚未选择时列出全部工具"""
+        from ..memory.sessions import get_current_session
+
+        return self._tool_selections.get(get_current_session())
+
+    def get_formatted_tools_list(self, full: bool = False) -> str:
         """获取格式化的工具列表
 
+        Args:
+            full: 是否忽略当前任务的工具选择，列出全部工具
+
         Returns:
             格式化的工具列表字符串
         """
+        selection = None if full else self._current_selection()
+        if selection is not None:
+            stamp = (self.registry_version, selection)
+            if self._ranked_list_cache and self._ranked_list_cache[0] == stamp:
+                return self._ranked_list_cache[1]
+            keys = [key for key in selection if key in self.tool_registry]
+            stub = MORE_TOOLS_STUB.format(count=len(self.tool_registry) - len(keys))
+            tools_list = f"{self._render_tools_list(keys)}\n{stub}" if keys else stub
+            self._ranked_list_cache = (stamp, tools_list)
+            return tools_list
+
+        # 注册表未变化时直接返回缓存的渲染结果
+        if self._tools_list_cache and self._tools_list_cache[0] == self.registry_version:
+            return self._tools_list_cache[1]
+        tools_list = self._render_tools_list()
+        self._tools_list_cache = (self.registry_version, tools_list)
+        return tools_list
+
+    def search_tools_list(self, query: str) -> str:
+        """按关键词检索工具，返回格式化的工具列表
+
+        Args:
+            query: 关键词
+
+        Returns:
+            与关键词最相关的 top_k 个工具；没有相关工具时返回提示
+        """
+        keys = [key for key, _ in self.get_tool_index().search(query, self.tool_top_k)]
+        if not keys:
+            return f'没有找到与 "{query}" 相关的工具，可使用 "tools" 查看全部工具。'
+        return self._render_tools_list(keys)
+
+    def _render_tools_list(self, keys: Optional[List[str]] = None) -> str:
+        """渲染工具列表文本
+
+        Args:
+            keys: 要列出的工具键，默认列出注册表中的全部工具
+        """
         if not self.tool_registry:
             return "目前没有可用的工具。"
 
+        from ..function.schema import format_signature
+
+        if keys is None:
+            keys = list(self.tool_registry)
         tools_text = []
-        for i, (tool_key, tool_info) in enumerate(self.tool_registry.items(), 1):
+        for i, tool_key in enumerate(keys, 1):
+            tool_info = self.tool_registry[tool_key]
             # 检查是否为 sequentialthinking 工具，如果是则替换描述
             description = tool_info["description"]
             # if tool_info['name'] == "sequentialthinking":
@@ -80,10 +223,55 @@ class ACCAgent:
             #         "Each thought can build on, question, or revise previous insights as understanding deepens."
             #     )
 
-            tools_text.append(f"{i}. {tool_info['name']}: {description}")
+            if self.schema_mode == "inline":
+                # 直接给出参数签名，模型无需先查询工具详情
+                signature = format_signature(tool_info.get("input_schema"))
+                tools_text.append(f"{i}. {tool_info['name']}({signature}): {description}")
+            else:
+                tools_text.append(f"{i}. {tool_info['name']}: {description}")
 
         return "\n".join(tools_text)
 
+    def get_tool_definitions(self) -> List[Dict[str, Any]]:
+        """获取原生工具调用模式下发送的函数定义
+
+        始终包含ACC的五个内置函数；开启 native_mcp_tools 时追加注册表中的MCP工具
+        （ranked 模式下只追加当前任务选出的工具），
+        名称不符合函数命名规则或与内置函数重名的工具会被跳过。
+
+        Returns:
+            OpenAI格式的tools列表
+        """
+        # inline 模式下内置函数的说明不要求先调用 search_tool_info
+        function_tools = ACC_FUNCTION_TOOLS_INLINE if self.schema_mode == "inline" else ACC_FUNCTION_TOOLS
+        if not self.native_mcp_tools:
+            return function_tools
+        selection = self._current_selection()
+        stamp = (self.registry_version, selection)
+        if self._tool_definitions_cache and self._tool_definitions_cache[0] == stamp:
+            return self._tool_definitions_cache[1]
+
+        definitions = list(function_tools)
+        keys = self.tool_registry if selection is None else [key for key in selection if key in self.tool_registry]
+        for key in keys:
+            tool_info = self.tool_registry[key]
+            name = tool_info["name"]
+            if name in ACC_FUNCTION_NAMES or not _FUNCTION_NAME_RE.match(name):
+                logger.debug(f"跳过无法作为函数定义发送的工具: {name}")
+                continue
+            definitions.append(
+                {
+                    "type": "function",
+                    "function": {
+                        "name": name,
+                        "description": tool_info.get("description", ""),
+                        "parameters": tool_info.get("input_schema") or {"type": "object", "properties": {}},
+                    },
+                }
+            )
+        self._tool_definitions_cache = (stamp, definitions)
+        return definitions
+
     def _get_current_datetime(self) -> str:
         """获取当前日期时间（格式：年/月/日 时:分:秒）
 
@@ -96,21 +284,72 @@ class ACCAgent:
         now = datetime.datetime.now()
         return now.strftime("%Y年%m月%d日 %H时%M分%S秒")
 
+    def _compile_prompt_template(self) -> PromptTemplate:
+        """按工具调用模式和工具格式模式改写系统提示词，并编译为模板"""
+        template = SYSTEM_PROMPT
+
+        # 原生工具调用模式下，回复格式说明改为函数调用说明
+        if self.tool_mode == "native":
+            template = re.sub(
+                r"<task_description>.*?</task_description>",
+                lambda _: NATIVE_TASK_DESCRIPTION,
+                template,
+                count=1,
+                flags=re.DOTALL,
+            )
+
+        # 参数在本地按输入格式校验时，不再要求每次调用工具前先查询工具详情
+        if self.schema_mode == "inline":
+            template = re.sub(
+                SEARCH_FIRST_PATTERNS[0], lambda _: INLINE_SCHEMA_RULE, template, count=1
+            )
+            for pattern in SEARCH_FIRST_PATTERNS:
+                template = re.sub(
+                    pattern,
+                    "Tool arguments are validated against the tool's input schema; see the task description.",
+                    template,
+                    flags=re.DOTALL,
+                )
+        return PromptTemplate.compile(template, _PROMPT_FIELDS)
+
     def get_system_prompt(self) -> str:
-        """获取完整的系统提示词（包含工具列表、系统信息和用户名）"""
-        # 获取基础信息
-        system_info = self._get_system_info()
-        user_name = self._get_user_name()
-        tools_list = self.get_formatted_tools_list()
-        date_time = self._get_current_datetime()  # 获取当前日期时间
-
-        # 进行四重替换（添加日期时间替换）
-        return (
-            SYSTEM_PROMPT.replace("{system_info}", system_info)
-            .replace("{user_name}", user_name)
-            .replace("{tools_list}", tools_list)
-            .replace("{date_time}", date_time)  # 替换日期时间占位符
-        )
+        """获取完整的系统提示词（包含工具列表、系统信息和用户名）
+
+        系统信息、用户名和工具列表按注册表版本（及当前任务选出的工具）缓存在预编译模板中，
+        每次调用只填入日期时间。prefix_cache 布局下日期时间不写入系统提示词，
+        系统提示词只随工具注册表变化，当前时间改由 get_volatile_context 放在最新消息的末尾。
+        """
+        stamp = (self.registry_version, self._current_selection())
+        if self._static_prompt_cache is None or self._static_prompt_cache[0] != stamp:
+            if self._prompt_template is None:
+                self._prompt_template = self._compile_prompt_template()
+            static_values = {
+                "system_info": self._get_system_info(),
+                "user_name": self._get_user_name(),
+                "tools_list": self.get_formatted_tools_list(),
+            }
+            if self.prompt_layout == "prefix_cache":
+                static_values["date_time"] = DATE_TIME_IN_CONTEXT
+            self._static_prompt_cache = (stamp, self._prompt_template.partial(**static_values))
+            logger.debug(f"系统提示词模板已更新，注册表版本: {self.registry_version}")
+
+        template = self._static_prompt_cache[1]
+        if template.fields:
+            return template.render(date_time=self._get_current_datetime())
+        return template.render()
+
+    def get_volatile_context(self, user_status: str) -> Optional[str]:
+        """获取放在请求末尾的易变上下文（仅 prefix_cache 布局）
+
+        Args:
+            user_status: 当前用户状态名称
+
+        Returns:
+            上下文文本；classic 布局下返回None
+        """
+        if self.prompt_layout != "prefix_cache":
+            return None
+        return _CONTEXT_TEMPLATE.render(date_time=self._get_current_datetime(), user_status=user_status)
 
     def _get_system_info(self) -> str:
         """获取系统信息"""
@@ -126,20 +365,64 @@ class ACCAgent:
         return os.getenv("USERNAME") or os.getenv("USER") or getuser()
 
     def process_request(
-        self, user_input: str, user_status: str = "user_message"
+        self,
+        user_input: str,
+        user_status: str = "user_message",
+        tool_results: Optional[Dict[str, str]] = None,
     ) -> Dict[str, Any]:
         """处理用户请求
 
         Args:
             user_input: 用户输入
             user_status: 用户状态名称，默认为"user_message"
+            tool_results: 可选的并行工具调用结果（工具调用ID -> 结果文本），
+                原生工具调用模式下以各自的工具消息答复
+
+        Returns:
+            处理结果
+        """
+        options = self._prepare_request(user_input, user_status, tool_results)
+        response = self.workflow_manager.start(user_input, **options)
+        return self._complete_response(response)
+
+    async def process_request_async(
+        self,
+        user_input: str,
+        user_status: str = "user_message",
+        tool_results: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        """处理用户请求（异步版本，等待LLM时不阻塞事件循环，可被取消）
+
+        参数与 process_request 相同。
 
         Returns:
             处理结果
         """
+        options = self._prepare_request(user_input, user_status, tool_results)
+        response = await self.workflow_manager.start_async(user_input, **options)
+        return self._complete_response(response)
+
+    def _prepare_request(
+        self,
+        user_input: str,
+        user_status: str,
+        tool_results: Optional[Dict[str, str]],
+    ) -> Dict[str, Any]:
+        """记录请求并确保系统提示词已写入历史，返回启动工作流程的参数"""
         # 记录用户请求
         logger.info(f"接收到用户请求: {user_input}")
 
+        # 新任务开始时（或会话的第一个请求）在生成系统提示词之前按本次消息选择列出的工具
+        reselected = False
+        if self.tool_list_mode == "ranked":
+            from ..memory.sessions import get_current_session
+
+            session_id = get_current_session()
+            if user_status == "user_message" or session_id not in self._tool_selections:
+                selection = self.select_tools(user_input)
+                reselected = self._tool_selections.get(session_id, ()) != selection
+                self._tool_selections[session_id] = selection
+
         # 获取系统提示词
         system_prompt = self.get_system_prompt()
 
@@ -147,13 +430,24 @@ class ACCAgent:
         from ..memory import get_history_manager
 
         history_manager = get_history_manager()
-        history_manager.ensure_system_prompt(system_prompt)
+        if self.prompt_layout == "prefix_cache" or reselected:
+            # 系统提示词仅在工具注册表或任务选出的工具变化时才会不同，未变化时保持字节级稳定
+            history_manager.set_system_prompt(system_prompt)
+        else:
+            history_manager.ensure_system_prompt(system_prompt)
 
         # 启动工作流程，传入替换了工具列表的系统提示词和用户状态
-        response = self.workflow_manager.start(
-            user_input, system_prompt=system_prompt, user_status=user_status
-        )
-
+        return {
+            "system_prompt": system_prompt,
+            "user_status": user_status,
+            "volatile_context": self.get_volatile_context(user_status),
+            "tools": self.get_tool_definitions() if self.tool_mode == "native" else None,
+            "tool_results": tool_results,
+        }
+
+    @staticmethod
+    def _complete_response(response: Dict[str, Any]) -> Dict[str, Any]:
+        """从文本响应中提取JSON字段并检查必要字段"""
         # 新增JSON提取逻辑
         if isinstance(response, dict) and "content" in response:
             content = response["content"]
@@ -170,6 +464,7 @@ class ACCAgent:
                         "function": json_data.get("function"),
                         "value": json_data.get("value"),
                         "tool_value": json_data.get("tool_value"),
+                        "calls": json_data.get("calls"),
                     }
                 )
 
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+
+"""ACC LLM响应缓存模块
+
+该模块负责:
+1. 以 模型+消息+温度+最大token数 的哈希作为内容寻址键
+2. 内存LRU层与磁盘层两级缓存，磁盘层按总大小淘汰最久未使用的条目
+3. 缓存条目过期时间（TTL）与命中/未命中计数
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from .config import get_value
+from .metrics import get_metrics
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(
+    model: str,
+    messages: List[Dict[str, Any]],
+    temperature: Any,
+    max_tokens: Any,
+    tools: Optional[List[Dict[str, Any]]] = None,
+) -> str:
+    """计算请求的内容寻址键
+
+    Args:
+        model: 模型名称
+        messages: 消息列表
+        temperature: 温度
+        max_tokens: 最大token数
+        tools: 可选的工具定义（原生工具调用模式）
+
+    Returns:
+        SHA-256十六进制字符串
+    """
+    request = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+    if tools:
+        request["tools"] = tools
+    material = json.dumps(
+        request,
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """两级LLM响应缓存（内存LRU + 磁盘）"""
+
+    def __init__(
+        self,
+        directory: str,
+        memory_entries: int = 256,
+        disk_max_mb: float = 200,
+        ttl: float = 86400,
+    ):
+        """初始化响应缓存
+
+        Args:
+            directory: 磁盘缓存目录
+            memory_entries: 内存层最多保留的条目数
+            disk_max_mb: 磁盘层总大小上限（MB），0表示不使用磁盘层
+            ttl: 条目有效期（秒），0表示永不过期
+        """
+        self.directory = directory
+        self.memory_entries = max(0, int(memory_entries))
+        self.disk_max_bytes = int(disk_max_mb * 1024 * 1024)
+        self.ttl = ttl
+
+        # 键 -> (写入时间, 响应)
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 命中/未命中计数
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._disk_bytes = 0
+        if self.disk_max_bytes > 0:
+            os.makedirs(self.directory, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+
+        logger.info(
+            f"LLM响应缓存初始化完成，目录: {self.directory}，内存条目上限: {self.memory_entries}，"
+            f"磁盘上限: {disk_max_mb}MB，TTL: {ttl}秒"
+        )
+
+    @classmethod
+    def from_config(cls) -> "ResponseCache":
+        """从 [llm.cache] 配置创建缓存"""
+        workspace = get_value("workspace", "default_path", "workspace")
+        default_directory = os.path.join(os.path.abspath(workspace), ".acc_cache", "llm")
+        return cls(
+            directory=get_value("llm.cache", "path", default_directory),
+            memory_entries=get_value("llm.cache", "memory_entries", 256),
+            disk_max_mb=get_value("llm.cache", "disk_max_mb", 200),
+            ttl=get_value("llm.cache", "ttl", 86400),
+        )
+
+    def _expired(self, created_at: float) -> bool:
+        """判断条目是否过期"""
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def _path(self, key: str) -> str:
+        """磁盘条目路径（按键前两位分目录）"""
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """查询缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的响应副本；未命中或已过期时返回None
+        """
+        metrics = get_metrics()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, response = entry
+                if not self._expired(created_at):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    metrics.increment("llm.cache", result="memory_hit")
+                    return copy.deepcopy(response)
+                del self._memory[key]
+
+        response = self._read_disk(key)
+        if response is not None:
+            with self._lock:
+                self.disk_hits += 1
+            metrics.increment("llm.cache", result="disk_hit")
+            self._remember(key, response[0], response[1])
+            return copy.deepcopy(response[1])
+
+        with self._lock:
+            self.misses += 1
+        metrics.increment("llm.cache", result="miss")
+        return None
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        """写入缓存
+
+        Args:
+            key: 缓存键
+            response: API响应
+        """
+        created_at = time.time()
+        stored = copy.deepcopy(response)
+        self._remember(key, created_at, stored)
+        self._write_disk(key, created_at, stored)
+
+    def _remember(self, key: str, created_at: float, response: Dict[str, Any]) -> None:
+        """写入内存LRU层"""
+        if self.memory_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = (created_at, response)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """读取磁盘层条目，过期条目会被删除"""
+        if self.disk_max_bytes <= 0:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"读取缓存条目失败: {path}: {str(e)}")
+            return None
+
+        created_at = entry.get("created_at", 0)
+        if self._expired(created_at):
+            self._remove_disk(path)
+            return None
+
+        # 更新访问时间，供磁盘层按最近使用淘汰
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return created_at, entry.get("response")
+
+    def _write_disk(self, key: str, created_at: float, response: Dict[str, Any]) -> None:
+        """写入磁盘层条目（先写临时文件再原子替换）"""
+        if self.disk_max_bytes <= 0:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = json.dumps(
+                {"created_at": created_at, "response": response}, ensure_ascii=False
+            ).encode("utf-8")
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"写入缓存条目失败: {path}: {str(e)}")
+            return
+
+        with self._lock:
+            self._disk_bytes += len(data) - previous_size
+            over_budget = self._disk_bytes > self.disk_max_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _scan_disk(self) -> List[Tuple[str, int, float]]:
+        """列出磁盘层所有条目 (路径, 大小, 访问时间)"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _remove_disk(self, path: str) -> None:
+        """删除磁盘条目并更新大小统计"""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+
+    def _evict_disk(self) -> None:
+        """磁盘层超出上限时，淘汰最久未使用的条目直到低于上限的90%"""
+        target = int(self.disk_max_bytes * 0.9)
+        entries = sorted(self._scan_disk(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+        get_metrics().increment("llm.cache_evictions", evicted)
+        logger.debug(f"磁盘缓存淘汰 {evicted} 个条目，当前大小: {total} 字节")
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+# 创建全局响应缓存实例
+_response_cache = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """获取响应缓存实例
+
+    Returns:
+        响应缓存实例；如果 [llm.cache] enable 未开启则返回None
+    """
+    global _response_cache
+    if not get_value("llm.cache", "enable", False):
+        return None
+    if _response_cache is None:
+        _response_cache = ResponseCache.from_config()
+    return _response_cache
@@ -109,7 +109,7 @@ def get_value(section: str, key: str, default: Any = None) -> Any:
     """获取指定配置项的值
 
     Args:
-        section: 配置部分名称
+        section: 配置部分名称，支持用点号表示的嵌套表（如 "llm.vision"）
         key: 配置项名称
         default: 默认值，如果配置项不存在则返回该值
 
@@ -121,5 +121,14 @@ def get_value(section: str, key: str, default: Any = None) -> Any:
 
     try:
         return _config[section][key]
-    except KeyError:
+    except (KeyError, TypeError):
+        pass
+
+    # TOML中的 [llm.vision] 会被解析为嵌套字典，按点号逐级查找
+    node: Any = _config
+    try:
+        for part in section.split("."):
+            node = node[part]
+        return node[key]
+    except (KeyError, TypeError):
         return default
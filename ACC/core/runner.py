@@ -1,170 +1,342 @@
 # -*- coding: utf-8 -*-
 
-"""主运行循环模块"""
+"""主运行循环模块
 
+该模块负责:
+1. 读取用户输入并交给ACC代理处理
+2. 以迭代方式驱动 响应 -> 功能处理 -> 下一次响应 的循环（不再递归），长任务的内存占用保持平稳
+3. 按功能名称分派到可替换的处理函数，并限制单次任务的最大步数
+4. 记录每一步的耗时
+5. 全程不阻塞事件循环：等待用户输入与LLM响应时后台任务照常运行；
+   任务执行中按 Ctrl+C 只取消当前任务，不退出程序
+"""
+
+import asyncio
+import contextlib
 import logging
 import json
+import signal
+import threading
+import time
 import traceback  # 添加traceback模块用于详细错误信息
-from typing import Dict, Any
-from ACC.interaction.cli import get_user_input, show_response, show_error
+from typing import Dict, Any, Awaitable, Callable, Iterator, List, Optional
+from ACC.interaction.cli import get_user_input_async, show_response, show_error
 from ACC.function.search_tool_info import get_tool_details
 from ACC.function.print_for_user import handle_print_for_user  # 导入新的处理函数
 from ACC.function.get_user_input import (
-    get_user_input as process_user_input,
+    get_user_input_async as process_user_input,
+)
+from ACC.function.use_tool import (  # 导入工具调用函数
+    call_tool,
+    call_tools,
+    format_tool_result,
+    format_tool_results,
 )
-from ACC.function.use_tool import call_tool, format_tool_result  # 导入工具调用函数
+from ACC.config import get_value
+from ACC.metrics import get_metrics
 
 logger = logging.getLogger(__name__)
 
+# 处理函数：接收一次LLM响应，返回下一次LLM响应；返回None表示本次任务结束，等待用户输入
+Handler = Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+# 功能名称 -> 处理函数
+_handlers: Dict[str, Handler] = {}
+
+
+def register_handler(function_name: str, handler: Handler) -> None:
+    """注册（或替换）某个功能的处理函数
+
+    Args:
+        function_name: LLM响应中的功能名称
+        handler: 处理函数
+    """
+    _handlers[function_name] = handler
+
+
+def get_handler(function_name: str) -> Optional[Handler]:
+    """获取功能的处理函数，未注册时返回None"""
+    return _handlers.get(function_name)
+
+
+@contextlib.contextmanager
+def _on_interrupt(callback: Callable[[], None]) -> Iterator[None]:
+    """在代码块执行期间以 callback 处理 Ctrl+C（SIGINT），不终止进程
+
+    callback 在事件循环中调用；非主线程中无法设置信号处理，此时不做处理。
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    loop = asyncio.get_running_loop()
+    previous = signal.getsignal(signal.SIGINT)
+    signal.signal(signal.SIGINT, lambda signum, frame: loop.call_soon_threadsafe(callback))
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
 
 async def run_main_loop(acc_agent):
     """运行主交互循环"""
     while True:
         try:
-            user_input = get_user_input()
+            # 等待输入时按 Ctrl+C 只给出提示
+            with _on_interrupt(lambda: print("\n（输入 exit 或 quit 退出）")):
+                user_input = await get_user_input_async()
 
             if user_input.lower() in ["exit", "quit"]:
                 print("感谢使用，再见！")
                 return 0
 
-            # 初始处理用户输入，使用默认的user_message状态
-            response = acc_agent.process_request(user_input)
-
-            # 修改这里：确保所有响应都经过统一的处理流程
-            # 不再直接显示响应，而是始终进入功能处理流程
-            await process_response(response)
+            await run_turn(acc_agent, user_input)
 
+        except EOFError:
+            print("感谢使用，再见！")
+            return 0
         except Exception as e:
             error_msg = f"处理请求时发生错误: {str(e)}\n{traceback.format_exc()}"
             logger.error(error_msg)
             show_error(error_msg)
 
 
-async def process_response(response: Dict[str, Any]):
-    """处理LLM响应"""
-    try:
-        # 获取功能名称和值
-        function_name = response.get("function", "")
-        function_value = response.get("value", "")
-        tool_value = response.get("tool_value")
+async def run_turn(acc_agent, user_input: str) -> bool:
+    """执行一次任务：处理用户输入并驱动后续所有步骤
 
-        # 记录处理信息
-        logger.debug(
-            f"处理功能: {function_name}, 值: {function_value}, 工具值: {tool_value}"
-        )
+    任务在独立的asyncio任务中运行，执行期间按 Ctrl+C 取消该任务。
 
-        # 根据功能名称处理不同的功能
-        if function_name == "search_tool_info":
-            # 获取工具详情 - 移除 await 关键字，因为 get_tool_details 不是异步函数
-            tool_info = get_tool_details(function_value)
-            # 显示工具详情
-            show_response(tool_info)
-
-            # 修改：将工具信息发送给LLM继续处理，使用process_request而不是不存在的process_tool_result
-            from ..agent import get_acc_agent
-
-            acc_agent = get_acc_agent()
-            formatted_result = f"工具信息: {json.dumps(tool_info, ensure_ascii=False)}"
-            # 使用process_request方法，并指定user_status为tool_result
-            response = acc_agent.process_request(
-                formatted_result, user_status="tool_info"
-            )
-            # 递归处理响应
-            await process_response(response)
-
-        elif function_name == "print_for_user":
-            # 修改：使用print_for_user而不是handle_print_for_user，避免重复请求用户输入
-            from ACC.function.print_for_user import print_for_user
-            print_for_user(function_value)
-            # 不需要继续处理，等待主循环获取下一个用户输入
-
-        elif function_name == "need_user_input":
-            # 获取用户输入
-            user_input_result = process_user_input(function_value)
-            # 处理用户输入结果
-            from ..agent import get_acc_agent
-
-            acc_agent = get_acc_agent()
-            response = acc_agent.process_request(
-                user_input_result["content"],
-                user_status=user_input_result.get("user_status", "user_re_message"),
-            )
-            # 递归处理响应
-            await process_response(response)
-
-        elif function_name == "use_tool":
-            # 调用工具
-            if tool_value is not None:  # 使用 is not None 而不是 if tool_value
-                # 根据tool_value的类型进行处理
-                if isinstance(tool_value, dict):
-                    # 已经是字典类型，直接使用
-                    tool_args = tool_value
-                elif isinstance(tool_value, str):
-                    # 字符串类型，尝试解析为JSON
-                    try:
-                        # 只有当字符串看起来像JSON时才尝试解析
-                        if tool_value.strip().startswith('{') or tool_value.strip().startswith('['):
-                            tool_args = json.loads(tool_value)
-                        else:
-                            # 普通字符串，创建一个包含该字符串的字典
-                            tool_args = {"path": tool_value}
-                    except json.JSONDecodeError:
-                        # JSON解析失败，创建一个包含该字符串的字典
-                        logger.warning(f"无法解析tool_value为JSON: {tool_value}")
-                        tool_args = {"path": tool_value}
-                else:
-                    # 其他类型，转换为字符串
-                    tool_args = {"value": str(tool_value)}
-                
-                logger.debug(f"处理后的工具参数: {tool_args}")
-                tool_result = await call_tool(function_value, tool_args)
-                # 格式化工具结果
-                formatted_result = format_tool_result(tool_result)
-                # 处理工具调用结果，使用process_request而不是不存在的process_tool_result
-                from ..agent import get_acc_agent
-
-                acc_agent = get_acc_agent()
-                response = acc_agent.process_request(
-                    formatted_result, user_status="tool_message"
-                )
-                # 递归处理响应
-                await process_response(response)
-            else:
-                # 修改：对于没有参数的工具，传递空字典作为参数
-                tool_result = await call_tool(function_value, {})
-                # 格式化工具结果
-                formatted_result = format_tool_result(tool_result)
-                # 处理工具调用结果
-                from ..agent import get_acc_agent
-
-                acc_agent = get_acc_agent()
-                response = acc_agent.process_request(
-                    formatted_result, user_status="tool_message"
-                )
-                # 递归处理响应
-                await process_response(response)
-
-        elif function_name == "tool_list":
-            # 获取工具列表
-            from ..agent import get_acc_agent
-
-            acc_agent = get_acc_agent()
-            tools_list = acc_agent.get_formatted_tools_list()
-            # 显示工具列表
-            show_response(tools_list)
-
-            # 修改：将工具列表发送给LLM继续处理，使用process_request而不是不存在的process_tool_result
-            formatted_result = f"可用工具列表: {tools_list}"
-            response = acc_agent.process_request(
-                formatted_result, user_status="tool_result"
-            )
-            # 递归处理响应
-            await process_response(response)
-
-        else:
-            # 直接显示响应
-            show_response(response)
+    Args:
+        acc_agent: ACC代理实例
+        user_input: 用户输入
+
+    Returns:
+        任务是否正常结束（被取消时为False）
+    """
+
+    async def _turn() -> None:
+        # 初始处理用户输入，使用默认的user_message状态
+        response = await acc_agent.process_request_async(user_input)
+        # 确保所有响应都经过统一的处理流程
+        await process_response(response)
+
+    task = asyncio.ensure_future(_turn())
+    try:
+        with _on_interrupt(task.cancel):
+            await task
+        return True
+    except asyncio.CancelledError:
+        if not task.cancelled():
+            # 取消来自外部（如程序退出），继续向上传递
+            raise
+        logger.info("用户按下 Ctrl+C，当前任务已取消")
+        get_metrics().increment("runner.turns_cancelled")
+        print("\n已取消当前任务")
+        return False
     except Exception as e:
-        error_msg = f"处理响应时发生错误: {str(e)}\n{traceback.format_exc()}"
+        error_msg = f"处理请求时发生错误: {str(e)}\n{traceback.format_exc()}"
         logger.error(error_msg)
         show_error(error_msg)
+        return False
+
+
+async def process_response(response: Dict[str, Any], max_steps: Optional[int] = None) -> int:
+    """驱动一次任务：循环处理LLM响应，直到任务结束或达到最大步数
+
+    Args:
+        response: 第一次LLM响应
+        max_steps: 最大步数，默认为 [runner] max_steps，0表示不限制
+
+    Returns:
+        实际执行的步数
+    """
+    if max_steps is None:
+        max_steps = get_value("runner", "max_steps", 200)
+    metrics = get_metrics()
+    steps = 0
+    # 本次任务请求执行的工具调用数（每一步对应一次LLM响应）
+    tool_calls = 0
+
+    while response is not None:
+        if max_steps and steps >= max_steps:
+            logger.warning(f"任务已执行 {steps} 步，达到最大步数限制，停止自动执行")
+            metrics.increment("runner.max_steps_reached")
+            show_error(f"任务已连续执行 {steps} 步，达到最大步数限制（[runner] max_steps），已停止。")
+            break
+
+        steps += 1
+        function_name = response.get("function", "")
+        if function_name == "use_tool":
+            tool_calls += len(tool_calls_of(response))
+        started = time.perf_counter()
+        try:
+            response = await _dispatch(response)
+        except Exception as e:
+            error_msg = f"处理响应时发生错误: {str(e)}\n{traceback.format_exc()}"
+            logger.error(error_msg)
+            show_error(error_msg)
+            response = None
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.observe("runner.step_seconds", elapsed, function=function_name or "none")
+            logger.debug(f"第 {steps} 步 {function_name or '(无功能)'} 耗时 {elapsed:.3f}s")
+
+    metrics.observe("runner.task_steps", steps)
+    if tool_calls:
+        # 每次工具调用平均消耗的LLM调用次数（search 模式下查询工具详情也要一次往返）
+        metrics.increment("runner.tool_calls", tool_calls)
+        metrics.observe("runner.llm_calls_per_tool_call", steps / tool_calls)
+    return steps
+
+
+async def _dispatch(response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """处理一次LLM响应，返回下一次LLM响应"""
+    # 获取功能名称和值
+    function_name = response.get("function", "")
+    function_value = response.get("value", "")
+    tool_value = response.get("tool_value")
+
+    # 记录处理信息
+    logger.debug(
+        f"处理功能: {function_name}, 值: {function_value}, 工具值: {tool_value}"
+    )
+
+    handler = get_handler(function_name)
+    if handler is None:
+        # 直接显示响应
+        show_response(response)
+        return None
+    return await handler(response)
+
+
+def _agent():
+    """获取ACC代理实例"""
+    from ..agent import get_acc_agent
+
+    return get_acc_agent()
+
+
+async def handle_search_tool_info(response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """search_tool_info：显示工具详情，并将其发送给LLM继续处理"""
+    # 获取工具详情 - get_tool_details 不是异步函数
+    tool_info = get_tool_details(response.get("value", ""))
+    # 显示工具详情
+    show_response(tool_info)
+
+    formatted_result = f"工具信息: {json.dumps(tool_info, ensure_ascii=False)}"
+    return await _agent().process_request_async(formatted_result, user_status="tool_info")
+
+
+async def handle_print_for_user_response(response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """print_for_user：输出给用户，本次任务结束，等待主循环获取下一个用户输入"""
+    # 使用print_for_user而不是handle_print_for_user，避免重复请求用户输入
+    from ACC.function.print_for_user import print_for_user
+    print_for_user(response.get("value", ""))
+    return None
+
+
+async def handle_need_user_input(response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """need_user_input：获取用户输入并发送给LLM"""
+    user_input_result = await process_user_input(response.get("value", ""))
+    return await _agent().process_request_async(
+        user_input_result["content"],
+        user_status=user_input_result.get("user_status", "user_re_message"),
+    )
+
+
+def parse_tool_args(tool_value: Any) -> Dict[str, Any]:
+    """将响应中的 tool_value 转换为工具参数字典"""
+    if tool_value is None:
+        # 对于没有参数的工具，传递空字典作为参数
+        return {}
+    if isinstance(tool_value, dict):
+        # 已经是字典类型，直接使用
+        return tool_value
+    if isinstance(tool_value, str):
+        # 字符串类型，尝试解析为JSON
+        try:
+            # 只有当字符串看起来像JSON时才尝试解析
+            if tool_value.strip().startswith('{') or tool_value.strip().startswith('['):
+                return json.loads(tool_value)
+            # 普通字符串，创建一个包含该字符串的字典
+            return {"path": tool_value}
+        except json.JSONDecodeError:
+            # JSON解析失败，创建一个包含该字符串的字典
+            logger.warning(f"无法解析tool_value为JSON: {tool_value}")
+            return {"path": tool_value}
+    # 其他类型，转换为字符串
+    return {"value": str(tool_value)}
+
+
+def tool_calls_of(response: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """取出响应中的全部工具调用
+
+    单个调用使用 value/tool_value；同一轮的多个调用在 calls 列表中，
+    每项包含 value、tool_value，原生模式下还有工具调用的 id。
+    """
+    calls = response.get("calls")
+    if isinstance(calls, list):
+        calls = [call for call in calls if isinstance(call, dict) and call.get("value")]
+        if calls:
+            return calls
+    return [{"id": response.get("id"), "value": response.get("value", ""), "tool_value": response.get("tool_value")}]
+
+
+async def handle_use_tool(response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """use_tool：调用工具，并将结果发送给LLM
+
+    同一轮的多个工具调用只确认一次并并行执行，全部结果在一条后续消息中返回。
+    """
+    calls = tool_calls_of(response)
+    if len(calls) == 1:
+        tool_args = parse_tool_args(calls[0].get("tool_value"))
+        logger.debug(f"处理后的工具参数: {tool_args}")
+        tool_result = await call_tool(calls[0]["value"], tool_args)
+        # 格式化工具结果
+        formatted_result = format_tool_result(tool_result)
+        # 原生模式下以该调用的ID答复（调用不一定是本轮的第一个工具调用）
+        tool_results = {calls[0]["id"]: formatted_result} if calls[0].get("id") else None
+        return await _agent().process_request_async(
+            formatted_result, user_status="tool_message", tool_results=tool_results
+        )
+
+    tool_calls = [(call["value"], parse_tool_args(call.get("tool_value"))) for call in calls]
+    logger.debug(f"并行处理 {len(tool_calls)} 个工具调用: {tool_calls}")
+    results = await call_tools(tool_calls)
+    if len(results) != len(tool_calls):
+        # 用户在确认时输入了其他内容，工具调用已取消
+        return await _agent().process_request_async(
+            format_tool_result(results[0]), user_status="tool_message"
+        )
+
+    formatted_result = format_tool_results(tool_calls, results)
+    # 原生模式下每个工具调用以各自的结果答复
+    tool_results = None
+    if all(call.get("id") for call in calls):
+        tool_results = {call["id"]: format_tool_result(result) for call, result in zip(calls, results)}
+    return await _agent().process_request_async(
+        formatted_result, user_status="tool_message", tool_results=tool_results
+    )
+
+
+async def handle_tool_list(response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """tool_list：显示工具列表（value 为关键词时按关键词检索），并将其发送给LLM继续处理"""
+    acc_agent = _agent()
+    query = str(response.get("value") or "").strip()
+    if not query or query.lower() in ("tools", "all"):
+        tools_list = acc_agent.get_formatted_tools_list(full=True)
+        formatted_result = f"可用工具列表: {tools_list}"
+    else:
+        tools_list = acc_agent.search_tools_list(query)
+        formatted_result = f"与 \"{query}\" 相关的工具: {tools_list}"
+    # 显示工具列表
+    show_response(tools_list)
+
+    return await acc_agent.process_request_async(formatted_result, user_status="tool_result")
+
+
+# 注册内置功能的处理函数
+register_handler("search_tool_info", handle_search_tool_info)
+register_handler("print_for_user", handle_print_for_user_response)
+register_handler("need_user_input", handle_need_user_input)
+register_handler("use_tool", handle_use_tool)
+register_handler("tool_list", handle_tool_list)
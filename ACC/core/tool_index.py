@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+
+"""工具注册表索引模块
+
+该模块负责:
+1. 为工具注册表建立 工具键 -> 工具信息、工具名称 -> 工具键 的映射，查找为O(1)
+2. 检测不同服务器之间的工具重名
+3. 以规范化名称、唯一前缀和三元组索引解析拼写有误的工具名称，避免多一轮LLM往返
+4. 以BM25（名称、服务器与描述）检索与任务相关的工具，用于只在提示词中列出部分工具
+5. 索引只在注册表变化时重建（由调用方按注册表版本缓存）
+"""
+
+import bisect
+import difflib
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from ..config import get_value
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 参与相似度打分的候选数量上限
+_MAX_CANDIDATES = 12
+# 模糊匹配时，最佳候选需要领先第二名的最小分差
+_MIN_MARGIN = 0.05
+# 前缀匹配所需的最短长度
+_MIN_PREFIX = 3
+
+# BM25参数
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+# 工具名称中的词在文档中的权重（重复次数）
+_NAME_WEIGHT = 3
+# 检索时忽略的常见英文词
+_STOPWORDS = frozenset(
+    "a an and are as at be by can for from if in into is it its of on or that the this "
+    "to use used using when which will with you your".split()
+)
+
+
+def normalize_name(name: str) -> str:
+    """规范化工具名称：忽略大小写和分隔符（read-File、READ_FILE 视为相同）"""
+    return re.sub(r"[^0-9a-z]", "", name.lower())
+
+
+def _trigrams(normalized: str) -> Set[str]:
+    """带首尾标记的三元组"""
+    padded = f"^{normalized}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def tokenize(text: str) -> List[str]:
+    """检索分词：英文按单词（拆分 snake_case 与 camelCase），中文按单字和相邻双字"""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text or "").lower()
+    tokens = [token for token in re.findall(r"[a-z0-9]+", text) if token not in _STOPWORDS]
+    for run in re.findall(r"[\u4e00-\u9fff]+", text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class ToolIndex:
+    """工具注册表索引
+
+    注册表格式为 {"server_id:tool_name": {"name": ..., "server": ..., ...}}。
+    同名工具出现在多个服务器时，按名称查找返回注册表中的第一个，完整的工具键始终可以精确定位。
+    """
+
+    def __init__(self, registry: Dict[str, Dict[str, Any]], fuzzy_threshold: float = 0.8):
+        """建立索引
+
+        Args:
+            registry: 工具注册表
+            fuzzy_threshold: 模糊匹配的最低相似度（0~1），0表示不做模糊匹配
+        """
+        self.registry = registry
+        self.fuzzy_threshold = fuzzy_threshold
+        # 工具名称 -> 工具键列表（按注册顺序）
+        self.keys_by_name: Dict[str, List[str]] = defaultdict(list)
+        # 规范化名称 -> 工具名称列表
+        self._normalized: Dict[str, List[str]] = defaultdict(list)
+        # 三元组 -> 规范化名称集合
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)
+
+        for key, entry in registry.items():
+            name = entry.get("name") or key.split(":")[-1]
+            self.keys_by_name[name].append(key)
+
+        for name in self.keys_by_name:
+            normalized = normalize_name(name)
+            if not normalized:
+                continue
+            if name not in self._normalized[normalized]:
+                self._normalized[normalized].append(name)
+            for gram in _trigrams(normalized):
+                self._trigrams[gram].add(normalized)
+        # 排序后的规范化名称，前缀匹配用二分查找定位
+        self._sorted_normalized: List[str] = sorted(self._normalized)
+
+        # 在多个服务器中重名的工具: 名称 -> 工具键列表
+        self.collisions: Dict[str, List[str]] = {
+            name: keys for name, keys in self.keys_by_name.items() if len(keys) > 1
+        }
+        for name, keys in self.collisions.items():
+            logger.warning(
+                f"工具名称 {name} 在多个服务器中重复: {', '.join(keys)}；按名称调用时使用 {keys[0]}"
+            )
+
+        # BM25检索索引，首次检索时建立
+        self._postings: Optional[Dict[str, List[Tuple[int, int]]]] = None
+        self._doc_keys: List[str] = []
+        self._doc_lengths: List[int] = []
+        self._average_length = 0.0
+
+    @classmethod
+    def from_config(cls, registry: Dict[str, Dict[str, Any]]) -> "ToolIndex":
+        """按 [tools] fuzzy_threshold 配置建立索引"""
+        return cls(registry, fuzzy_threshold=get_value("tools", "fuzzy_threshold", 0.8))
+
+    def __len__(self) -> int:
+        return len(self.registry)
+
+    def __contains__(self, name: str) -> bool:
+        return self.lookup(name) is not None
+
+    def lookup(self, name: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """精确查找：完整工具键或工具名称
+
+        Args:
+            name: 工具键（server_id:tool_name）或工具名称
+
+        Returns:
+            (工具键, 工具信息)；不存在时返回None
+        """
+        if name in self.registry:
+            return name, self.registry[name]
+        keys = self.keys_by_name.get(name)
+        if keys:
+            return keys[0], self.registry[keys[0]]
+        if ":" in name:
+            # 服务器前缀不存在时，按名称部分查找
+            return self.lookup(name.rsplit(":", 1)[-1])
+        return None
+
+    def resolve(self, name: str, fuzzy: bool = True) -> Optional[Tuple[str, Dict[str, Any], str]]:
+        """查找工具，精确查找失败时尝试解析拼写有误的名称
+
+        Args:
+            name: 工具键或工具名称
+            fuzzy: 是否允许模糊匹配
+
+        Returns:
+            (工具键, 工具信息, 匹配方式)；匹配方式为 exact / normalized / prefix / fuzzy，
+            找不到或存在歧义时返回None
+        """
+        found = self.lookup(name)
+        if found:
+            return found[0], found[1], "exact"
+        if not fuzzy:
+            return None
+
+        query = normalize_name(name.split(":")[-1])
+        if not query:
+            return None
+
+        # 1. 只有大小写或分隔符不同
+        names = self._normalized.get(query)
+        if names and len(names) == 1:
+            return self._match(names[0], "normalized")
+
+        # 2. 唯一前缀（如 read_fi -> read_file）
+        if len(query) >= _MIN_PREFIX:
+            prefixed = self._unique_prefix(query)
+            if prefixed and len(self._normalized[prefixed]) == 1:
+                return self._match(self._normalized[prefixed][0], "prefix")
+
+        # 3. 三元组召回候选后按相似度打分
+        if self.fuzzy_threshold <= 0:
+            return None
+        scored = self._score(query)
+        if not scored:
+            return None
+        best_score, best = scored[0]
+        runner_up = scored[1][0] if len(scored) > 1 else 0.0
+        if best_score < self.fuzzy_threshold or best_score - runner_up < _MIN_MARGIN:
+            return None
+        names = self._normalized[best]
+        if len(names) != 1:
+            return None
+        return self._match(names[0], "fuzzy")
+
+    def suggest(self, name: str, limit: int = 5) -> List[str]:
+        """返回与给定名称最相近的工具名称（用于错误提示）"""
+        query = normalize_name(name.split(":")[-1])
+        if not query:
+            return []
+        suggestions: List[str] = []
+        for _, normalized in self._score(query):
+            for candidate in self._normalized[normalized]:
+                if candidate not in suggestions:
+                    suggestions.append(candidate)
+            if len(suggestions) >= limit:
+                break
+        return suggestions[:limit]
+
+    def _unique_prefix(self, query: str) -> Optional[str]:
+        """以 query 为前缀的唯一规范化名称（二分查找），没有或不唯一时返回None"""
+        names = self._sorted_normalized
+        position = bisect.bisect_left(names, query)
+        if position >= len(names) or not names[position].startswith(query):
+            return None
+        if position + 1 < len(names) and names[position + 1].startswith(query):
+            return None
+        return names[position]
+
+    def _match(self, tool_name: str, kind: str) -> Tuple[str, Dict[str, Any], str]:
+        """按名称返回解析结果"""
+        key = self.keys_by_name[tool_name][0]
+        return key, self.registry[key], kind
+
+    def _score(self, query: str) -> List[Tuple[float, str]]:
+        """召回共享三元组最多的候选，并按相似度从高到低排序"""
+        counts: Dict[str, int] = defaultdict(int)
+        for gram in _trigrams(query):
+            for normalized in self._trigrams.get(gram, ()):
+                counts[normalized] += 1
+        candidates = sorted(counts, key=counts.get, reverse=True)[:_MAX_CANDIDATES]
+        scored = [
+            (difflib.SequenceMatcher(None, query, normalized).ratio(), normalized)
+            for normalized in candidates
+        ]
+        scored.sort(reverse=True)
+        return scored
+
+    def _build_search(self) -> None:
+        """建立BM25倒排索引（名称、服务器ID与描述）"""
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for doc, (key, entry) in enumerate(self.registry.items()):
+            name = entry.get("name") or key.split(":")[-1]
+            terms = Counter(tokenize(name) * _NAME_WEIGHT)
+            terms.update(tokenize(str(entry.get("server") or key.split(":")[0])))
+            terms.update(tokenize(str(entry.get("description") or "")))
+            for term, frequency in terms.items():
+                postings[term].append((doc, frequency))
+            self._doc_keys.append(key)
+            self._doc_lengths.append(sum(terms.values()))
+        self._average_length = (sum(self._doc_lengths) / len(self._doc_lengths)) if self._doc_lengths else 0.0
+        self._postings = dict(postings)
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """按BM25检索与查询相关的工具
+
+        Args:
+            query: 查询文本（如用户的任务描述）
+            limit: 最多返回的工具数
+
+        Returns:
+            (工具键, 得分) 列表，按得分从高到低排列，只包含得分大于0的工具
+        """
+        if self._postings is None:
+            self._build_search()
+        total = len(self._doc_keys)
+        if not total or limit <= 0:
+            return []
+
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, frequency in postings:
+                norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * self._doc_lengths[doc] / self._average_length)
+                scores[doc] += idf * frequency * (_BM25_K1 + 1) / (frequency + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(self._doc_keys[doc], score) for doc, score in ranked]
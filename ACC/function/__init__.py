@@ -8,7 +8,7 @@
 # 导出主要组件
 from .search_tool_info import get_tool_details
 from .print_for_user import print_for_user, format_message
-from .get_user_input import get_user_input, format_user_input
+from .get_user_input import get_user_input, get_user_input_async, format_user_input
 
 
 __all__ = [
@@ -16,5 +16,6 @@ __all__ = [
     "print_for_user",
     "format_message",
     "get_user_input",
+    "get_user_input_async",
     "format_user_input",
 ]
@@ -9,7 +9,7 @@
 import json
 import logging
 from typing import Dict, Any
-from ..interaction.cli import get_user_input as cli_get_input
+from ..interaction.cli import get_user_input as cli_get_input, read_lines_async
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +43,37 @@ def get_user_input(prompt: str) -> Dict[str, Any]:
     }
 
 
+async def get_user_input_async(prompt: str) -> Dict[str, Any]:
+    """获取用户输入并准备发送给LLM（不阻塞事件循环）
+    
+    Args:
+        prompt: 提示用户输入的信息
+    
+    Returns:
+        包含用户输入和状态信息的字典
+    """
+    logger.debug(f"请求用户输入: {prompt}")
+    
+    # 打印提示信息
+    print(f"\n{prompt}")
+    print("(请连续按三次回车确认发送)")
+    
+    # 获取用户输入，输入结束时视为空回复
+    try:
+        user_response = await read_lines_async()
+    except EOFError:
+        user_response = ""
+    
+    logger.debug(f"用户输入: {user_response}")
+    
+    return {
+        "status": "success",
+        "message": "已获取用户输入",
+        "content": user_response,
+        "user_status": "user_re_message",
+    }
+
+
 def format_user_input(user_input: str, original_prompt: str) -> Dict[str, Any]:
     """格式化用户输入为LLM可处理的格式
 
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""
+工具参数校验模块
+
+该模块负责:
+1. 按工具的 input_schema（JSON Schema 的常用子集）在本地校验模型给出的参数
+2. 生成紧凑的参数签名，使模型不查询工具详情也能直接给出参数
+
+不认识的关键字一律忽略，校验只会拒绝确定不符合格式的参数。
+"""
+
+import re
+from typing import Dict, Any, List, Optional
+
+# 单次校验最多报告的错误数
+MAX_ERRORS = 20
+
+_TYPE_CHECKS = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool)
+    or isinstance(value, float) and value.is_integer(),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "null": lambda value: value is None,
+}
+
+
+def _type_name(value: Any) -> str:
+    """参数值对应的JSON类型名称"""
+    for name in ("null", "boolean", "integer", "number", "string", "array", "object"):
+        if _TYPE_CHECKS[name](value):
+            return name
+    return type(value).__name__
+
+
+def _resolve(schema: Any, root: Dict[str, Any]) -> Dict[str, Any]:
+    """展开本地引用（#/$defs/... 或 #/definitions/...）"""
+    seen = 0
+    while isinstance(schema, dict) and isinstance(schema.get("$ref"), str) and seen < 16:
+        ref = schema["$ref"]
+        if not ref.startswith("#/"):
+            return {}
+        target: Any = root
+        for part in ref[2:].split("/"):
+            if not isinstance(target, dict) or part not in target:
+                return {}
+            target = target[part]
+        schema = target
+        seen += 1
+    return schema if isinstance(schema, dict) else {}
+
+
+def _validate(schema: Any, value: Any, path: str, root: Dict[str, Any], errors: List[str]) -> None:
+    """递归校验，错误追加到 errors"""
+    if len(errors) >= MAX_ERRORS or schema is True or schema is None:
+        return
+    if schema is False:
+        errors.append(f"{path}: 不允许出现该参数")
+        return
+    schema = _resolve(schema, root)
+    if not schema:
+        return
+
+    expected = schema.get("type")
+    if expected is not None:
+        types = expected if isinstance(expected, list) else [expected]
+        known = [name for name in types if name in _TYPE_CHECKS]
+        if known and not any(_TYPE_CHECKS[name](value) for name in known):
+            errors.append(f"{path}: 应为 {'|'.join(known)}，实际为 {_type_name(value)}")
+            return
+
+    if "const" in schema and value != schema["const"]:
+        errors.append(f"{path}: 只能为 {schema['const']!r}")
+    if isinstance(schema.get("enum"), list) and value not in schema["enum"]:
+        errors.append(f"{path}: 只能为以下值之一 {schema['enum']}")
+
+    for branch in schema.get("allOf") or []:
+        _validate(branch, value, path, root, errors)
+    for keyword in ("anyOf", "oneOf"):
+        branches = schema.get(keyword)
+        if isinstance(branches, list) and branches:
+            branch_errors: List[str] = []
+            for branch in branches:
+                attempt: List[str] = []
+                _validate(branch, value, path, root, attempt)
+                if not attempt:
+                    break
+                branch_errors = branch_errors or attempt
+            else:
+                errors.append(f"{path}: 不符合任何一种允许的格式（{branch_errors[0]}）")
+
+    if isinstance(value, dict):
+        properties = schema.get("properties") or {}
+        for name in schema.get("required") or []:
+            if name not in value:
+                errors.append(f"{path}.{name}: 缺少必需参数")
+        for name, item in value.items():
+            if name in properties:
+                _validate(properties[name], item, f"{path}.{name}", root, errors)
+            elif schema.get("additionalProperties") is False:
+                allowed = ", ".join(properties) or "无"
+                errors.append(f"{path}.{name}: 未知参数（可用参数: {allowed}）")
+            elif isinstance(schema.get("additionalProperties"), dict):
+                _validate(schema["additionalProperties"], item, f"{path}.{name}", root, errors)
+    elif isinstance(value, list):
+        if isinstance(schema.get("items"), dict):
+            for index, item in enumerate(value):
+                _validate(schema["items"], item, f"{path}[{index}]", root, errors)
+        if "minItems" in schema and len(value) < schema["minItems"]:
+            errors.append(f"{path}: 至少需要 {schema['minItems']} 项")
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append(f"{path}: 最多 {schema['maxItems']} 项")
+    elif isinstance(value, str):
+        if "minLength" in schema and len(value) < schema["minLength"]:
+            errors.append(f"{path}: 长度至少为 {schema['minLength']}")
+        if "maxLength" in schema and len(value) > schema["maxLength"]:
+            errors.append(f"{path}: 长度最多为 {schema['maxLength']}")
+        if isinstance(schema.get("pattern"), str):
+            try:
+                if not re.search(schema["pattern"], value):
+                    errors.append(f"{path}: 不符合格式 {schema['pattern']}")
+            except re.error:
+                pass
+    elif _TYPE_CHECKS["number"](value):
+        if "minimum" in schema and value < schema["minimum"]:
+            errors.append(f"{path}: 不能小于 {schema['minimum']}")
+        if "maximum" in schema and value > schema["maximum"]:
+            errors.append(f"{path}: 不能大于 {schema['maximum']}")
+        if isinstance(schema.get("exclusiveMinimum"), (int, float)) and value <= schema["exclusiveMinimum"]:
+            errors.append(f"{path}: 必须大于 {schema['exclusiveMinimum']}")
+        if isinstance(schema.get("exclusiveMaximum"), (int, float)) and value >= schema["exclusiveMaximum"]:
+            errors.append(f"{path}: 必须小于 {schema['exclusiveMaximum']}")
+
+
+def validate_arguments(schema: Optional[Dict[str, Any]], arguments: Any) -> List[str]:
+    """按工具的输入格式校验参数
+
+    Args:
+        schema: 工具的 input_schema，为空时不做校验
+        arguments: 模型给出的参数（tool_value）
+
+    Returns:
+        错误信息列表，为空表示校验通过
+    """
+    if not isinstance(schema, dict) or not schema:
+        return []
+    errors: List[str] = []
+    _validate(schema, arguments, "tool_value", schema, errors)
+    return errors[:MAX_ERRORS]
+
+
+def _describe_type(schema: Any, root: Dict[str, Any]) -> str:
+    """参数类型的简短描述"""
+    schema = _resolve(schema, root)
+    if isinstance(schema.get("enum"), list):
+        return "|".join(repr(item) for item in schema["enum"][:6])
+    expected = schema.get("type")
+    if isinstance(expected, list):
+        return "|".join(str(name) for name in expected)
+    if expected == "array" and isinstance(schema.get("items"), dict):
+        return f"{_describe_type(schema['items'], root)}[]"
+    if expected:
+        return str(expected)
+    for keyword in ("anyOf", "oneOf"):
+        if isinstance(schema.get(keyword), list):
+            return "|".join(_describe_type(branch, root) for branch in schema[keyword])
+    return "any"
+
+
+def format_signature(schema: Optional[Dict[str, Any]]) -> str:
+    """生成参数签名，如 "path: string, limit?: integer"
+
+    Args:
+        schema: 工具的 input_schema
+
+    Returns:
+        参数签名，可选参数以 ? 标记；没有参数时返回空字符串
+    """
+    if not isinstance(schema, dict):
+        return ""
+    properties = schema.get("properties") or {}
+    required = set(schema.get("required") or [])
+    parts = []
+    for name, item in properties.items():
+        marker = "" if name in required else "?"
+        parts.append(f"{name}{marker}: {_describe_type(item, schema)}")
+    return ", ".join(parts)
@@ -7,7 +7,7 @@
 """
 
 import json
-from typing import Dict, Optional
+from typing import Dict
 from ..agent import get_acc_agent
 import logging
 
@@ -15,35 +15,28 @@ logger = logging.getLogger(__name__)
 
 
 def get_tool_details(tool_name: str) -> Dict:
-    """获取指定工具的详细信息"""
+    """获取指定工具的详细信息
+
+    通过注册表索引查找；名称拼写有误但能唯一解析时返回解析到的工具。
+    """
     logger.debug(f"开始搜索工具 - 目标名称: {tool_name}")
-    agent = get_acc_agent()
-    tool_registry = agent.tool_registry
-
-    logger.debug(
-        f"当前注册表工具数量: {len(tool_registry)} | 示例工具: {list(tool_registry.keys())[:3]}..."
-    )
-
-    # 遍历工具注册表查找匹配的工具
-    found_tool = None
-    for tool_key, tool_info in tool_registry.items():
-        logger.debug(
-            f"比对工具 - 注册名称: {tool_info['name']} | 目标名称: {tool_name}"
-        )
-        # 检查工具名称是否匹配（不考虑服务器前缀）
-        if tool_info["name"] == tool_name:
-            logger.debug(
-                f"匹配成功 - 工具键: {tool_key} | 元数据: {json.dumps(tool_info, ensure_ascii=False, indent=2)}"
-            )
-            found_tool = tool_info
-            break
-
-    # 如果没有找到工具，返回错误信息
-    if not found_tool:
-        logger.warning(
-            f"工具未找到 - 请求名称: {tool_name} | 可用工具列表: {list(set(t['name'] for t in tool_registry.values()))}"
-        )
-        return {"error": f"工具 {tool_name} 不存在"}
+    index = get_acc_agent().get_tool_index()
+
+    resolved = index.resolve(tool_name)
+
+    # 如果没有找到工具，返回错误信息（附带相近的工具名称）
+    if not resolved:
+        suggestions = index.suggest(tool_name)
+        logger.warning(f"工具未找到 - 请求名称: {tool_name} | 相近工具: {suggestions}")
+        error = {"error": f"工具 {tool_name} 不存在"}
+        if suggestions:
+            error["suggestions"] = suggestions
+        return error
+
+    tool_key, found_tool, match = resolved
+    if match != "exact":
+        logger.info(f"工具名称 {tool_name} 已解析为 {found_tool['name']}（{match}）")
+    logger.debug(f"匹配成功 - 工具键: {tool_key}")
 
     # 构建标准化响应
     response = {
@@ -12,8 +12,15 @@ import sys
 import aiohttp
 import asyncio  # 添加这一行导入
 import os
-from typing import Dict, Any, Optional, Tuple
+import time
+from typing import Dict, Any, List, Optional, Set, Tuple
 from ..agent import get_acc_agent
+from ..memory.blobs import get_blob_store, BLOB_TOOL_NAME
+from .schema import validate_arguments
+from .search_tool_info import get_tool_details
+from ..config import get_value
+from ..interaction.cli import read_lines_async
+from ..metrics import get_metrics
 # 移除不存在的导入
 # from ..prompt.system import SYSTEM_PROMPT
 
@@ -192,43 +199,27 @@ def get_mcp_api_client() -> MCPAPIClient:
         _mcp_api_client = MCPAPIClient()
     return _mcp_api_client
 
-def _get_direct_input(prompt: str) -> str:
+async def _get_direct_input(prompt: str) -> str:
     """
     直接从标准输入获取用户输入，不使用任何其他输入函数
-    要求用户连续按三次回车才能确认发送
+    要求用户连续按三次回车才能确认发送；等待输入时不阻塞事件循环
     
     Args:
         prompt: 提示用户的文本
         
     Returns:
-        用户输入的字符串
+        用户输入的字符串，输入结束时返回空字符串
     """
-    # 直接使用sys.stdout和sys.stdin，避免使用input()函数
     sys.stdout.write(prompt)
     sys.stdout.write("\n(请连续按三次回车确认发送)\n")
     sys.stdout.flush()
     
-    lines = []
-    empty_line_count = 0
-    
-    while True:
-        line = sys.stdin.readline()
-        
-        # 检查是否为空行（只有换行符）
-        if line.strip() == "":
-            empty_line_count += 1
-            # 如果已经有内容并且连续三次空行，则确认发送
-            if lines and empty_line_count >= 2:
-                break
-        else:
-            # 非空行，重置空行计数
-            empty_line_count = 0
-            lines.append(line)
-    
-    # 合并所有行，但去掉最后两个空行
-    return "".join(lines).rstrip()
+    try:
+        return await read_lines_async()
+    except EOFError:
+        return ""
 
-def get_tool_confirmation(tool_name: str, formatted_args: str) -> Tuple[bool, int, Optional[str]]:
+async def get_tool_confirmation(tool_name: str, formatted_args: str) -> Tuple[bool, int, Optional[str]]:
     """
     获取用户对工具调用的确认，完全独立于主交互循环
     
@@ -254,7 +245,7 @@ def get_tool_confirmation(tool_name: str, formatted_args: str) -> Tuple[bool, in
     
     try:
         # 使用自定义的输入函数，避免与主交互循环混淆
-        user_input = _get_direct_input("\n【工具确认】请输入您的选择: ")
+        user_input = await _get_direct_input("\n【工具确认】请输入您的选择: ")
         
         if user_input.lower() == 'y':
             sys.stdout.write("已确认执行工具操作\n")
@@ -280,6 +271,107 @@ def get_tool_confirmation(tool_name: str, formatted_args: str) -> Tuple[bool, in
         sys.stdout.flush()
         return False, 0, None
 
+def _find_tool(tool_name: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """通过注册表索引查找工具，名称拼写有误但能唯一解析时返回解析到的工具
+
+    Returns:
+        (工具键, 工具信息)；未找到时返回None
+    """
+    resolved = get_acc_agent().get_tool_index().resolve(tool_name)
+    if not resolved:
+        return None
+    tool_key, tool_info, match = resolved
+    get_metrics().increment("tools.name_resolution", match=match)
+    if match != "exact":
+        logger.info(f"工具名称 {tool_name} 已解析为 {tool_info['name']}（{match}）")
+    return tool_key, tool_info
+
+
+def _tool_not_found(tool_name: str) -> Dict[str, Any]:
+    """工具不存在时的错误结果，附带相近的工具名称"""
+    suggestions = get_acc_agent().get_tool_index().suggest(tool_name)
+    logger.warning(f"工具未找到 - 请求名称: {tool_name} | 相近工具: {suggestions}")
+    error_msg = f"工具 {tool_name} 不存在"
+    if suggestions:
+        error_msg += f"，相近的工具: {', '.join(suggestions)}"
+    return {"error": error_msg}
+
+
+def _check_arguments(tool_info: Dict[str, Any], tool_args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """按工具的输入格式校验参数（仅 [tools] schema_mode = "inline"）
+
+    Returns:
+        校验不通过时返回错误结果（附带工具详情，模型据此修正参数），否则返回None
+    """
+    if get_value("tools", "schema_mode", "search") != "inline":
+        return None
+    tool_name = tool_info["name"]
+    errors = validate_arguments(tool_info.get("input_schema"), tool_args)
+    get_metrics().increment("tools.schema_validation", outcome="invalid" if errors else "valid")
+    if not errors:
+        return None
+    logger.info(f"工具参数校验未通过，不执行工具: {tool_name} {errors}")
+    return {
+        "error": f"工具 {tool_name} 的参数不符合输入格式，未执行:\n" + "\n".join(f"- {error}" for error in errors),
+        "tool_info": get_tool_details(tool_name),
+    }
+
+
+def _expand_blob(tool_args: Dict[str, Any]) -> Dict[str, Any]:
+    """内置工具：读取被移出历史记录的大型工具结果（只读，无需用户确认）"""
+    try:
+        result = get_blob_store().expand(
+            tool_args.get("handle", ""),
+            tool_args.get("offset", 0),
+            tool_args.get("length"),
+        )
+    except (TypeError, ValueError) as e:
+        return {"error": f"{BLOB_TOOL_NAME} 参数错误: {str(e)}"}
+    if "error" in result:
+        return result
+    return {"success": True, "tool_name": BLOB_TOOL_NAME, "result": result, "raw_result": result}
+
+
+async def _execute_tool(tool_name: str, tool_args: Dict[str, Any], tool_key: Optional[str] = None) -> Dict[str, Any]:
+    """通过MCP服务器执行工具（不做确认）
+
+    Args:
+        tool_name: 工具名称
+        tool_args: 工具参数
+        tool_key: 工具键（server_id:tool_name），多个服务器存在同名工具时据此定位
+    """
+    try:
+        # 使用MCP API客户端调用工具
+        mcp_client = get_mcp_api_client()
+        logger.debug(f"执行工具调用 - 工具: {tool_key or tool_name}, 参数: {json.dumps(tool_args, ensure_ascii=False)}")
+        result = await mcp_client.call_tool(tool_key or tool_name, tool_args)
+        
+        # 处理结果
+        logger.debug(f"工具调用成功 - 结果: {result}")
+        return {
+            "success": True,
+            "tool_name": tool_name,
+            "result": result,
+            "raw_result": result
+        }
+    except Exception as e:
+        error_msg = f"工具调用失败: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        return {"error": error_msg}
+
+
+async def _user_message_result(user_message: str) -> Dict[str, Any]:
+    """用户在确认时输入了其他内容：取消工具调用，将其发送给AI"""
+    logger.info(f"用户取消工具调用，发送消息: {user_message}")
+    response = await get_acc_agent().process_request_async(user_message, user_status="user_message")
+    return {
+        "type": "user_message",
+        "message": user_message,
+        "ai_response": response,
+        "skip_tool": True
+    }
+
+
 async def call_tool(tool_name: str, tool_args: Dict[str, Any] = None) -> Dict[str, Any]:
     """
     调用指定的工具
@@ -298,26 +390,21 @@ async def call_tool(tool_name: str, tool_args: Dict[str, Any] = None) -> Dict[st
         tool_args = {}
         
     logger.debug(f"开始调用工具 - 工具名称: {tool_name}, 参数: {json.dumps(tool_args, ensure_ascii=False)}")
-    
-    # 获取ACC代理和工具注册表
-    agent = get_acc_agent()
-    tool_registry = agent.tool_registry
-    
-    # 查找工具
-    found_tool = None
-    server_id = None
-    for tool_key, tool_info in tool_registry.items():
-        if tool_info["name"] == tool_name:
-            found_tool = tool_info
-            # 从工具键中提取服务器ID (格式: server_id:tool_name)
-            server_id = tool_key.split(":")[0] if ":" in tool_key else None
-            break
+
+    if tool_name == BLOB_TOOL_NAME:
+        return _expand_blob(tool_args)
     
     # 如果没有找到工具，返回错误信息
-    if not found_tool:
-        error_msg = f"工具 {tool_name} 不存在"
-        logger.warning(f"工具未找到 - 请求名称: {tool_name}")
-        return {"error": error_msg}
+    found = _find_tool(tool_name)
+    if not found:
+        return _tool_not_found(tool_name)
+    tool_key, tool_info = found
+    tool_name = tool_info["name"]
+    
+    # 参数不符合输入格式时不请求确认，直接返回错误和工具详情
+    invalid = _check_arguments(tool_info, tool_args)
+    if invalid:
+        return invalid
     
     # 添加用户确认逻辑
     if _skip_confirmation_count <= 0:
@@ -325,20 +412,11 @@ async def call_tool(tool_name: str, tool_args: Dict[str, Any] = None) -> Dict[st
         formatted_args = json.dumps(tool_args, ensure_ascii=False, indent=2)
         
         # 使用专用的确认函数获取用户确认
-        confirmed, skip_count, user_message = get_tool_confirmation(tool_name, formatted_args)
+        confirmed, skip_count, user_message = await get_tool_confirmation(tool_name, formatted_args)
         
         # 如果用户输入了非预期内容，将其发送给AI
         if confirmed is None and user_message:
-            logger.info(f"用户取消工具调用，发送消息: {user_message}")
-            # 将用户消息发送给AI，使用已导入的get_acc_agent
-            acc_agent = get_acc_agent()
-            response = acc_agent.process_request(user_message, user_status="user_message")
-            return {
-                "type": "user_message",
-                "message": user_message,
-                "ai_response": response,
-                "skip_tool": True
-            }
+            return await _user_message_result(user_message)
         
         # 更新免确认次数
         _skip_confirmation_count = skip_count
@@ -357,24 +435,148 @@ async def call_tool(tool_name: str, tool_args: Dict[str, Any] = None) -> Dict[st
         sys.stdout.write(f"\n【自动执行】工具 {tool_name} (剩余免确认次数: {_skip_confirmation_count})\n")
         sys.stdout.flush()
     
+    return await _execute_tool(tool_name, tool_args, tool_key)
+
+
+async def get_batch_confirmation(calls: List[Tuple[str, Dict[str, Any]]]) -> Tuple[Optional[Set[int]], int, Optional[str]]:
+    """
+    一次性获取用户对多个工具调用的确认
+    
+    Args:
+        calls: (工具名称, 工具参数) 列表
+        
+    Returns:
+        tuple: (确认执行的调用下标集合, 免确认次数, 用户输入的消息)
+        如果用户输入了非预期内容，则返回(None, 0, 用户输入)
+    """
+    sys.stdout.write("\n" + "="*60 + "\n")
+    sys.stdout.write(f"【工具操作确认】准备并行执行 {len(calls)} 个工具调用:\n")
+    for index, (tool_name, tool_args) in enumerate(calls, 1):
+        formatted_args = json.dumps(tool_args, ensure_ascii=False, indent=2)
+        sys.stdout.write(f"\n[{index}] {tool_name}\n{formatted_args}\n")
+    sys.stdout.write("="*60 + "\n\n")
+    sys.stdout.write("请选择操作:\n")
+    sys.stdout.write("  y - 确认执行全部工具\n")
+    sys.stdout.write("  n - 拒绝执行全部工具\n")
+    sys.stdout.write("  y 1,3 - 只执行指定编号的工具，其余拒绝\n")
+    sys.stdout.write("  数字 - 执行全部工具，并设置之后免确认的次数\n")
+    sys.stdout.write("  其他内容 - 取消工具调用，将输入内容发送给AI\n")
+    sys.stdout.flush()
+    
+    all_indexes = set(range(len(calls)))
     try:
-        # 使用MCP API客户端调用工具
-        mcp_client = get_mcp_api_client()
-        logger.debug(f"执行工具调用 - 工具: {tool_name}, 参数: {json.dumps(tool_args, ensure_ascii=False)}")
-        result = await mcp_client.call_tool(tool_name, tool_args)
+        user_input = (await _get_direct_input("\n【工具确认】请输入您的选择: ")).strip()
+        lowered = user_input.lower()
         
-        # 处理结果
-        logger.debug(f"工具调用成功 - 结果: {result}")
-        return {
-            "success": True,
-            "tool_name": tool_name,
-            "result": result,
-            "raw_result": result
-        }
+        if lowered == 'y':
+            sys.stdout.write("已确认执行全部工具操作\n")
+            sys.stdout.flush()
+            return all_indexes, 0, None
+        elif lowered == 'n':
+            sys.stdout.write("已拒绝执行全部工具操作\n")
+            sys.stdout.flush()
+            return set(), 0, None
+        elif user_input.isdigit():
+            skip_count = int(user_input)
+            sys.stdout.write(f"已确认执行全部工具操作，并设置之后 {skip_count} 次工具调用免确认\n")
+            sys.stdout.flush()
+            return all_indexes, skip_count, None
+        elif lowered.startswith('y '):
+            numbers = [part.strip() for part in user_input[2:].replace("，", ",").split(",")]
+            if numbers and all(number.isdigit() for number in numbers):
+                selected = {int(number) - 1 for number in numbers} & all_indexes
+                sys.stdout.write(f"已确认执行 {len(selected)} 个工具操作，其余已拒绝\n")
+                sys.stdout.flush()
+                return selected, 0, None
+        
+        # 用户输入了其他内容，将作为消息发送给AI
+        sys.stdout.write("已取消工具调用，将您的输入发送给AI处理\n")
+        sys.stdout.flush()
+        return None, 0, user_input
     except Exception as e:
-        error_msg = f"工具调用失败: {str(e)}"
-        logger.error(error_msg, exc_info=True)
-        return {"error": error_msg}
+        logger.error(f"获取用户确认时出错: {str(e)}")
+        sys.stdout.write("输入处理出错，请重新输入\n")
+        sys.stdout.flush()
+        return set(), 0, None
+
+
+async def call_tools(calls: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    并行调用多个互不依赖的工具
+    
+    所有调用只确认一次，确认后通过 asyncio.gather 并发执行，同时执行的数量
+    不超过 [tools] max_parallel。
+    
+    Args:
+        calls: (工具名称, 工具参数) 列表
+        
+    Returns:
+        与 calls 顺序一致的工具调用结果列表；用户在确认时输入了其他内容时，
+        返回只包含一个 user_message 结果的列表
+    """
+    global _skip_confirmation_count
+    
+    if len(calls) == 1:
+        return [await call_tool(*calls[0])]
+    
+    results: List[Optional[Dict[str, Any]]] = [None] * len(calls)
+    # 待执行调用的下标 -> (工具键, 解析后的工具名称)
+    targets: Dict[int, Tuple[str, str]] = {}
+    pending: List[int] = []
+    for index, (tool_name, tool_args) in enumerate(calls):
+        if tool_name == BLOB_TOOL_NAME:
+            results[index] = _expand_blob(tool_args or {})
+            continue
+        found = _find_tool(tool_name)
+        if not found:
+            results[index] = _tool_not_found(tool_name)
+            continue
+        tool_key, tool_info = found
+        results[index] = _check_arguments(tool_info, tool_args or {})
+        if results[index] is None:
+            targets[index] = (tool_key, tool_info["name"])
+            pending.append(index)
+    
+    # 需要确认的调用只确认一次
+    if pending:
+        # 与单个调用相同：先用掉剩余的免确认次数，其余调用再一起确认
+        skips = max(0, _skip_confirmation_count)
+        automatic, confirming = pending[:skips], pending[skips:]
+        approved = set(automatic)
+        if confirming:
+            selected, skip_count, user_message = await get_batch_confirmation(
+                [(targets[index][1], calls[index][1] or {}) for index in confirming]
+            )
+            if selected is None and user_message:
+                return [await _user_message_result(user_message)]
+            # 剩余的免确认次数已全部用于 automatic，更新为本次确认给出的次数
+            _skip_confirmation_count = skip_count
+            approved |= {confirming[position] for position in (selected or set())}
+        else:
+            _skip_confirmation_count -= len(automatic)
+        if automatic:
+            logger.info(f"免确认并行执行 {len(automatic)} 个工具，剩余免确认次数: {_skip_confirmation_count}")
+            sys.stdout.write(f"\n【自动执行】并行执行 {len(automatic)} 个工具 (剩余免确认次数: {_skip_confirmation_count})\n")
+            sys.stdout.flush()
+        for index in pending:
+            if index not in approved:
+                logger.info(f"用户拒绝执行工具: {targets[index][1]}")
+                results[index] = {"error": f"用户拒绝执行工具: {targets[index][1]}"}
+    
+        semaphore = asyncio.Semaphore(max(1, get_value("tools", "max_parallel", 8)))
+    
+        async def _run(index: int) -> None:
+            async with semaphore:
+                tool_key, tool_name = targets[index]
+                results[index] = await _execute_tool(tool_name, calls[index][1] or {}, tool_key)
+    
+        started = time.perf_counter()
+        await asyncio.gather(*(_run(index) for index in sorted(approved)))
+        if approved:
+            logger.info(f"并行执行 {len(approved)} 个工具，耗时 {time.perf_counter() - started:.3f}s")
+            get_metrics().observe("tools.parallel_calls", len(approved))
+    
+    return results
 
 
 def format_tool_result(result: Dict[str, Any]) -> str:
@@ -399,6 +601,12 @@ def format_tool_result(result: Dict[str, Any]) -> str:
             return f"已将您的消息发送给AI"
     
     if "error" in result:
+        if "tool_info" in result:
+            # 参数校验未通过：附上工具详情，模型可直接修正参数后重试
+            return (
+                f"工具调用失败: {result['error']}\n"
+                f"工具信息: {json.dumps(result['tool_info'], ensure_ascii=False)}"
+            )
         return f"工具调用失败: {result['error']}"
     
     if result.get("success"):
@@ -413,7 +621,31 @@ def format_tool_result(result: Dict[str, Any]) -> str:
                 formatted_result = str(tool_result)
         except Exception:
             formatted_result = str(tool_result)
+
+        # 大型结果移入存储，历史记录中只保留预览和句柄（展开结果本身不再移出）
+        if tool_name != BLOB_TOOL_NAME:
+            formatted_result = get_blob_store().offload(formatted_result, f"工具 {tool_name}")
         
         return f"工具 {tool_name} 调用成功:\n{formatted_result}"
     
-    return "工具调用结果格式错误"
\ No newline at end of file
+    return "工具调用结果格式错误"
+
+
+def format_tool_results(calls: List[Tuple[str, Dict[str, Any]]], results: List[Dict[str, Any]]) -> str:
+    """
+    将多个工具调用结果合并为一条消息
+    
+    Args:
+        calls: (工具名称, 工具参数) 列表
+        results: 与 calls 顺序一致的工具调用结果
+        
+    Returns:
+        合并后的结果字符串
+    """
+    parts = [f"并行执行了 {len(calls)} 个工具调用，结果按调用顺序排列:"]
+    for index, ((tool_name, tool_args), result) in enumerate(zip(calls, results), 1):
+        parts.append(
+            f"[{index}] {tool_name} {json.dumps(tool_args or {}, ensure_ascii=False)}\n"
+            f"{format_tool_result(result)}"
+        )
+    return "\n\n".join(parts)
@@ -2,12 +2,136 @@
 
 """命令行交互模块"""
 
+import asyncio
 import logging
-from typing import Dict, Any
+import sys
+import threading
+from typing import Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
 
+class StdinReader:
+    """异步读取标准输入
+
+    后台线程逐行读取标准输入并放入事件循环中的队列，协程等待输入时不阻塞事件循环；
+    等待可以被取消，已经输入的行保留给下一次读取。开始异步读取后，标准输入
+    只应通过该读取器读取。
+    """
+
+    def __init__(self, stream=None):
+        """初始化读取器
+
+        Args:
+            stream: 输入流，默认为 sys.stdin
+        """
+        self.stream = stream
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._eof = False
+
+    def _bind(self) -> asyncio.Queue:
+        """绑定到当前事件循环，必要时启动读取线程"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._loop is not loop:
+                # 切换到新的事件循环时，尚未取走的行随旧队列丢弃
+                self._loop = loop
+                self._queue = asyncio.Queue()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="ACC-Stdin-Reader", daemon=True
+                )
+                self._thread.start()
+            return self._queue
+
+    def _run(self) -> None:
+        """读取线程：逐行读取直到输入结束"""
+        stream = self.stream or sys.stdin
+        while True:
+            try:
+                line = stream.readline()
+            except Exception as e:
+                logger.error(f"读取标准输入失败: {str(e)}")
+                line = ""
+            with self._lock:
+                loop, queue = self._loop, self._queue
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, line)
+            except RuntimeError:
+                # 事件循环已关闭
+                logger.debug("事件循环已关闭，丢弃一行输入")
+            if not line:
+                return
+
+    async def readline(self) -> str:
+        """读取一行（不含换行符）
+
+        Raises:
+            EOFError: 输入已经结束
+        """
+        if self._eof:
+            raise EOFError
+        line = await self._bind().get()
+        if not line:
+            self._eof = True
+            raise EOFError
+        return line.rstrip("\r\n")
+
+
+# 创建全局标准输入读取器实例
+_stdin_reader = None
+
+
+def get_stdin_reader() -> StdinReader:
+    """获取标准输入读取器实例
+
+    Returns:
+        标准输入读取器实例
+    """
+    global _stdin_reader
+    if _stdin_reader is None:
+        _stdin_reader = StdinReader()
+    return _stdin_reader
+
+
+async def read_lines_async() -> str:
+    """异步读取多行输入，连续按三次回车确认发送
+
+    Returns:
+        输入的内容
+
+    Raises:
+        EOFError: 输入结束且没有读到任何内容
+    """
+    reader = get_stdin_reader()
+    lines = []
+    empty_line_count = 0
+
+    while True:
+        try:
+            line = await reader.readline()
+        except EOFError:
+            if not lines:
+                raise
+            break
+
+        # 检查是否为空行
+        if line.strip() == "":
+            empty_line_count += 1
+            # 如果已经有内容并且连续三次空行，则确认发送
+            if lines and empty_line_count >= 2:
+                break
+        else:
+            # 非空行，重置空行计数
+            empty_line_count = 0
+            lines.append(line)
+
+    return "\n".join(lines)
+
+
 def show_welcome_message():
     """显示欢迎信息"""
     print("欢迎使用Auto-Central-Control系统！")
@@ -44,6 +168,16 @@ def get_user_input() -> str:
     return "\n".join(lines)
 
 
+async def get_user_input_async() -> str:
+    """获取用户输入（不阻塞事件循环），要求连续按三次回车确认发送
+
+    Raises:
+        EOFError: 输入已经结束
+    """
+    print("\n请输入指令 (连续按三次回车确认发送):")
+    return await read_lines_async()
+
+
 # 修改show_response函数，确保它能处理不同格式的响应
 def show_response(response: Dict[str, Any]):
     """显示响应结果"""
@@ -8,16 +8,28 @@
 3. 管理模型上下文
 """
 
+import asyncio
+import concurrent.futures
 import json
 import logging
-import requests
 import re
 import time
-from typing import Dict, Any, List, Optional
+import uuid
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable, AsyncIterator, Union
 
 from .config import get_value
+from .transport import get_transport, HTTPStatusError
+from .streaming import StreamingCompletion
+from .retry import RetryPolicy
+from .router import LLMRouter, Endpoint
+from .cache import get_response_cache, make_cache_key
+from .metrics import get_metrics
+from .tokens import ContextBudgeter, get_usage_tracker
 from .memory.history import get_history_manager
+from .memory.compaction import get_history_compactor
+from .memory.wire import encode_payload
 from .prompt.ACC import MISS_FUCTION  # 导入MISS_FUCTION提示词
+from .prompt.tools import ACC_FUNCTION_TOOLS, ACC_FUNCTION_NAMES
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
@@ -43,68 +55,83 @@ class LLMInterface:
         
         # 视觉功能开关
         self.enable_vision = get_value("vision.enable", "enable_vision", False)
+
+        # 工具调用模式：json（模型在文本中输出JSON）或 native（OpenAI原生tools/tool_calls）
+        self.tool_mode = get_value("llm", "tool_mode", "json")
+        self.tool_choice = get_value("llm", "tool_choice", "required")
+
+        # 流式输出开关：开启后在 function/value/tool_value 就绪时提前分发
+        self.stream = get_value("llm", "stream", False)
+        # 提前分发后仍在后台接收剩余内容的流式补全任务
+        self._pending_stream: Optional[Union[asyncio.Future, concurrent.futures.Future]] = None
+        # 上一次对话请求中各条消息的序列化结果，用于计算稳定前缀
+        self._last_message_fragments: List[str] = []
         
-        # 重试配置
-        self.max_retries = 10
-        self.retry_delay = 10  # 秒
+        # 重试策略（[llm.retry]）
+        self.retry_policy = RetryPolicy.from_config()
+
+        # 上下文预算：发送前按模型上下文窗口裁剪最早的消息
+        self.budgeter = ContextBudgeter.from_config(self.model, self.max_tokens)
+        # 最近一次请求的本地估算输入token数，用于与服务端usage对照
+        self.last_estimated_prompt_tokens: Optional[int] = None
+        # 流式请求是否要求服务端在最后一个数据块中返回usage
+        self.stream_include_usage = get_value("llm", "stream_include_usage", True)
+
+        # 批量请求的默认并发数（[llm.batch]）
+        self.batch_concurrency = get_value("llm.batch", "concurrency", 8)
 
         # 验证必要的配置项
         if not all([self.model, self.base_url, self.api_key]):
             raise ValueError("LLM配置不完整，请检查配置文件")
 
+        # 端点路由（[[llm.endpoints]]），每个端点带独立熔断器
+        self.router = LLMRouter.from_config("llm")
+        self.vision_router = (
+            LLMRouter.from_config("llm.vision")
+            if self.enable_vision and self.vision_base_url
+            else None
+        )
+
         logger.info(f"LLM接口初始化完成，使用模型: {self.model}")
         if self.enable_vision:
             logger.info(f"视觉功能已启用，使用模型: {self.vision_model}")
 
-    def send_request(
+    def _build_request(
         self,
         messages: List[Dict[str, Any]],
         image_base64: Optional[str] = None,
-    ) -> Dict[str, Any]:
-        """发送请求到LLM API，支持网络错误重试
-    
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> Tuple[LLMRouter, Dict[str, Any]]:
+        """选择路由器并构建请求体
+
+        请求体中的model字段由实际选中的端点在发送时填入。
+
         Args:
             messages: 消息列表，包含角色和内容
             image_base64: 可选的base64编码图片
-    
+            tools: 可选的工具定义（原生工具调用模式）
+
         Returns:
-            API响应的JSON对象
-    
-        Raises:
-            Exception: 所有重试都失败后抛出异常
+            (路由器, 请求体)
         """
-        # 确定是否使用视觉模型
-        use_vision_model = False
-        
         # 如果提供了图片且视觉功能已启用，则使用视觉模型
-        if image_base64 and self.enable_vision:
-            use_vision_model = True
-            model = self.vision_model
-            base_url = self.vision_base_url
-            api_key = self.vision_api_key
-        else:
-            model = self.model
-            base_url = self.base_url
-            api_key = self.api_key
-        
-        # 构建请求头
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-        }
-        
+        use_vision_model = bool(image_base64 and self.vision_router)
+        router = self.vision_router if use_vision_model else self.router
+
         # 如果提供了图片且视觉功能已启用，修改最后一条用户消息以包含图片
-        if image_base64 and self.enable_vision:
+        if use_vision_model:
             for i in range(len(messages) - 1, -1, -1):
                 if messages[i]["role"] == "user":
+                    # 复制该消息后再修改，避免改动历史记录中缓存的消息
+                    messages[i] = dict(messages[i])
                     # 确保content是列表格式
                     if isinstance(messages[i]["content"], str):
                         messages[i]["content"] = [{"type": "text", "text": messages[i]["content"]}]
                     elif isinstance(messages[i]["content"], list):
-                        pass  # 已经是列表格式
+                        messages[i]["content"] = list(messages[i]["content"])
                     else:
                         messages[i]["content"] = [{"type": "text", "text": str(messages[i]["content"])}]
-                    
+
                     # 添加图片内容
                     messages[i]["content"].append({
                         "type": "image_url",
@@ -113,20 +140,21 @@ class LLMInterface:
                         }
                     })
                     break
-    
+
         # 构建请求体
         payload = {
-            "model": model,
             "messages": messages,
             "max_tokens": self.max_tokens,
             "temperature": self.temperature,
         }
-    
+        if tools:
+            payload["tools"] = tools
+            payload["tool_choice"] = self.tool_choice
+
         # 调试模式下打印请求信息
         if self.debug:
-            logger.debug(f"完整请求URL: {base_url}/chat/completions")
             logger.debug(
-                "完整请求头:\n" + json.dumps(headers, indent=2, ensure_ascii=False)
+                f"候选端点: {', '.join(e.name + '=' + e.url for e in router.endpoints)}"
             )
             logger.debug(
                 "完整请求体:\n"
@@ -134,56 +162,501 @@ class LLMInterface:
             )
             if use_vision_model:
                 logger.debug("使用视觉模型进行请求")
-    
-        # 实现重试机制
-        retry_count = 0
-        last_exception = None
-        
-        while retry_count < self.max_retries:
+
+        return router, payload
+
+    @staticmethod
+    def encode_messages(messages: List[Dict[str, Any]]) -> List[str]:
+        """获取消息列表的序列化片段，历史记录中的消息复用缓存的片段"""
+        return get_history_manager().wire.fragments_for(messages)
+
+    @staticmethod
+    def _encoder(payload: Dict[str, Any]) -> Callable[[Endpoint], bytes]:
+        """为请求体创建按端点编码的函数
+
+        消息部分只拼接一次，每个端点只重新序列化包含model的少量字段。
+        """
+        messages_json = "[" + ",".join(LLMInterface.encode_messages(payload["messages"])) + "]"
+        rest = {key: value for key, value in payload.items() if key != "messages"}
+        return lambda endpoint: encode_payload(dict(rest, model=endpoint.model), messages_json)
+
+    def fit_context(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """按上下文预算裁剪本次请求的消息列表（不修改历史记录）
+
+        Args:
+            messages: 本次请求的消息列表
+
+        Returns:
+            裁剪后的消息列表
+        """
+        costs = get_history_manager().wire.tokens_for(messages)
+        fitted, estimated = self.budgeter.fit(messages, costs)
+        self.last_estimated_prompt_tokens = estimated
+        return fitted
+
+    def _record_usage(self, response: Dict[str, Any]) -> None:
+        """记录服务端返回的token用量"""
+        get_usage_tracker().record(response.get("usage"), self.last_estimated_prompt_tokens)
+
+    def _cache_lookup(
+        self, router: LLMRouter, payload: Dict[str, Any], use_cache: Optional[bool]
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """查询响应缓存
+
+        Args:
+            router: 本次请求使用的路由器
+            payload: 请求体
+            use_cache: 单次调用的缓存开关，False表示绕过缓存
+
+        Returns:
+            (缓存键, 缓存的响应)；缓存未启用或被绕过时缓存键为None
+        """
+        cache = get_response_cache()
+        if cache is None or use_cache is False:
+            return None, None
+        # 缓存键必须对应实际作答的模型；端点配置了不同模型时，请求前无法确定由哪个模型作答，不使用缓存
+        models = {endpoint.model for endpoint in router.endpoints}
+        if len(models) != 1:
+            logger.debug(f"路由器端点使用不同模型（{', '.join(sorted(map(str, models)))}），不使用响应缓存")
+            return None, None
+        model = models.pop()
+        key = make_cache_key(
+            model, payload["messages"], self.temperature, self.max_tokens, payload.get("tools")
+        )
+        return key, cache.get(key)
+
+    @staticmethod
+    def _cache_store(key: Optional[str], response: Dict[str, Any]) -> None:
+        """将成功的响应写入缓存"""
+        if key is None or not response.get("choices"):
+            return
+        cache = get_response_cache()
+        if cache is not None:
+            cache.put(key, response)
+
+    async def _with_retries(
+        self,
+        router: LLMRouter,
+        operation: Callable[[Endpoint], Awaitable[Any]],
+        hedge: bool = True,
+    ) -> Any:
+        """按重试策略执行请求操作
+
+        每一轮由路由器依次尝试可用端点（端点故障时立即切换，不等待）；整轮失败且
+        错误可重试时按指数退避加抖动等待后再进行下一轮，429/503 优先使用服务端的
+        Retry-After；其余错误（如400/401）和全部端点熔断时立即抛出。
+
+        Args:
+            router: 端点路由器
+            operation: 以端点为参数的异步请求操作
+            hedge: 是否允许对冲请求
+
+        Returns:
+            操作的返回值
+
+        Raises:
+            CircuitOpenError: 所有端点都处于熔断状态
+            Exception: 不可重试的错误，或所有重试都失败后的最后一个错误
+        """
+        policy = self.retry_policy
+        metrics = get_metrics()
+        attempt = 0
+
+        while True:
+            attempt += 1
             try:
-                # 发送请求
-                response = requests.post(
-                    f"{base_url}/chat/completions", headers=headers, json=payload
-                )
-    
-                # 检查响应状态
-                response.raise_for_status()
-    
-                # 解析响应
-                result = response.json()
-    
-                # 调试模式下打印原始响应
-                if self.debug:
-                    logger.debug(
-                        "原始API响应:\n" + json.dumps(result, indent=2, ensure_ascii=False)
-                    )
-    
-                return result
-                
-            except (requests.RequestException, requests.ConnectionError, 
-                    requests.Timeout, requests.HTTPError) as e:
-                # 记录网络错误
-                retry_count += 1
-                last_exception = e
-                
-                if retry_count < self.max_retries:
-                    logger.warning(
-                        f"API请求失败 (尝试 {retry_count}/{self.max_retries}): {str(e)}，"
-                        f"{self.retry_delay}秒后重试..."
-                    )
-                    time.sleep(self.retry_delay)
-                else:
+                return await router.execute(operation, policy.is_retryable, hedge=hedge)
+            except Exception as e:
+                if not policy.is_retryable(e):
+                    logger.error(f"API请求失败（不可重试）: {str(e)}")
+                    raise
+
+                if attempt >= policy.max_attempts:
+                    metrics.increment("llm.retries_exhausted")
                     logger.error(
-                        f"API请求失败，已达到最大重试次数 ({self.max_retries}): {str(e)}"
+                        f"API请求失败，已达到最大尝试次数 ({policy.max_attempts}): {str(e)}"
                     )
-            except Exception as e:
-                # 非网络错误直接抛出
-                logger.error(f"API请求发生非网络错误: {str(e)}")
-                raise
-        
-        # 所有重试都失败
-        logger.error(f"所有重试都失败，最后一次错误: {str(last_exception)}")
-        raise last_exception or Exception("API请求失败，所有重试均未成功")
+                    raise
+
+                delay = policy.compute_delay(attempt, e)
+                metrics.increment("llm.retries", status=getattr(e, "status", "network"))
+                metrics.observe("llm.retry_delay", delay)
+                logger.warning(
+                    f"API请求失败 (尝试 {attempt}/{policy.max_attempts}): {str(e)}，"
+                    f"{delay:.1f}秒后重试..."
+                )
+                await asyncio.sleep(delay)
+
+    async def send_request(
+        self,
+        messages: List[Dict[str, Any]],
+        image_base64: Optional[str] = None,
+        use_cache: Optional[bool] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        record_usage: bool = True,
+    ) -> Dict[str, Any]:
+        """异步发送请求到LLM API，支持响应缓存、多端点故障切换与重试
+
+        请求通过共享的长连接池发出，等待期间事件循环可以继续运行其他任务。
+
+        Args:
+            messages: 消息列表，包含角色和内容
+            image_base64: 可选的base64编码图片
+            use_cache: 单次调用的缓存开关，False表示绕过缓存（[llm.cache] 未启用时无效）
+            tools: 可选的工具定义（原生工具调用模式）
+            record_usage: 是否按对话轮次记录token用量（批量请求自行记录）
+
+        Returns:
+            API响应的JSON对象
+
+        Raises:
+            Exception: 所有重试都失败后抛出异常
+        """
+        router, payload = self._build_request(messages, image_base64, tools)
+
+        cache_key, cached = self._cache_lookup(router, payload, use_cache)
+        if cached is not None:
+            logger.debug("命中LLM响应缓存，跳过API请求")
+            return cached
+
+        transport = get_transport()
+        encode = self._encoder(payload)
+
+        async def _post(endpoint: Endpoint) -> Dict[str, Any]:
+            # 通过共享连接池发送请求
+            response = await transport.post_json(
+                endpoint.url, endpoint.headers(), encode(endpoint)
+            )
+
+            # 检查响应状态
+            if response.status >= 400:
+                raise HTTPStatusError(response.status, response.text(), response.headers)
+
+            # 解析响应
+            return response.json()
+
+        result = await self._with_retries(router, _post)
+        if record_usage:
+            self._record_usage(result)
+        self._cache_store(cache_key, result)
+
+        # 调试模式下打印原始响应
+        if self.debug:
+            logger.debug(
+                "原始API响应:\n" + json.dumps(result, indent=2, ensure_ascii=False)
+            )
+
+        return result
+
+    def send_request_sync(
+        self,
+        messages: List[Dict[str, Any]],
+        image_base64: Optional[str] = None,
+        use_cache: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """同步发送请求（send_request的薄包装）
+
+        Args:
+            messages: 消息列表，包含角色和内容
+            image_base64: 可选的base64编码图片
+            use_cache: 单次调用的缓存开关，False表示绕过缓存
+
+        Returns:
+            API响应的JSON对象
+        """
+        return get_transport().run_sync(
+            self.send_request(messages, image_base64, use_cache=use_cache)
+        )
+
+    async def start_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        image_base64: Optional[str] = None,
+    ) -> StreamingCompletion:
+        """以流式模式（SSE）发送请求
+
+        仅在建立连接阶段重试；连接建立后由返回的StreamingCompletion在后台接收内容。
+
+        Args:
+            messages: 消息列表，包含角色和内容
+            image_base64: 可选的base64编码图片
+
+        Returns:
+            正在接收中的流式补全
+        """
+        router, payload = self._build_request(messages, image_base64)
+        return await self._open_stream(router, payload)
+
+    async def _open_stream(
+        self, router: LLMRouter, payload: Dict[str, Any]
+    ) -> StreamingCompletion:
+        """通过路由器建立流式连接（建立阶段按策略重试与故障切换）"""
+        payload = dict(payload, stream=True)
+        if self.stream_include_usage:
+            payload["stream_options"] = {"include_usage": True}
+        transport = get_transport()
+        encode = self._encoder(payload)
+
+        stream = await self._with_retries(
+            router,
+            lambda endpoint: transport.open_stream(
+                endpoint.url, endpoint.headers(), encode(endpoint)
+            ),
+            hedge=False,
+        )
+        return StreamingCompletion(stream.sse_data(), debug=self.debug)
+
+    async def wait_pending_stream(self) -> None:
+        """等待上一次提前分发的流式补全接收完毕并写入历史记录"""
+        pending = self._pending_stream
+        if pending is None:
+            return
+        try:
+            # 等待被取消时不取消后台接收本身
+            if isinstance(pending, concurrent.futures.Future):
+                # 在同步包装的后台事件循环中启动，可在任意事件循环中等待
+                await asyncio.shield(asyncio.wrap_future(pending))
+            elif pending.get_loop() is asyncio.get_running_loop():
+                await asyncio.shield(pending)
+            elif pending.get_loop().is_running():
+                # 异步接口启动的接收任务，在其所属的事件循环中等待完成
+                await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(asyncio.wait({pending}), pending.get_loop())
+                )
+            else:
+                logger.warning("上一次流式回复所属的事件循环已停止，不再等待其写入历史记录")
+        finally:
+            self._pending_stream = None
+
+    async def _finish_stream(
+        self, completion: StreamingCompletion, cache_key: Optional[str]
+    ) -> None:
+        """在后台接收剩余的流式内容，并将完整回复写入历史记录和缓存"""
+        try:
+            response = await completion.wait_done()
+            if self.debug:
+                logger.debug(
+                    "流式响应接收完成:\n" + json.dumps(response, indent=2, ensure_ascii=False)
+                )
+            self._record_usage(response)
+            if completion.error is None:
+                self._cache_store(cache_key, response)
+            # 解析完整响应以写入历史记录，分发结果已提前返回
+            self.parse_response(response)
+        except Exception as e:
+            logger.error(f"接收流式响应剩余内容失败: {str(e)}")
+
+    async def send_streaming(
+        self,
+        messages: List[Dict[str, Any]],
+        image_base64: Optional[str] = None,
+        use_cache: Optional[bool] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """流式发送请求并尽早返回可分发的解析结果
+
+        当 function/value/tool_value 在流中完整出现后立即返回，剩余的 plan/status
+        等内容在后台继续接收，完成后写入历史记录。命中缓存时直接解析缓存的响应。
+
+        Args:
+            messages: 消息列表，包含角色和内容
+            image_base64: 可选的base64编码图片
+            use_cache: 单次调用的缓存开关，False表示绕过缓存
+            tools: 可选的工具定义（原生工具调用模式）
+
+        Returns:
+            解析后的响应内容
+        """
+        router, payload = self._build_request(messages, image_base64, tools)
+
+        cache_key, cached = self._cache_lookup(router, payload, use_cache)
+        if cached is not None:
+            logger.debug("命中LLM响应缓存，跳过流式请求")
+            return self.parse_response(cached)
+
+        completion = await self._open_stream(router, payload)
+
+        early = await completion.wait_dispatch()
+        if early is not None:
+            logger.debug(f"流式响应字段已就绪，提前分发: {early.get('function')}")
+            finish = self._finish_stream(completion, cache_key)
+            if get_transport().in_sync_loop():
+                # 同步接口（run_sync）：之后的调用方可能在其他事件循环中等待，持有线程安全的Future
+                self._pending_stream = asyncio.run_coroutine_threadsafe(finish, asyncio.get_running_loop())
+            else:
+                self._pending_stream = asyncio.ensure_future(finish)
+            return early
+
+        response = await completion.wait_done()
+        if self.debug:
+            logger.debug(
+                "原始API响应:\n" + json.dumps(response, indent=2, ensure_ascii=False)
+            )
+        self._record_usage(response)
+        if completion.error is None:
+            self._cache_store(cache_key, response)
+        return self.parse_response(response)
+
+    async def _complete_one(
+        self,
+        messages: List[Dict[str, Any]],
+        use_cache: Optional[bool],
+        tools: Optional[List[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """完成批量请求中的一个独立对话（不写入历史记录）"""
+        metrics = get_metrics()
+        messages, estimated = self.budgeter.fit(list(messages))
+        try:
+            response = await self.send_request(
+                messages, use_cache=use_cache, tools=tools, record_usage=False
+            )
+        except Exception as e:
+            metrics.increment("llm.batch_items", outcome="error")
+            logger.warning(f"批量请求中的对话失败: {str(e)}")
+            return {"type": "error", "content": str(e)}
+
+        get_usage_tracker().record(response.get("usage"), estimated)
+        metrics.increment("llm.batch_items", outcome="success")
+        return self.parse_response(response, record_history=False)
+
+    async def iter_batch(
+        self,
+        conversations: List[List[Dict[str, Any]]],
+        concurrency: Optional[int] = None,
+        use_cache: Optional[bool] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """并发完成多个独立对话，按完成顺序逐个产出结果
+
+        对话之间互不影响，也不读写交互会话的历史记录；单个对话失败时产出
+        {"type": "error"} 结果而不是中断整个批次。
+
+        Args:
+            conversations: 对话列表，每个对话是完整的消息列表
+            concurrency: 最大并发数，默认为 [llm.batch] concurrency
+            use_cache: 单次调用的缓存开关
+            tools: 可选的工具定义
+
+        Yields:
+            (对话下标, 解析后的响应内容)
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency or self.batch_concurrency))
+
+        async def _run(index: int, messages: List[Dict[str, Any]]) -> Tuple[int, Dict[str, Any]]:
+            async with semaphore:
+                return index, await self._complete_one(messages, use_cache, tools)
+
+        tasks = [
+            asyncio.ensure_future(_run(index, messages))
+            for index, messages in enumerate(conversations)
+        ]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            # 调用方提前停止迭代时取消剩余请求
+            for task in tasks:
+                task.cancel()
+
+    async def send_batch(
+        self,
+        conversations: List[List[Dict[str, Any]]],
+        concurrency: Optional[int] = None,
+        use_cache: Optional[bool] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """并发完成多个独立对话，按输入顺序返回结果
+
+        Args:
+            conversations: 对话列表，每个对话是完整的消息列表
+            concurrency: 最大并发数，默认为 [llm.batch] concurrency
+            use_cache: 单次调用的缓存开关
+            tools: 可选的工具定义
+
+        Returns:
+            与输入一一对应的解析结果列表
+        """
+        started = time.monotonic()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(conversations)
+        async for index, result in self.iter_batch(conversations, concurrency, use_cache, tools):
+            results[index] = result
+        elapsed = time.monotonic() - started
+        get_metrics().observe("llm.batch_latency", elapsed)
+        logger.info(f"批量请求完成: {len(conversations)} 个对话，耗时 {elapsed:.2f}秒")
+        return results
+
+    async def map_prompts(
+        self,
+        system_prompt: str,
+        prompts: List[str],
+        concurrency: Optional[int] = None,
+        use_cache: Optional[bool] = None,
+    ) -> List[Dict[str, Any]]:
+        """用同一个系统提示词并发处理多条独立的用户提示
+
+        Args:
+            system_prompt: 所有请求共享的系统提示词
+            prompts: 用户提示列表
+            concurrency: 最大并发数，默认为 [llm.batch] concurrency
+            use_cache: 单次调用的缓存开关
+
+        Returns:
+            与prompts一一对应的解析结果列表
+        """
+        system_message = {"role": "system", "content": system_prompt}
+        conversations = [
+            [system_message, {"role": "user", "content": prompt}] for prompt in prompts
+        ]
+        return await self.send_batch(conversations, concurrency, use_cache)
+
+    def map_prompts_sync(
+        self,
+        system_prompt: str,
+        prompts: List[str],
+        concurrency: Optional[int] = None,
+        use_cache: Optional[bool] = None,
+    ) -> List[Dict[str, Any]]:
+        """同步版本的map_prompts（在传输层的后台事件循环中执行）"""
+        return get_transport().run_sync(
+            self.map_prompts(system_prompt, prompts, concurrency, use_cache)
+        )
+
+    def measure_stable_prefix(self, messages: List[Dict[str, Any]]) -> int:
+        """计算本次请求与上一次请求共享的前缀长度（字符数）并记录指标
+
+        供应商侧的提示词缓存只对字节级相同的前缀生效，该指标反映可命中缓存的部分。
+
+        Args:
+            messages: 本次请求的消息列表
+
+        Returns:
+            稳定前缀的字符数
+        """
+        fragments = self.encode_messages(messages)
+        previous = self._last_message_fragments
+        prefix = 0
+        for index, fragment in enumerate(fragments):
+            if index < len(previous) and previous[index] == fragment:
+                prefix += len(fragment)
+                continue
+            if index < len(previous):
+                # 逐字符比较第一条不同的消息
+                other = previous[index]
+                limit = min(len(other), len(fragment))
+                same = 0
+                while same < limit and other[same] == fragment[same]:
+                    same += 1
+                prefix += same
+            break
+        self._last_message_fragments = fragments
+
+        total = sum(len(fragment) for fragment in fragments)
+        metrics = get_metrics()
+        metrics.observe("prompt.stable_prefix_chars", prefix)
+        if total:
+            metrics.observe("prompt.stable_prefix_ratio", prefix / total)
+        logger.debug(f"请求稳定前缀: {prefix}/{total} 字符")
+        return prefix
 
     def _check_and_retry_invalid_function(self, content_json: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -226,7 +699,50 @@ class LLMInterface:
         
         return None
 
-    def parse_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
+    @staticmethod
+    def _parse_native_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
+        """将原生工具调用转换为 function/value/tool_value 结构
+
+        ACC内置函数的参数直接作为字段；直接调用的MCP工具转换为 use_tool。
+
+        Args:
+            tool_call: 响应中的单个工具调用
+
+        Returns:
+            解析后的响应内容
+        """
+        function = tool_call.get("function") or {}
+        name = function.get("name", "")
+        raw_arguments = function.get("arguments") or "{}"
+        try:
+            arguments = json.loads(raw_arguments)
+        except json.JSONDecodeError:
+            logger.warning(f"无法解析工具调用参数: {name} {raw_arguments[:100]}")
+            get_metrics().increment("llm.native_tool_calls", outcome="invalid_arguments")
+            return {"type": "error", "content": f"工具调用 {name} 的参数不是有效的JSON"}
+        if not isinstance(arguments, dict):
+            arguments = {"value": arguments}
+
+        if name in ACC_FUNCTION_NAMES:
+            result = dict(arguments)
+            result["function"] = name
+        else:
+            result = {"function": "use_tool", "value": name, "tool_value": arguments}
+        get_metrics().increment("llm.native_tool_calls", outcome="ok")
+        return result
+
+    def parse_response(
+        self, response: Dict[str, Any], record_history: bool = True
+    ) -> Dict[str, Any]:
+        """解析API响应
+
+        Args:
+            response: API响应
+            record_history: 是否将助手回复写入历史记录（批量请求不写入）
+
+        Returns:
+            解析后的响应内容
+        """
         try:
             if self.debug:
                 logger.debug("开始解析API响应...")
@@ -247,8 +763,34 @@ class LLMInterface:
                     if item.get("type") == "text":
                         content += item.get("text", "")
             
+            # 原生工具调用模式：连同tool_calls一起写入历史，供下一轮以工具消息答复
+            if self.tool_mode == "native" and message.get("tool_calls"):
+                tool_calls = message["tool_calls"]
+                for tool_call in tool_calls:
+                    if not tool_call.get("id"):
+                        tool_call["id"] = f"call_{uuid.uuid4().hex[:24]}"
+                if record_history:
+                    get_history_manager().add_message(
+                        "assistant", content, tool_calls=tool_calls
+                    )
+                if len(tool_calls) == 1:
+                    return self._parse_native_tool_call(tool_calls[0])
+                # 同一轮的全部 use_tool 调用（无论位置）一起返回，由运行循环并行执行，其他函数调用不执行；
+                # 没有 use_tool 调用时只执行第一个调用
+                parsed_calls = [(tool_call, self._parse_native_tool_call(tool_call)) for tool_call in tool_calls]
+                calls = [
+                    {"id": tool_call["id"], "value": parsed["value"], "tool_value": parsed["tool_value"]}
+                    for tool_call, parsed in parsed_calls
+                    if parsed.get("function") == "use_tool"
+                ]
+                if not calls:
+                    return parsed_calls[0][1]
+                result = next(parsed for _, parsed in parsed_calls if parsed.get("function") == "use_tool")
+                result["calls"] = calls
+                return result
+
             # 将助手回复添加到历史记录
-            if content:
+            if content and record_history:
                 history_manager = get_history_manager()
                 history_manager.add_message("assistant", content)
     
@@ -322,6 +864,11 @@ class LLMInterface:
             return {"type": "error", "content": str(e)}
 
 
+# 原生工具调用模式下，未得到执行结果的工具调用所使用的答复
+NATIVE_CALL_SKIPPED = "[未执行：同一轮中有 use_tool 调用时只执行全部 use_tool 调用，否则只执行第一个调用]"
+NATIVE_CALL_INTERRUPTED = "[调用已结束，用户发送了新消息]"
+
+
 # 创建全局LLM接口实例
 _llm_interface = None
 
@@ -338,21 +885,29 @@ def get_llm_interface() -> LLMInterface:
     return _llm_interface
 
 
-def send_message(
+async def send_message_async(
     system_prompt: str,
     user_message: Any,
     tools: Optional[List[Dict[str, Any]]] = None,
     user_status: str = None,
     image_base64: Optional[str] = None,
+    use_cache: Optional[bool] = None,
+    volatile_context: Optional[str] = None,
+    tool_results: Optional[Dict[str, str]] = None,
 ) -> Dict[str, Any]:
-    """发送消息到LLM并获取响应
+    """异步发送消息到LLM并获取响应
 
     Args:
         system_prompt: 系统提示
         user_message: 用户消息
-        tools: 可选的工具列表 (不再使用)
+        tools: 可选的工具定义，仅在原生工具调用模式（[llm] tool_mode = "native"）下发送，
+            未提供时使用ACC内置的五个函数
         user_status: 用户状态名称，默认为None
         image_base64: 可选的base64编码图片
+        use_cache: 单次调用的缓存开关，False表示绕过响应缓存
+        volatile_context: 可选的易变上下文，作为最后一个text对象附加到本次请求，不写入历史
+        tool_results: 可选的并行工具调用结果（工具调用ID -> 结果文本），原生模式下
+            以各自的工具消息答复，其他模式下使用合并后的 user_message
 
     Returns:
         解析后的响应内容
@@ -360,11 +915,18 @@ def send_message(
     # 获取LLM接口实例
     llm = get_llm_interface()
 
-    # 获取历史记录管理器
-    history_manager = get_history_manager()
+    # 等待上一轮流式回复写入历史记录，保证消息顺序
+    await llm.wait_pending_stream()
 
     # 获取历史记录管理器
     history_manager = get_history_manager()
+
+    # 原生工具调用模式下发送函数定义，不再要求模型在文本中输出JSON
+    native = llm.tool_mode == "native"
+    if native:
+        tools = tools or ACC_FUNCTION_TOOLS
+    else:
+        tools = None
     
     # 添加日志记录图片状态
     if image_base64 and llm.enable_vision:
@@ -382,6 +944,17 @@ def send_message(
     else:
         formatted_user_message = str(user_message)
 
+    # 用户状态提示词：json模式附带完整的JSON回复格式说明，原生模式只保留状态标记；
+    # 历史记录中只保存状态标记，完整说明只随本轮最新的消息发送
+    prompt_text = None
+    status_tag = None
+    if user_status:
+        from .prompt.user import USER_PROMPT, NATIVE_USER_PROMPT, USER_STATUS_TAG
+
+        template = NATIVE_USER_PROMPT if native else USER_PROMPT
+        prompt_text = template.replace("{{user_status_name}}", user_status)
+        status_tag = USER_STATUS_TAG.replace("{{user_status_name}}", user_status)
+
     # 格式化用户消息和提示词
     message_content = []
     
@@ -392,17 +965,18 @@ def send_message(
     })
     
     # 如果有用户状态，添加提示词作为第二个text对象
-    if user_status:
-        from .prompt.user import USER_PROMPT
-        
-        prompt_text = USER_PROMPT.replace(
-            "{{user_status_name}}", user_status
-        )
-        
+    if prompt_text:
         message_content.append({
             "type": "text",
             "text": prompt_text
         })
+
+    # 易变上下文放在请求的最末尾，保证前面的内容在轮次之间保持稳定
+    if volatile_context:
+        message_content.append({
+            "type": "text",
+            "text": volatile_context
+        })
     
     # 创建新格式的用户消息
     structured_user_message = {
@@ -410,42 +984,114 @@ def send_message(
         "content": message_content
     }
 
-    # 添加用户消息到历史记录（为了兼容性，仍然保存为文本格式）
+    # 添加用户消息到历史记录（为了兼容性，仍然保存为文本格式，只附带状态标记）
     history_text = formatted_user_message
-    if user_status:
-        from .prompt.user import USER_PROMPT
-        history_text += "\n" + USER_PROMPT.replace("{{user_status_name}}", user_status)
-    
-    history_manager.add_message("user", history_text)
+    if status_tag:
+        history_text += "\n" + status_tag
+
+    # 之前各轮去掉的格式说明在本次请求中同样不必重复发送
+    history_manager.account_deduplicated()
+    if prompt_text and status_tag and prompt_text != status_tag:
+        history_manager.note_deduplicated(prompt_text, status_tag)
+
+    # 原生模式下，上一轮的工具调用必须先由工具消息答复
+    pending_calls = history_manager.pending_tool_calls() if native else []
+    if pending_calls and tool_results:
+        # 并行执行的工具调用各自以结果答复，状态标记附加在最后一条工具消息上
+        for position, tool_call in enumerate(pending_calls):
+            text = tool_results.get(tool_call["id"], NATIVE_CALL_SKIPPED)
+            if status_tag and position == len(pending_calls) - 1:
+                text += "\n" + status_tag
+            history_manager.add_message("tool", text, tool_call_id=tool_call["id"])
+    elif pending_calls and user_status != "user_message":
+        # 本条消息是第一个工具调用的结果
+        history_manager.add_message("tool", history_text, tool_call_id=pending_calls[0]["id"])
+        for tool_call in pending_calls[1:]:
+            history_manager.add_message(
+                "tool", NATIVE_CALL_SKIPPED, tool_call_id=tool_call["id"]
+            )
+    else:
+        # 用户发送了新消息，未答复的工具调用直接结束
+        for tool_call in pending_calls:
+            history_manager.add_message(
+                "tool", NATIVE_CALL_INTERRUPTED, tool_call_id=tool_call["id"]
+            )
+        history_manager.add_message("user", history_text)
 
     # 如果历史记录为空，添加系统提示词
     if not history_manager.system_prompt_added:
         history_manager.add_message("system", system_prompt)
 
-    # 获取完整的历史记录并转换为新格式
-    old_messages = history_manager.get_history()
-    messages = []
-    
-    for msg in old_messages:
-        if msg["role"] == "user" and msg == old_messages[-1]:
-            # 替换最后一条用户消息为新格式
-            messages.append(structured_user_message)
-        elif msg["role"] == "system":
-            # 系统消息保持原样
-            messages.append(msg)
-        elif msg["role"] == "assistant":
-            # 助手消息保持原样
-            messages.append(msg)
-        else:
-            # 其他用户消息也转换为新格式
-            old_content = msg.get("content", "")
-            messages.append({
-                "role": "user",
-                "content": [{"type": "text", "text": old_content}]
-            })
+    # 历史记录层维护着发送格式的消息列表，这里只替换最后一条消息
+    messages = list(history_manager.get_wire_messages())
+    if messages[-1]["role"] == "user":
+        # 最后一条用户消息使用分段的新格式
+        messages[-1] = structured_user_message
+    elif volatile_context and messages[-1]["role"] == "tool":
+        # 本轮以工具消息结尾时，易变上下文追加在工具消息末尾（不写入历史）
+        messages[-1] = dict(
+            messages[-1], content=messages[-1]["content"] + "\n" + volatile_context
+        )
     
+    # 历史超过压缩阈值时，在后台将最早的几轮对话压缩为记忆消息（下一轮生效）
+    get_history_compactor().maybe_compact(history_manager, llm)
+
+    # 按上下文预算裁剪最早的消息，避免长会话超出模型上下文窗口
+    messages = llm.fit_context(messages)
+
+    # 记录本次请求与上一次请求的稳定前缀长度
+    llm.measure_stable_prefix(messages)
+
+    # 流式模式：字段就绪即返回，剩余内容后台接收
+    if llm.stream:
+        return await llm.send_streaming(
+            messages, image_base64=image_base64, use_cache=use_cache, tools=tools
+        )
+
     # 发送请求，可能包含图片
-    response = llm.send_request(messages, image_base64=image_base64)
+    response = await llm.send_request(
+        messages, image_base64=image_base64, use_cache=use_cache, tools=tools
+    )
 
     # 解析响应
-    return llm.parse_response(response)
\ No newline at end of file
+    return llm.parse_response(response)
+
+
+def send_message(
+    system_prompt: str,
+    user_message: Any,
+    tools: Optional[List[Dict[str, Any]]] = None,
+    user_status: str = None,
+    image_base64: Optional[str] = None,
+    use_cache: Optional[bool] = None,
+    volatile_context: Optional[str] = None,
+    tool_results: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """发送消息到LLM并获取响应（send_message_async的同步包装）
+
+    Args:
+        system_prompt: 系统提示
+        user_message: 用户消息
+        tools: 可选的工具定义，仅在原生工具调用模式下发送
+        user_status: 用户状态名称，默认为None
+        image_base64: 可选的base64编码图片
+        use_cache: 单次调用的缓存开关，False表示绕过响应缓存
+        volatile_context: 可选的易变上下文，作为最后一个text对象附加到本次请求，不写入历史
+        tool_results: 可选的并行工具调用结果（工具调用ID -> 结果文本），原生模式下
+            以各自的工具消息答复，其他模式下使用合并后的 user_message
+
+    Returns:
+        解析后的响应内容
+    """
+    return get_transport().run_sync(
+        send_message_async(
+            system_prompt,
+            user_message,
+            tools,
+            user_status=user_status,
+            image_base64=image_base64,
+            use_cache=use_cache,
+            volatile_context=volatile_context,
+            tool_results=tool_results,
+        )
+    )
@@ -4,4 +4,12 @@
 """
 
 # 导出主要组件
-from .history import get_history_manager
\ No newline at end of file
+from .history import get_history_manager, close_history
+from .sessions import (
+    get_session_registry,
+    get_current_session,
+    set_current_session,
+    reset_current_session,
+    use_session,
+)
+from .checkpoint import Checkpoint
\ No newline at end of file
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+"""大型工具结果存储模块
+
+该模块负责:
+1. 将超过阈值的工具结果按内容哈希存入工作空间下的存储目录，相同内容只存一份
+2. 历史记录中只保留结果的开头/结尾预览和一个句柄
+3. 模型可通过内置工具 expand_blob 按句柄分段读取完整内容
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Dict, Any, Optional
+
+from ..config import get_value
+from ..metrics import get_metrics
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 内置的展开工具名称（由 use_tool 直接处理，不经过MCP服务器）
+BLOB_TOOL_NAME = "expand_blob"
+
+# 句柄前缀与哈希长度（20位十六进制，即80位）
+HANDLE_PREFIX = "blob:"
+_DIGEST_CHARS = 20
+
+# 历史记录中的预览格式
+_PREVIEW_TEMPLATE = """[{label} 的结果较大（{size} 个字符），完整内容已另存，句柄: {handle}]
+----- 开头 -----
+{head}
+----- 省略 {omitted} 个字符 -----
+{tail}
+----- 结尾 -----
+如需查看完整内容，请调用 use_tool，value 为 "{tool}"，tool_value 为 {{"handle": "{handle}", "offset": 0, "length": {length}}}"""
+
+
+class BlobStore:
+    """按内容寻址的大型文本存储"""
+
+    def __init__(
+        self,
+        directory: str,
+        threshold_bytes: int = 8192,
+        preview_chars: int = 800,
+        expand_chars: int = 8000,
+    ):
+        """初始化存储
+
+        Args:
+            directory: 存储目录
+            threshold_bytes: 超过该字节数的工具结果移出历史记录，0表示不移出
+            preview_chars: 历史记录中保留的预览字符数（开头和结尾合计）
+            expand_chars: expand_blob 单次最多返回的字符数
+        """
+        self.directory = directory
+        self.threshold_bytes = threshold_bytes
+        self.preview_chars = preview_chars
+        self.expand_chars = expand_chars
+
+    @classmethod
+    def from_config(cls) -> "BlobStore":
+        """从 [history.blobs] 配置创建存储"""
+        workspace = get_value("workspace", "default_path", "workspace")
+        default_directory = os.path.join(os.path.abspath(workspace), ".acc_blobs")
+        return cls(
+            directory=get_value("history.blobs", "path", default_directory),
+            threshold_bytes=get_value("history.blobs", "threshold_bytes", 8192),
+            preview_chars=get_value("history.blobs", "preview_chars", 800),
+            expand_chars=get_value("history.blobs", "expand_chars", 8000),
+        )
+
+    def _path(self, digest: str) -> str:
+        """内容文件路径（按哈希前两位分目录）"""
+        return os.path.join(self.directory, digest[:2], f"{digest}.txt")
+
+    @staticmethod
+    def _digest(handle: str) -> Optional[str]:
+        """从句柄中取出哈希，句柄不合法时返回None"""
+        digest = handle.strip()
+        if digest.startswith(HANDLE_PREFIX):
+            digest = digest[len(HANDLE_PREFIX):]
+        if len(digest) != _DIGEST_CHARS or any(c not in "0123456789abcdef" for c in digest):
+            return None
+        return digest
+
+    def put(self, text: str) -> str:
+        """保存文本，内容已存在时直接返回句柄
+
+        Args:
+            text: 要保存的文本
+
+        Returns:
+            句柄（blob:<哈希>）
+        """
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()[:_DIGEST_CHARS]
+        path = self._path(digest)
+        if os.path.exists(path):
+            get_metrics().increment("history.blobs", outcome="deduplicated")
+            return HANDLE_PREFIX + digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再原子替换，避免读到写了一半的内容
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        metrics = get_metrics()
+        metrics.increment("history.blobs", outcome="stored")
+        metrics.increment("history.blob_bytes", len(data))
+        return HANDLE_PREFIX + digest
+
+    def get(self, handle: str) -> Optional[str]:
+        """读取完整文本
+
+        Args:
+            handle: 句柄
+
+        Returns:
+            文本内容；句柄不合法或内容不存在时返回None
+        """
+        digest = self._digest(handle)
+        if digest is None:
+            return None
+        try:
+            with open(self._path(digest), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def offload(self, text: str, label: str) -> str:
+        """超过阈值的文本移入存储，返回预览；否则原样返回
+
+        Args:
+            text: 工具结果文本
+            label: 结果来源（如工具名），用于预览说明
+
+        Returns:
+            写入历史记录的文本
+        """
+        if not self.threshold_bytes or len(text.encode("utf-8")) <= self.threshold_bytes:
+            return text
+        try:
+            handle = self.put(text)
+        except OSError as e:
+            logger.error(f"保存大型工具结果失败，将完整写入历史记录: {str(e)}")
+            return text
+
+        head_chars = self.preview_chars * 2 // 3
+        tail_chars = self.preview_chars - head_chars
+        preview = _PREVIEW_TEMPLATE.format(
+            label=label,
+            size=len(text),
+            handle=handle,
+            head=text[:head_chars],
+            omitted=len(text) - head_chars - tail_chars,
+            tail=text[-tail_chars:] if tail_chars else "",
+            tool=BLOB_TOOL_NAME,
+            length=self.expand_chars,
+        )
+        logger.info(f"{label} 的结果（{len(text)} 个字符）已移出历史记录，句柄: {handle}")
+        return preview
+
+    def expand(self, handle: str, offset: int = 0, length: Optional[int] = None) -> Dict[str, Any]:
+        """按句柄分段读取内容（expand_blob 工具的实现）
+
+        Args:
+            handle: 句柄
+            offset: 起始字符位置
+            length: 读取的字符数，最多为 expand_chars
+
+        Returns:
+            {"handle", "offset", "length", "total", "content", "next_offset"}，失败时为 {"error": ...}
+        """
+        text = self.get(str(handle))
+        if text is None:
+            return {"error": f"句柄不存在: {handle}"}
+        offset = max(0, int(offset or 0))
+        length = min(int(length or self.expand_chars), self.expand_chars)
+        content = text[offset:offset + length]
+        end = offset + len(content)
+        get_metrics().increment("history.blob_expands")
+        return {
+            "handle": handle,
+            "offset": offset,
+            "length": len(content),
+            "total": len(text),
+            "content": content,
+            "next_offset": end if end < len(text) else None,
+        }
+
+
+# 创建全局存储实例
+_blob_store = None
+
+
+def get_blob_store() -> BlobStore:
+    """获取大型工具结果存储实例
+
+    Returns:
+        存储实例
+    """
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = BlobStore.from_config()
+    return _blob_store
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+"""历史记录检查点模块
+
+该模块负责:
+1. 提供共享前缀的持久化列表：已冻结的部分是不可变的分段链，多个分支共享同一前缀
+2. 冻结只处理上次冻结之后新增的元素，分叉只复制分段引用，代价为O(1)
+3. 替换已冻结部分的元素时写时复制，只记录在当前分支上
+4. 定义检查点：历史记录与发送格式缓存在某一时刻的不可变快照
+"""
+
+import time
+import uuid
+from collections import ChainMap
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+# 分段链超过该深度时在冻结时合并为一个分段，限制随机访问的开销
+MAX_SEGMENT_DEPTH = 64
+
+
+class Segment:
+    """不可变的列表分段，与父分段共同组成一个完整的前缀"""
+
+    __slots__ = ("parent", "items", "overrides", "length", "depth")
+
+    def __init__(
+        self,
+        parent: Optional["Segment"],
+        items: Tuple[Any, ...],
+        overrides: Optional[Dict[int, Any]] = None,
+    ):
+        """初始化分段
+
+        Args:
+            parent: 父分段
+            items: 本分段新增的元素
+            overrides: 对父分段中元素的替换（下标 -> 新元素）
+        """
+        self.parent = parent
+        self.items = items
+        self.overrides = overrides or {}
+        self.length = (parent.length if parent else 0) + len(items)
+        self.depth = (parent.depth if parent else 0) + 1
+
+    def __len__(self) -> int:
+        return self.length
+
+    def get(self, index: int) -> Any:
+        """读取第index个元素（0 <= index < length）"""
+        node = self
+        while node is not None:
+            start = node.length - len(node.items)
+            if index >= start:
+                return node.items[index - start]
+            if index in node.overrides:
+                return node.overrides[index]
+            node = node.parent
+        raise IndexError(index)
+
+    def __iter__(self) -> Iterator[Any]:
+        chain = []
+        merged: Dict[int, Any] = {}
+        node = self
+        while node is not None:
+            chain.append(node)
+            # 越靠近叶子的替换越新
+            for index, item in node.overrides.items():
+                merged.setdefault(index, item)
+            node = node.parent
+        index = 0
+        for node in reversed(chain):
+            for item in node.items:
+                yield merged.get(index, item) if merged else item
+                index += 1
+
+
+class PersistentList:
+    """共享前缀的列表
+
+    由一个不可变的前缀分段和可变的尾部组成，支持历史记录用到的列表操作。
+    """
+
+    def __init__(self, items: Any = (), base: Optional[Segment] = None):
+        """初始化列表
+
+        Args:
+            items: 尾部的初始元素
+            base: 共享的前缀分段
+        """
+        self._base = base
+        self._tail: List[Any] = list(items)
+        self._overrides: Dict[int, Any] = {}
+
+    @property
+    def _base_length(self) -> int:
+        return self._base.length if self._base is not None else 0
+
+    def __len__(self) -> int:
+        return self._base_length + len(self._tail)
+
+    def _normalize(self, index: int) -> int:
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("list index out of range")
+        return index
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = self._normalize(index)
+        base_length = self._base_length
+        if index >= base_length:
+            return self._tail[index - base_length]
+        if index in self._overrides:
+            return self._overrides[index]
+        return self._base.get(index)
+
+    def __setitem__(self, index: int, value: Any) -> None:
+        index = self._normalize(index)
+        base_length = self._base_length
+        if index >= base_length:
+            self._tail[index - base_length] = value
+        else:
+            # 写时复制：共享前缀不变，替换只记录在当前分支
+            self._overrides[index] = value
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._base is not None:
+            if self._overrides:
+                for index, item in enumerate(self._base):
+                    yield self._overrides.get(index, item)
+            else:
+                yield from self._base
+        yield from self._tail
+
+    def __reversed__(self) -> Iterator[Any]:
+        for index in range(len(self) - 1, -1, -1):
+            yield self[index]
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (list, PersistentList)):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"PersistentList({list(self)!r})"
+
+    def append(self, item: Any) -> None:
+        """追加元素"""
+        self._tail.append(item)
+
+    def extend(self, items: Any) -> None:
+        """追加多个元素"""
+        self._tail.extend(items)
+
+    def copy(self) -> List[Any]:
+        """复制为普通列表"""
+        return list(self)
+
+    def freeze(self) -> Segment:
+        """将尾部和替换冻结为新的前缀分段并返回（只处理上次冻结之后的变更）
+
+        之后的修改不会影响返回的分段，因此可以安全地共享给其他分支或后台线程。
+        """
+        if self._base is not None and not self._tail and not self._overrides:
+            return self._base
+        if self._base is not None and self._base.depth >= MAX_SEGMENT_DEPTH:
+            # 分段链过深：合并为一个分段（不再与其他分支共享内存，但结果相同）
+            self._base = Segment(None, tuple(self))
+        else:
+            self._base = Segment(self._base, tuple(self._tail), self._overrides)
+        self._tail = []
+        self._overrides = {}
+        return self._base
+
+    @classmethod
+    def from_segment(cls, segment: Optional[Segment]) -> "PersistentList":
+        """以分段为共享前缀创建新列表（O(1)）"""
+        return cls(base=segment)
+
+
+class Checkpoint:
+    """历史记录检查点
+
+    保存某一时刻的历史记录、发送格式缓存与记忆消息位置；全部是不可变的共享前缀，
+    可以被任意多个分支同时使用。检查点只保存在内存中。
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        history: Segment,
+        wire: Tuple[Segment, Segment, Segment, Tuple[Dict[int, int], ...]],
+        system_prompt_added: bool,
+        memory_positions: Tuple[int, ...],
+        label: Optional[str] = None,
+    ):
+        """初始化检查点
+
+        Args:
+            session_id: 创建检查点的会话ID
+            history: 历史记录前缀
+            wire: 发送格式缓存的快照（消息、序列化片段、token估算、位置索引）
+            system_prompt_added: 是否已添加系统提示词
+            memory_positions: 记忆消息的位置
+            label: 可选的名称
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.history = history
+        self.wire = wire
+        self.system_prompt_added = system_prompt_added
+        self.memory_positions = memory_positions
+        self.label = label
+        self.created_at = time.time()
+
+    def __len__(self) -> int:
+        return self.history.length
+
+    def __repr__(self) -> str:
+        return (
+            f"Checkpoint(id={self.id}, session={self.session_id}, "
+            f"label={self.label!r}, messages={len(self)})"
+        )
+
+
+def fork_positions(maps: Tuple[Dict[int, int], ...]) -> ChainMap:
+    """基于冻结的位置索引创建新的可写索引"""
+    return ChainMap({}, *maps)
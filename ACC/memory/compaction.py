@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+"""历史记录压缩模块
+
+该模块负责:
+1. 发送给LLM的历史超过token阈值时，选出最早的一段完整轮次
+2. 在后台调用LLM将这段对话（连同上一次的记忆）压缩为一条记忆消息
+3. 系统提示词与最近K轮对话保持原样；原始消息仍保留在存储中
+4. 工具结果在压缩输入中截断得最多，优先被摘要掉
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Any, Optional, Tuple
+
+from ..config import get_value
+from ..metrics import get_metrics
+from ..prompt.memory import COMPACTION_PROMPT, MEMORY_PROMPT
+from ..tokens import estimate_text_tokens
+from .history import HistoryManager
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 经典模式下工具结果以用户消息返回，带有以下状态标记
+_TOOL_STATUS_MARKER = '"user_status": "tool_'
+
+
+def is_tool_result(message: Dict[str, Any]) -> bool:
+    """判断消息是否为工具结果"""
+    if message["role"] == "tool":
+        return True
+    content = message.get("content")
+    return message["role"] == "user" and isinstance(content, str) and _TOOL_STATUS_MARKER in content
+
+
+def _clip(text: str, limit: int) -> str:
+    """截断过长的文本，保留开头和结尾"""
+    if limit <= 0 or len(text) <= limit:
+        return text
+    head = limit * 2 // 3
+    tail = limit - head
+    return f"{text[:head]}\n...[省略 {len(text) - limit} 个字符]...\n{text[-tail:]}"
+
+
+class HistoryCompactor:
+    """历史记录压缩器
+
+    每个会话同一时间最多进行一次压缩；压缩结果在下一次请求时生效，
+    压缩期间请求照常发送，超出预算的部分仍由上下文预算器裁剪。
+    """
+
+    def __init__(
+        self,
+        enable: bool = False,
+        trigger_tokens: int = 0,
+        trigger_ratio: float = 0.6,
+        keep_turns: int = 4,
+        span_tokens: int = 8000,
+        tool_result_chars: int = 1500,
+        message_chars: int = 6000,
+        summary_words: int = 400,
+    ):
+        """初始化压缩器
+
+        Args:
+            enable: 是否启用压缩
+            trigger_tokens: 请求估算超过多少token时压缩，0表示按 trigger_ratio 计算
+            trigger_ratio: 以输入预算的比例作为压缩阈值
+            keep_turns: 保持原样的最近轮次数（以用户消息划分轮次）
+            span_tokens: 单次压缩最多覆盖的原始消息token数
+            tool_result_chars: 压缩输入中每条工具结果保留的字符数
+            message_chars: 压缩输入中其他消息保留的字符数
+            summary_words: 记忆内容的长度上限（词数）
+        """
+        self.enable = enable
+        self.trigger_tokens = trigger_tokens
+        self.trigger_ratio = trigger_ratio
+        self.keep_turns = max(1, keep_turns)
+        self.span_tokens = span_tokens
+        self.tool_result_chars = tool_result_chars
+        self.message_chars = message_chars
+        self.summary_words = summary_words
+
+        # 会话ID -> 正在进行的压缩任务
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @classmethod
+    def from_config(cls) -> "HistoryCompactor":
+        """从 [history.compaction] 配置创建压缩器"""
+        return cls(
+            enable=get_value("history.compaction", "enable", False),
+            trigger_tokens=get_value("history.compaction", "trigger_tokens", 0),
+            trigger_ratio=get_value("history.compaction", "trigger_ratio", 0.6),
+            keep_turns=get_value("history.compaction", "keep_turns", 4),
+            span_tokens=get_value("history.compaction", "span_tokens", 8000),
+            tool_result_chars=get_value("history.compaction", "tool_result_chars", 1500),
+            message_chars=get_value("history.compaction", "message_chars", 6000),
+            summary_words=get_value("history.compaction", "summary_words", 400),
+        )
+
+    def threshold(self, input_budget: int) -> int:
+        """压缩阈值（token数）"""
+        if self.trigger_tokens:
+            return self.trigger_tokens
+        return int(input_budget * self.trigger_ratio)
+
+    def select_span(self, history_manager: HistoryManager) -> Optional[Tuple[int, int]]:
+        """选出下一段要压缩的消息
+
+        从上一次记忆覆盖的位置开始，按完整轮次向后累积，直到达到 span_tokens，
+        且不进入最近 keep_turns 轮。
+
+        Returns:
+            (起始下标, 结束下标)；没有可压缩的消息时返回None
+        """
+        history = history_manager.history
+        memory_positions = set(history_manager.memory_positions)
+        start = history_manager.memory_covers
+        while start < len(history) and history[start]["role"] == "system":
+            start += 1
+
+        turn_starts = [
+            index for index in range(start, len(history))
+            if history[index]["role"] == "user" and index not in memory_positions
+        ]
+        if len(turn_starts) <= self.keep_turns:
+            return None
+        boundary = turn_starts[-self.keep_turns]
+
+        costs = history_manager.wire.tokens_for(history_manager.wire.messages[start:boundary])
+        end = start
+        total = 0
+        for turn_start in turn_starts[1:]:
+            if turn_start > boundary:
+                break
+            if end > start and total >= self.span_tokens:
+                break
+            total += sum(costs[end - start:turn_start - start])
+            end = turn_start
+            if end == boundary:
+                break
+        if end <= start:
+            return None
+        return start, end
+
+    def maybe_compact(self, history_manager: HistoryManager, llm: Any) -> Optional[asyncio.Task]:
+        """历史超过阈值时在后台启动一次压缩
+
+        Args:
+            history_manager: 当前会话的历史记录管理器
+            llm: LLM接口实例
+
+        Returns:
+            启动的压缩任务；未达到阈值、已有任务在进行或没有可压缩的消息时返回None
+        """
+        if not self.enable or not history_manager.system_prompt_added:
+            return None
+        session_id = history_manager.session_id
+        task = self._tasks.get(session_id)
+        if task is not None and not task.done():
+            return None
+
+        messages = history_manager.get_wire_messages()
+        tokens = sum(history_manager.wire.tokens_for(messages))
+        if tokens < self.threshold(llm.budgeter.input_budget):
+            return None
+        span = self.select_span(history_manager)
+        if span is None:
+            return None
+
+        logger.info(
+            f"会话 {session_id} 的历史约 {tokens} tokens，后台压缩第 {span[0]}~{span[1] - 1} 条消息"
+        )
+        task = asyncio.ensure_future(self.compact(history_manager, llm, span))
+        self._tasks[session_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(session_id, None))
+        return task
+
+    async def compact(self, history_manager: HistoryManager, llm: Any, span: Tuple[int, int]) -> bool:
+        """压缩一段消息并写入记忆消息
+
+        Args:
+            history_manager: 历史记录管理器
+            llm: LLM接口实例
+            span: (起始下标, 结束下标)
+
+        Returns:
+            是否成功写入记忆消息
+        """
+        metrics = get_metrics()
+        start, end = span
+        covers_before = history_manager.memory_covers
+        history_before = history_manager.history
+        previous = history_manager.memory
+        started = time.perf_counter()
+
+        request = [
+            {"role": "system", "content": COMPACTION_PROMPT.format(max_words=self.summary_words)},
+            {"role": "user", "content": self._render(history_manager, previous, start, end)},
+        ]
+        try:
+            response = await llm.send_request(request, use_cache=False, record_usage=False)
+            summary = (response["choices"][0]["message"].get("content") or "").strip()
+        except Exception as e:
+            metrics.increment("history.compactions", outcome="error")
+            logger.warning(f"压缩历史记录失败: {str(e)}")
+            return False
+        if not summary:
+            metrics.increment("history.compactions", outcome="empty")
+            logger.warning("压缩历史记录失败: 模型返回了空内容")
+            return False
+        if history_manager.history is not history_before or history_manager.memory_covers != covers_before:
+            # 压缩期间历史被清空或重写，结果已过期
+            metrics.increment("history.compactions", outcome="stale")
+            return False
+
+        span_tokens = sum(
+            history_manager.wire.tokens_for(history_manager.wire.messages[start:end])
+        )
+        history_manager.add_memory(MEMORY_PROMPT.format(summary=summary), end)
+
+        saved = span_tokens - estimate_text_tokens(summary)
+        metrics.increment("history.compactions", outcome="success")
+        metrics.increment("history.compacted_messages", end - start)
+        metrics.observe("history.compaction_saved_tokens", saved)
+        metrics.observe("history.compaction_seconds", time.perf_counter() - started)
+        logger.info(f"历史记录压缩完成，覆盖 {end - start} 条消息，约节省 {saved} tokens")
+        return True
+
+    def _render(
+        self,
+        history_manager: HistoryManager,
+        previous: Optional[Dict[str, Any]],
+        start: int,
+        end: int,
+    ) -> str:
+        """将上一次的记忆与待压缩的消息渲染为压缩请求的输入"""
+        memory_positions = set(history_manager.memory_positions)
+        parts = [
+            "<previous_memory>",
+            previous["content"] if previous else "",
+            "</previous_memory>",
+            "<conversation>",
+        ]
+        for index in range(start, end):
+            if index in memory_positions:
+                continue
+            message = history_manager.history[index]
+            parts.append(f"[{message['role']}]")
+            content = message.get("content")
+            text = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False, default=str)
+            limit = self.tool_result_chars if is_tool_result(message) else self.message_chars
+            parts.append(_clip(text, limit))
+            for tool_call in message.get("tool_calls") or []:
+                function = tool_call.get("function") or {}
+                parts.append(
+                    f"(call {function.get('name', '')} {_clip(function.get('arguments') or '', self.message_chars)})"
+                )
+        parts.append("</conversation>")
+        return "\n".join(parts)
+
+
+# 创建全局历史记录压缩器实例
+_history_compactor = None
+
+
+def get_history_compactor() -> HistoryCompactor:
+    """获取历史记录压缩器实例
+
+    Returns:
+        历史记录压缩器实例
+    """
+    global _history_compactor
+    if _history_compactor is None:
+        _history_compactor = HistoryCompactor.from_config()
+    return _history_compactor
@@ -5,13 +5,28 @@
 该模块负责:
 1. 存储和管理系统与LLM的对话历史
 2. 提供历史记录的读写接口
-3. 在每次会话开始时清空历史记录
+3. 在每次会话开始时清空历史记录（或按配置恢复上次的历史记录）
+4. 以追加日志持久化历史记录，定期压缩为快照
+5. 由后台线程完成历史记录写入，文件I/O不出现在请求路径上
+6. 每个会话拥有独立的历史记录管理器（见 sessions 模块）
+7. 可选使用SQLite存储（见 store 模块）代替日志文件
+8. 维护较早对话的摘要（记忆消息），发送时以摘要代替被压缩的原始消息
+9. 统计历史中去掉重复的回复格式说明后节省的字节数和token数
+10. 创建检查点并从检查点分叉会话，分支之间共享相同的历史前缀
 """
 
-import json
 import os
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+from ..config import get_value
+from .checkpoint import Checkpoint, PersistentList
+from .journal import HistoryJournal
+from .persistence import HistoryWriter
+from .store import SQLiteStore, SQLiteJournal
+from .wire import WireMessages
+from ..metrics import get_metrics
+from ..tokens import estimate_text_tokens
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
@@ -20,37 +35,110 @@ logger = logging.getLogger(__name__)
 class HistoryManager:
     """对话历史记录管理类"""
 
-    def __init__(self):
-        """初始化历史记录管理器"""
-        # 历史记录文件路径
-        self.history_file = os.path.join(os.path.dirname(__file__), "history.json")
-        # 内存中的历史记录
-        self.history = []
+    def __init__(
+        self,
+        session_id: str = "default",
+        directory: Optional[str] = None,
+        resume: Optional[bool] = None,
+        store: Optional[SQLiteStore] = None,
+        checkpoint: Optional[Checkpoint] = None,
+    ):
+        """初始化历史记录管理器
+
+        Args:
+            session_id: 会话ID
+            directory: 存储目录，默认为 ACC/memory
+            resume: 是否恢复该目录中已有的历史记录，None表示按 [history] resume 配置
+            store: SQLite存储，指定时代替日志文件保存该会话的历史记录
+            checkpoint: 可选的检查点，指定时从检查点开始（与来源会话共享历史前缀），忽略 resume
+        """
+        self.session_id = session_id
+        if store is not None:
+            self.journal = SQLiteJournal(store, session_id)
+        else:
+            # 历史记录日志（<目录>/history.snapshot.json + history.jsonl）
+            self.journal = HistoryJournal(
+                directory or os.path.dirname(__file__),
+                fsync_every=get_value("history", "fsync_every", 32),
+                fsync_interval=get_value("history", "fsync_interval", 1.0),
+                compact_every=get_value("history", "compact_every", 1000),
+            )
+        # 后台写入器（[history] durability: none / batched / every）
+        self.writer = HistoryWriter(
+            self.journal,
+            durability=get_value("history", "durability", "batched"),
+            queue_size=get_value("history", "queue_size", 1024),
+        )
+        # 自上次快照以来提交的日志记录数
+        self._journal_records = 0
+        # 记忆消息在历史记录中的位置（最新的一条在最后）
+        self.memory_positions: List[int] = []
+        # 回复格式说明去重统计：每次请求节省的量，以及本会话累计节省的量
+        self.dedup_stats = {
+            "messages": 0,
+            "bytes_per_request": 0,
+            "tokens_per_request": 0,
+            "bytes_saved": 0,
+            "tokens_saved": 0,
+        }
+        # 内存中的历史记录（共享前缀的列表，见 checkpoint 模块）
+        self.history = PersistentList()
+        # 与历史记录一一对应的发送格式消息（带序列化缓存）
+        self.wire = WireMessages()
         # 是否已经添加了系统提示词
         self.system_prompt_added = False
 
-        # 清空历史记录文件
-        self.clear_history()
+        # 从检查点开始，或按配置恢复上次的历史记录，否则清空
+        if resume is None:
+            resume = get_value("history", "resume", False)
+        if checkpoint is not None:
+            self.restore(checkpoint)
+        elif resume:
+            self.load_history()
+        else:
+            if store is not None:
+                # SQLite归档中上次运行的记录改存到新的会话ID下，而不是随清空一起删除
+                archive_id = store.archive_session(session_id)
+                if archive_id:
+                    logger.info(f"会话 {session_id} 上次的历史记录已归档为 {archive_id}")
+            self.clear_history()
 
-        logger.info("历史记录管理器初始化完成")
+        logger.info(f"历史记录管理器初始化完成，会话: {session_id}")
 
     def clear_history(self) -> None:
         """清空历史记录"""
-        self.history = []
+        self.history = PersistentList()
+        self.wire.clear()
         self.system_prompt_added = False
+        self.memory_positions = []
+        self.dedup_stats.update(messages=0, bytes_per_request=0, tokens_per_request=0)
 
-        # 创建空的历史记录文件
-        with open(self.history_file, "w", encoding="utf-8") as f:
-            json.dump([], f, ensure_ascii=False, indent=2)
+        # 写入空快照并截断日志
+        self._save_history()
 
         logger.info("历史记录已清空")
 
-    def add_message(self, role: str, content: str) -> None:
+    def load_history(self) -> None:
+        """从快照和日志恢复历史记录"""
+        # 先写完队列中的内容，保证读取到的是最新状态
+        self.writer.flush()
+        self.history = PersistentList(self.journal.load())
+        self.wire.rebuild(self.history)
+        self.system_prompt_added = any(
+            message["role"] == "system" for message in self.history
+        )
+        self._index_memory()
+        # 立即压缩：丢弃日志末尾可能不完整的记录，之后的追加从干净的日志开始
+        if self.journal.compact_on_load:
+            self._save_history()
+
+    def add_message(self, role: str, content: str, **fields: Any) -> None:
         """添加一条消息到历史记录
 
         Args:
-            role: 消息角色 (system, user, assistant)
+            role: 消息角色 (system, user, assistant, tool)
             content: 消息内容
+            **fields: 附加字段，如助手消息的 tool_calls、工具消息的 tool_call_id
         """
         # 如果是系统消息且已经添加过系统提示词，则不再添加
         if role == "system" and self.system_prompt_added:
@@ -58,14 +146,16 @@ class HistoryManager:
 
         # 添加消息到内存中的历史记录
         message = {"role": role, "content": content}
+        message.update(fields)
         self.history.append(message)
+        self.wire.append(message)
 
         # 如果是系统消息，标记已添加系统提示词
         if role == "system":
             self.system_prompt_added = True
 
-        # 保存到文件
-        self._save_history()
+        # 追加到日志
+        self._append_journal(message)
 
         logger.debug(f"添加{role}消息到历史记录: {content[:50]}...")
 
@@ -81,16 +171,162 @@ class HistoryManager:
             # 保存当前历史记录
             current_history = self.history.copy()
             # 清空历史记录
-            self.history = []
+            self.history = PersistentList()
             # 添加系统提示词作为第一条消息
             self.add_message("system", system_prompt)
             # 将原有历史记录添加回来
             for message in current_history:
                 self.history.append(message)
+            self.wire.rebuild(self.history)
+            self._index_memory()
             # 保存到文件
             self._save_history()
             logger.info("已将系统提示词添加为第一条消息")
 
+    def set_system_prompt(self, system_prompt: str) -> None:
+        """设置系统提示词，内容变化时原位替换
+
+        与 ensure_system_prompt 不同，已存在的系统提示词会被更新为最新内容；
+        内容未变化时不做任何写入，保证请求前缀字节级稳定。
+
+        Args:
+            system_prompt: 系统提示词内容
+        """
+        if not self.system_prompt_added:
+            self.ensure_system_prompt(system_prompt)
+            return
+
+        for index, message in enumerate(self.history):
+            if message["role"] == "system":
+                if message["content"] != system_prompt:
+                    # 替换为新的消息对象，不修改可能被其他分支共享的原消息
+                    message = dict(message, content=system_prompt)
+                    self.history[index] = message
+                    self.wire.set(index, message)
+                    self.writer.set(index, message)
+                    self._journal_records += 1
+                    logger.info("系统提示词已更新")
+                return
+
+    def checkpoint(self, label: Optional[str] = None) -> Checkpoint:
+        """为当前历史记录创建检查点
+
+        只冻结上次冻结之后新增的消息；检查点与本会话共享历史前缀，之后的变更不影响检查点。
+
+        Args:
+            label: 可选的名称
+
+        Returns:
+            检查点
+        """
+        checkpoint = Checkpoint(
+            self.session_id,
+            self.history.freeze(),
+            self.wire.freeze(),
+            self.system_prompt_added,
+            tuple(self.memory_positions),
+            label=label,
+        )
+        logger.debug(f"已创建检查点: {checkpoint}")
+        return checkpoint
+
+    def restore(self, checkpoint: Checkpoint) -> None:
+        """将历史记录恢复到检查点（O(1)，与检查点共享历史前缀）
+
+        Args:
+            checkpoint: 检查点
+        """
+        self.history = PersistentList.from_segment(checkpoint.history)
+        self.wire = WireMessages(checkpoint.wire)
+        self.system_prompt_added = checkpoint.system_prompt_added
+        self.memory_positions = list(checkpoint.memory_positions)
+        self.dedup_stats.update(messages=0, bytes_per_request=0, tokens_per_request=0)
+        # 在后台把完整历史写入本会话的存储
+        self._save_history()
+        logger.info(f"会话 {self.session_id} 已恢复到检查点 {checkpoint.id}，共 {len(checkpoint)} 条消息")
+
+    def add_memory(self, summary: str, covers: int) -> None:
+        """添加一条记忆消息，代替历史记录中前 covers 条消息发送
+
+        原始消息仍保留在历史记录和存储中，只是不再出现在请求里。
+
+        Args:
+            summary: 记忆消息的内容
+            covers: 被摘要覆盖的消息数（历史记录中的下标上界）
+        """
+        message = {"role": "system", "content": summary, "summary_of": covers}
+        self.memory_positions.append(len(self.history))
+        self.history.append(message)
+        self.wire.append(message)
+        self._append_journal(message)
+        logger.info(f"已添加记忆消息，覆盖前 {covers} 条历史记录")
+
+    def note_deduplicated(self, full_text: str, stored_text: str) -> None:
+        """记录一条以状态标记代替完整格式说明写入的消息
+
+        Args:
+            full_text: 完整的格式说明
+            stored_text: 实际写入历史记录的状态标记
+        """
+        stats = self.dedup_stats
+        stats["messages"] += 1
+        stats["bytes_per_request"] += len(full_text.encode("utf-8")) - len(stored_text.encode("utf-8"))
+        stats["tokens_per_request"] += estimate_text_tokens(full_text) - estimate_text_tokens(stored_text)
+
+    def account_deduplicated(self) -> None:
+        """发送一次请求时累计去重节省的字节数和token数"""
+        stats = self.dedup_stats
+        if not stats["bytes_per_request"]:
+            return
+        stats["bytes_saved"] += stats["bytes_per_request"]
+        stats["tokens_saved"] += stats["tokens_per_request"]
+        metrics = get_metrics()
+        metrics.increment("prompt.dedup_saved_bytes", stats["bytes_per_request"])
+        metrics.increment("prompt.dedup_saved_tokens", stats["tokens_per_request"])
+
+    @property
+    def memory_covers(self) -> int:
+        """最新的记忆消息覆盖的消息数，没有记忆消息时为0"""
+        if not self.memory_positions:
+            return 0
+        return self.history[self.memory_positions[-1]]["summary_of"]
+
+    @property
+    def memory(self) -> Optional[Dict[str, Any]]:
+        """最新的记忆消息"""
+        if not self.memory_positions:
+            return None
+        return self.history[self.memory_positions[-1]]
+
+    def _index_memory(self) -> None:
+        """重新定位历史记录中的记忆消息"""
+        self.memory_positions = [
+            index for index, message in enumerate(self.history) if "summary_of" in message
+        ]
+
+    def pending_tool_calls(self) -> List[Dict[str, Any]]:
+        """获取最后一条助手消息中尚未得到工具消息答复的工具调用
+
+        Returns:
+            未答复的工具调用列表（按原顺序）
+        """
+        answered = set()
+        for message in reversed(self.history):
+            if "summary_of" in message:
+                # 后台压缩写入的记忆消息不打断工具调用序列
+                continue
+            if message["role"] == "tool":
+                answered.add(message.get("tool_call_id"))
+            elif message["role"] == "assistant":
+                return [
+                    tool_call
+                    for tool_call in message.get("tool_calls") or []
+                    if tool_call.get("id") not in answered
+                ]
+            else:
+                return []
+        return []
+
     def get_history(self) -> List[Dict[str, str]]:
         """获取历史记录
 
@@ -99,26 +335,87 @@ class HistoryManager:
         """
         return self.history
 
+    def get_wire_messages(self) -> List[Dict[str, Any]]:
+        """获取可直接发送的消息列表
+
+        没有记忆消息时与历史记录一一对应；有记忆消息时依次为系统提示词、
+        最新的记忆消息以及未被摘要覆盖的消息。
+
+        Returns:
+            发送格式的消息列表，调用方不应修改
+        """
+        if not self.memory_positions:
+            return self.wire.messages
+
+        messages = self.wire.messages
+        covers = self.memory_covers
+        memory_positions = set(self.memory_positions)
+        view = [
+            messages[index] for index in range(min(covers, len(messages)))
+            if self.history[index]["role"] == "system" and index not in memory_positions
+        ]
+        view.append(messages[self.memory_positions[-1]])
+        view.extend(
+            messages[index] for index in range(covers, len(messages))
+            if index not in memory_positions
+        )
+        return view
+
+    def _append_journal(self, message: Dict[str, Any]) -> None:
+        """将新消息提交给后台写入器，日志过长时改为写入快照"""
+        self._journal_records += 1
+        compact_every = self.journal.compact_every
+        if compact_every and self._journal_records >= compact_every:
+            self._save_history()
+        else:
+            self.writer.append(message)
+
     def _save_history(self) -> None:
-        """保存历史记录到文件"""
+        """将完整历史记录写入快照（用于清空、重排等非追加变更）"""
         try:
-            with open(self.history_file, "w", encoding="utf-8") as f:
-                json.dump(self.history, f, ensure_ascii=False, indent=2)
+            # 冻结后的前缀不会再被修改，可以直接交给后台线程写入
+            self.writer.compact(self.history.freeze())
+            self._journal_records = 0
         except Exception as e:
             logger.error(f"保存历史记录失败: {str(e)}")
 
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待所有历史记录写入落盘
+
+        Args:
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            是否在超时前完成
+        """
+        return self.writer.flush(timeout)
 
-# 创建全局历史记录管理器实例
-_history_manager = None
+    def close(self) -> None:
+        """写完所有历史记录并关闭日志"""
+        stats = self.dedup_stats
+        if stats["bytes_saved"]:
+            logger.info(
+                f"会话 {self.session_id} 去除重复的回复格式说明，共节省 "
+                f"{stats['bytes_saved']} 字节 / 约 {stats['tokens_saved']} tokens"
+            )
+        self.writer.close()
 
 
 def get_history_manager() -> HistoryManager:
-    """获取历史记录管理器实例
+    """获取当前会话的历史记录管理器实例
+
+    当前会话由 sessions.use_session / set_current_session 指定，默认为 "default"。
 
     Returns:
         历史记录管理器实例
     """
-    global _history_manager
-    if _history_manager is None:
-        _history_manager = HistoryManager()
-    return _history_manager
+    from .sessions import get_current_session, get_session_registry
+
+    return get_session_registry().get(get_current_session())
+
+
+def close_history() -> None:
+    """退出时调用：写完所有会话的历史记录并关闭日志（未创建任何会话时不做任何事）"""
+    from .sessions import close_sessions
+
+    close_sessions()
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+"""历史记录日志（journal）模块
+
+该模块负责:
+1. 以追加写入的JSONL日志记录历史记录的每次变更，写入量与单条消息大小成正比
+2. 按条数或时间间隔批量fsync，减少磁盘同步次数
+3. 日志达到一定条数后压缩为快照文件并截断日志
+4. 加载时读取快照并重放其后的日志
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Dict, Any, Iterable, List
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+
+class HistoryJournal:
+    """历史记录的快照 + 追加日志存储
+
+    日志中的每一行是一条变更记录:
+    - {"op": "append", "message": {...}}          追加一条消息
+    - {"op": "set", "index": i, "message": {...}} 替换第i条消息
+    其余变更（清空、重排等）直接写入新的快照。
+    """
+
+    # 加载后立即压缩，丢弃日志末尾可能不完整的记录
+    compact_on_load = True
+
+    def __init__(
+        self,
+        directory: str,
+        name: str = "history",
+        fsync_every: int = 32,
+        fsync_interval: float = 1.0,
+        compact_every: int = 1000,
+    ):
+        """初始化历史记录日志
+
+        Args:
+            directory: 存储目录
+            name: 文件名前缀，生成 <name>.snapshot.json 与 <name>.jsonl
+            fsync_every: 累计多少条记录后执行一次fsync，0表示不主动fsync
+            fsync_interval: 距离上次fsync超过多少秒后执行一次fsync
+            compact_every: 日志累计多少条记录后压缩为快照，0表示不自动压缩
+        """
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, f"{name}.snapshot.json")
+        self.journal_path = os.path.join(directory, f"{name}.jsonl")
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+
+        # 日志中的记录数（自上次快照以来）
+        self.records = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._file = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _open(self):
+        """以追加模式打开日志文件"""
+        if self._file is None:
+            self._file = open(self.journal_path, "a", encoding="utf-8")
+        return self._file
+
+    def _write(self, record: Dict[str, Any], commit: bool = True) -> None:
+        """追加一条记录
+
+        Args:
+            record: 变更记录
+            commit: 是否立即提交（交给操作系统并按策略fsync）；批量写入时由调用方统一提交
+        """
+        f = self._open()
+        f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str))
+        f.write("\n")
+        self.records += 1
+        self._unsynced += 1
+        if commit:
+            self.commit()
+
+    def commit(self) -> None:
+        """将已写入的记录交给操作系统（进程退出不会丢失），并按策略fsync"""
+        if self._file is None:
+            return
+        self._file.flush()
+        if self.fsync_every and self._unsynced and (
+            self._unsynced >= self.fsync_every
+            or time.monotonic() - self._last_sync >= self.fsync_interval
+        ):
+            self.sync()
+
+    def append(self, message: Dict[str, Any], commit: bool = True) -> None:
+        """记录追加一条消息"""
+        self._write({"op": "append", "message": message}, commit)
+
+    def set(self, index: int, message: Dict[str, Any], commit: bool = True) -> None:
+        """记录替换第index条消息"""
+        self._write({"op": "set", "index": index, "message": message}, commit)
+
+    @property
+    def unsynced(self) -> int:
+        """尚未fsync的记录数"""
+        return self._unsynced
+
+    def sync(self) -> None:
+        """将已写入的记录同步到磁盘"""
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def compact(self, messages: Iterable[Dict[str, Any]]) -> None:
+        """将完整历史写入快照并截断日志
+
+        先写临时文件并fsync，再原子替换快照，最后截断日志；任一步骤中断时，
+        旧快照与日志仍能重放出一致的历史。
+
+        Args:
+            messages: 当前完整的历史记录
+        """
+        temp_path = f"{self.snapshot_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(list(messages), f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with open(self.journal_path, "w", encoding="utf-8") as f:
+            f.flush()
+            os.fsync(f.fileno())
+
+        logger.debug(f"历史记录已压缩为快照，共 {len(messages)} 条消息，日志记录数: {self.records}")
+        self.records = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def load(self) -> List[Dict[str, Any]]:
+        """读取快照并重放日志
+
+        日志末尾不完整的记录（如写入过程中进程被终止）会被忽略。
+
+        Returns:
+            重建的历史记录
+        """
+        messages: List[Dict[str, Any]] = []
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    messages = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.error(f"读取历史记录快照失败: {str(e)}")
+                messages = []
+
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"历史记录日志第 {line_number} 行不完整，忽略其后的内容")
+                        break
+                    self._apply(messages, record)
+                    replayed += 1
+
+        self.records = replayed
+        logger.info(f"已加载历史记录: 快照 + {replayed} 条日志记录，共 {len(messages)} 条消息")
+        return messages
+
+    @staticmethod
+    def _apply(messages: List[Dict[str, Any]], record: Dict[str, Any]) -> None:
+        """将一条日志记录应用到历史记录"""
+        op = record.get("op")
+        if op == "append":
+            messages.append(record["message"])
+        elif op == "set" and 0 <= record.get("index", -1) < len(messages):
+            messages[record["index"]] = record["message"]
+        else:
+            logger.warning(f"忽略无法识别的历史记录日志: {op}")
+
+    def close(self) -> None:
+        """同步并关闭日志文件"""
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
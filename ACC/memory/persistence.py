@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+"""历史记录后台持久化模块
+
+该模块负责:
+1. 在独立线程中写入历史记录日志，文件I/O不出现在请求路径上
+2. 使用有界队列，合并短时间内的多次写入为一次提交
+3. 按持久化级别（none / batched / every）决定fsync时机
+4. 提供刷新与关闭接口，供退出时调用
+"""
+
+import atexit
+import logging
+import queue
+import threading
+from typing import Dict, Any, Iterable, List, Optional
+
+from ..metrics import get_metrics
+from .journal import HistoryJournal
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 持久化级别
+DURABILITY_NONE = "none"          # 只交给操作系统，不主动fsync
+DURABILITY_BATCHED = "batched"    # 后台批量写入，按条数/时间间隔fsync
+DURABILITY_EVERY = "every"        # 每条消息同步写入并fsync（写入会出现在请求路径上）
+DURABILITY_LEVELS = (DURABILITY_NONE, DURABILITY_BATCHED, DURABILITY_EVERY)
+
+# 单次合并提交的最大操作数
+MAX_BATCH = 256
+
+
+class HistoryWriter:
+    """历史记录写入器
+
+    none/batched 级别下由后台线程消费写入队列；every 级别下直接在调用线程写入。
+    """
+
+    def __init__(
+        self,
+        journal: HistoryJournal,
+        durability: str = DURABILITY_BATCHED,
+        queue_size: int = 1024,
+    ):
+        """初始化写入器
+
+        Args:
+            journal: 历史记录日志
+            durability: 持久化级别
+            queue_size: 写入队列容量，队列满时调用方等待（背压）
+        """
+        if durability not in DURABILITY_LEVELS:
+            logger.warning(f"未知的持久化级别: {durability}，使用 {DURABILITY_BATCHED}")
+            durability = DURABILITY_BATCHED
+        self.journal = journal
+        self.durability = durability
+
+        if durability == DURABILITY_NONE:
+            journal.fsync_every = 0
+        elif durability == DURABILITY_EVERY:
+            journal.fsync_every = 1
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        if durability != DURABILITY_EVERY:
+            self._thread = threading.Thread(
+                target=self._run, name="ACC-History-Writer", daemon=True
+            )
+            self._thread.start()
+            # 兜底：解释器退出前写完队列中的内容
+            atexit.register(self.close)
+
+        logger.info(f"历史记录持久化级别: {durability}")
+
+    def append(self, message: Dict[str, Any]) -> None:
+        """追加一条消息"""
+        self._submit(("append", message))
+
+    def set(self, index: int, message: Dict[str, Any]) -> None:
+        """替换第index条消息"""
+        self._submit(("set", index, message))
+
+    def compact(self, messages: Iterable[Dict[str, Any]]) -> None:
+        """写入完整快照（调用方传入之后不会再被修改的历史记录，如冻结的分段）"""
+        self._submit(("compact", messages))
+
+    def _submit(self, operation: tuple) -> None:
+        """提交写入操作"""
+        if self._thread is None or self._closed:
+            # every 级别或已关闭：在调用线程直接写入
+            with self._lock:
+                self._apply(operation)
+                self.journal.commit()
+            return
+        self._queue.put(operation)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待队列中的写入全部完成并同步到磁盘
+
+        Args:
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            是否在超时前完成
+        """
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                self.journal.sync()
+            return True
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """写完队列中的内容并关闭日志（可重复调用）"""
+        if self._closed:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            if not self.flush(timeout):
+                logger.warning("等待历史记录写入超时，部分记录可能未落盘")
+            self._queue.put(("stop",))
+            self._thread.join(timeout)
+        self._closed = True
+        if self._thread is not None:
+            atexit.unregister(self.close)
+        with self._lock:
+            self.journal.close()
+
+    def _apply(self, operation: tuple) -> None:
+        """执行一个写入操作（不提交）"""
+        kind = operation[0]
+        if kind == "append":
+            self.journal.append(operation[1], commit=False)
+        elif kind == "set":
+            self.journal.set(operation[1], operation[2], commit=False)
+        elif kind == "compact":
+            self.journal.compact(operation[1])
+
+    def _drain(self, first: tuple) -> List[tuple]:
+        """取出队列中已有的操作，与first组成一批"""
+        batch = [first]
+        while len(batch) < MAX_BATCH:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _coalesce(batch: List[tuple]) -> List[tuple]:
+        """合并一批操作：最后一次快照之前的追加/替换已包含在快照中，直接丢弃"""
+        last_compact = -1
+        for i, operation in enumerate(batch):
+            if operation[0] == "compact":
+                last_compact = i
+        if last_compact <= 0:
+            return batch
+        return [
+            operation
+            for i, operation in enumerate(batch)
+            if i >= last_compact or operation[0] in ("flush", "stop")
+        ]
+
+    def _run(self) -> None:
+        """后台写入线程"""
+        metrics = get_metrics()
+        while True:
+            try:
+                first = self._queue.get(timeout=self.journal.fsync_interval or None)
+            except queue.Empty:
+                # 空闲时把尚未fsync的记录同步到磁盘
+                if self.durability == DURABILITY_BATCHED and self.journal.unsynced:
+                    with self._lock:
+                        self.journal.sync()
+                continue
+
+            batch = self._drain(first)
+            operations = self._coalesce(batch)
+            waiters = []
+            stop = False
+            with self._lock:
+                try:
+                    for operation in operations:
+                        if operation[0] == "flush":
+                            waiters.append(operation[1])
+                        elif operation[0] == "stop":
+                            stop = True
+                        else:
+                            self._apply(operation)
+                    self.journal.commit()
+                    if waiters:
+                        self.journal.sync()
+                except Exception as e:
+                    logger.error(f"写入历史记录失败: {str(e)}")
+
+            metrics.observe("history.write_batch", len(batch))
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+
+"""会话管理模块
+
+该模块负责:
+1. 维护 会话ID -> 历史记录管理器 的注册表，同一进程内可同时服务多个对话
+2. 每个会话的历史记录存储在工作空间下的独立目录中，多个进程互不覆盖
+3. 按最近使用顺序（LRU）与空闲时间将会话移出内存，再次访问时从磁盘恢复
+4. 以上下文变量记录当前会话，异步任务之间互不干扰
+5. [history] backend = "sqlite" 时所有会话共用一个SQLite数据库
+6. 从检查点分叉出新会话，多个分支可以并行继续同一段对话
+"""
+
+import contextvars
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional
+
+from ..config import get_value
+from .checkpoint import Checkpoint
+from .history import HistoryManager
+from .store import SQLiteStore
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 默认会话ID
+DEFAULT_SESSION = "default"
+
+# 会话ID只允许字母、数字、下划线、点和连字符，防止路径穿越
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+# 当前会话（asyncio任务创建时会复制上下文，因此每个任务可以使用不同的会话）
+_current_session: contextvars.ContextVar = contextvars.ContextVar(
+    "acc_session", default=None
+)
+
+
+def validate_session_id(session_id: str) -> str:
+    """检查会话ID是否合法
+
+    Args:
+        session_id: 会话ID
+
+    Returns:
+        会话ID本身
+
+    Raises:
+        ValueError: 会话ID包含非法字符或长度不合法
+    """
+    if not isinstance(session_id, str) or not _SESSION_ID_PATTERN.match(session_id) \
+            or session_id in (".", ".."):
+        raise ValueError(f"非法的会话ID: {session_id!r}")
+    return session_id
+
+
+def get_current_session() -> str:
+    """获取当前会话ID，未设置时使用 [history] session 配置"""
+    return _current_session.get() or get_value("history", "session", DEFAULT_SESSION)
+
+
+def set_current_session(session_id: str) -> contextvars.Token:
+    """设置当前上下文的会话ID
+
+    Args:
+        session_id: 会话ID
+
+    Returns:
+        用于 reset_current_session 恢复的令牌
+    """
+    return _current_session.set(validate_session_id(session_id))
+
+
+def reset_current_session(token: contextvars.Token) -> None:
+    """恢复 set_current_session 之前的会话ID"""
+    _current_session.reset(token)
+
+
+@contextmanager
+def use_session(session_id: str) -> Iterator[HistoryManager]:
+    """在with块内切换当前会话
+
+    Args:
+        session_id: 会话ID
+
+    Yields:
+        该会话的历史记录管理器
+    """
+    token = set_current_session(session_id)
+    try:
+        yield get_session_registry().get(session_id)
+    finally:
+        reset_current_session(token)
+
+
+class SessionRegistry:
+    """会话注册表
+
+    内存中最多保留 max_sessions 个会话；超出上限或空闲超过 idle_ttl 秒的会话
+    会被写完并关闭，其历史记录保留在磁盘上，再次访问时自动恢复。
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_sessions: int = 16,
+        idle_ttl: float = 0,
+        store: Optional[SQLiteStore] = None,
+    ):
+        """初始化会话注册表
+
+        Args:
+            root: 会话存储根目录，每个会话使用 <root>/<会话ID>/ 子目录
+            max_sessions: 内存中最多保留的会话数，0表示不限制
+            idle_ttl: 会话空闲多少秒后移出内存，0表示不按空闲时间淘汰
+            store: SQLite存储，指定时所有会话保存在该数据库中
+        """
+        self.root = root
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.store = store
+
+        # 会话ID -> (历史记录管理器, 最近访问时间)，按最近访问顺序排列
+        self._sessions: "OrderedDict[str, tuple[HistoryManager, float]]" = OrderedDict()
+        # 本进程中曾被移出内存的会话，再次访问时从磁盘恢复
+        self._evicted = set()
+        self._lock = threading.RLock()
+
+        logger.info(
+            f"会话注册表初始化完成，目录: {root}，会话上限: {max_sessions}，空闲超时: {idle_ttl}秒"
+        )
+
+    @classmethod
+    def from_config(cls) -> "SessionRegistry":
+        """从 [history] 配置创建会话注册表"""
+        workspace = get_value("workspace", "default_path", "workspace")
+        default_root = os.path.join(os.path.abspath(workspace), ".acc_sessions")
+        root = get_value("history", "path", default_root)
+
+        store = None
+        backend = get_value("history", "backend", "journal")
+        if backend == "sqlite":
+            durability = get_value("history", "durability", "batched")
+            store = SQLiteStore(
+                get_value("history", "database", os.path.join(root, "history.db")),
+                synchronous="FULL" if durability == "every" else "NORMAL",
+            )
+        elif backend != "journal":
+            logger.warning(f"未知的历史记录存储后端: {backend}，使用 journal")
+
+        return cls(
+            root=root,
+            max_sessions=get_value("history", "max_sessions", 16),
+            idle_ttl=get_value("history", "idle_ttl", 0),
+            store=store,
+        )
+
+    def session_path(self, session_id: str) -> str:
+        """获取会话的存储目录"""
+        return os.path.join(self.root, validate_session_id(session_id))
+
+    def get(self, session_id: str = DEFAULT_SESSION) -> HistoryManager:
+        """获取会话的历史记录管理器，不存在时创建
+
+        本进程中首次创建的会话按 [history] resume 配置决定是否恢复磁盘上的历史记录；
+        被移出内存后再次访问的会话总是从磁盘恢复。
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            历史记录管理器
+        """
+        validate_session_id(session_id)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            now = time.monotonic()
+            if entry is not None:
+                self._sessions[session_id] = (entry[0], now)
+                self._sessions.move_to_end(session_id)
+                return entry[0]
+
+            resume = True if session_id in self._evicted else None
+            manager = HistoryManager(
+                session_id=session_id,
+                directory=self.session_path(session_id),
+                resume=resume,
+                store=self.store,
+            )
+            self._evicted.discard(session_id)
+            self._sessions[session_id] = (manager, now)
+            self._evict(keep=session_id)
+            return manager
+
+    def fork(
+        self,
+        source: str,
+        checkpoint: Optional[Checkpoint] = None,
+        session_id: Optional[str] = None,
+    ) -> HistoryManager:
+        """从检查点分叉出新会话
+
+        新会话与来源会话共享检查点之前的全部历史（O(1)，不复制消息），
+        之后两者各自独立追加；新会话的完整历史由后台线程写入其存储。
+
+        Args:
+            source: 来源会话ID
+            checkpoint: 检查点，None表示以来源会话的当前状态创建检查点
+            session_id: 新会话ID，None表示自动生成 <来源会话ID>.<随机后缀>
+
+        Returns:
+            新会话的历史记录管理器
+        """
+        if checkpoint is None:
+            checkpoint = self.get(source).checkpoint()
+        session_id = validate_session_id(session_id or f"{source[:50]}.{uuid.uuid4().hex[:8]}")
+        with self._lock:
+            if session_id in self._sessions:
+                raise ValueError(f"会话已存在: {session_id}")
+            manager = HistoryManager(
+                session_id=session_id,
+                directory=self.session_path(session_id),
+                store=self.store,
+                checkpoint=checkpoint,
+            )
+            self._evicted.discard(session_id)
+            self._sessions[session_id] = (manager, time.monotonic())
+            self._evict(keep=session_id)
+        logger.info(f"已从会话 {source} 的检查点 {checkpoint.id} 分叉出会话 {session_id}")
+        return manager
+
+    def _evict(self, keep: str) -> None:
+        """淘汰超出上限或空闲过久的会话（keep 为刚访问的会话，不会被淘汰）"""
+        now = time.monotonic()
+        victims = []
+        for session_id, (_, last_used) in self._sessions.items():
+            if session_id == keep:
+                continue
+            over_limit = self.max_sessions and len(self._sessions) - len(victims) > self.max_sessions
+            idle = self.idle_ttl and now - last_used > self.idle_ttl
+            if over_limit or idle:
+                victims.append(session_id)
+        for session_id in victims:
+            self._release(session_id)
+            logger.info(f"会话 {session_id} 已移出内存")
+
+    def _release(self, session_id: str) -> None:
+        """关闭会话并移出内存，历史记录保留在磁盘上"""
+        manager, _ = self._sessions.pop(session_id)
+        self._evicted.add(session_id)
+        try:
+            manager.close()
+        except Exception as e:
+            logger.error(f"关闭会话 {session_id} 失败: {str(e)}")
+
+    def close(self, session_id: str) -> None:
+        """关闭会话并移出内存（历史记录保留在磁盘上）"""
+        with self._lock:
+            if session_id in self._sessions:
+                self._release(session_id)
+
+    def delete(self, session_id: str) -> None:
+        """关闭会话并删除其磁盘上的历史记录"""
+        with self._lock:
+            self.close(session_id)
+            self._evicted.discard(session_id)
+            if self.store is not None:
+                self.store.delete_session(session_id)
+            else:
+                shutil.rmtree(self.session_path(session_id), ignore_errors=True)
+        logger.info(f"会话 {session_id} 已删除")
+
+    def close_all(self) -> None:
+        """写完并关闭所有内存中的会话"""
+        with self._lock:
+            for session_id in list(self._sessions):
+                self._release(session_id)
+
+    def shutdown(self) -> None:
+        """关闭所有会话以及SQLite存储（之后不应再使用该注册表）"""
+        with self._lock:
+            self.close_all()
+            if self.store is not None:
+                self.store.close()
+                self.store = None
+
+    def active_sessions(self) -> List[str]:
+        """内存中的会话ID（按最近访问顺序，最久未使用的在前）"""
+        with self._lock:
+            return list(self._sessions)
+
+    def stored_sessions(self) -> List[str]:
+        """磁盘上存有历史记录的会话ID"""
+        if self.store is not None:
+            return sorted(session["id"] for session in self.store.list_sessions(limit=-1))
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if _SESSION_ID_PATTERN.match(name) and os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取会话统计"""
+        with self._lock:
+            return {
+                "active": len(self._sessions),
+                "evicted": len(self._evicted),
+                "max_sessions": self.max_sessions,
+            }
+
+
+# 创建全局会话注册表实例
+_session_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_session_registry() -> SessionRegistry:
+    """获取会话注册表实例
+
+    Returns:
+        会话注册表实例
+    """
+    global _session_registry
+    if _session_registry is None:
+        with _registry_lock:
+            if _session_registry is None:
+                _session_registry = SessionRegistry.from_config()
+    return _session_registry
+
+
+def close_sessions() -> None:
+    """写完并关闭所有会话（会话注册表未创建时不做任何事）"""
+    global _session_registry
+    with _registry_lock:
+        registry, _session_registry = _session_registry, None
+    if registry is not None:
+        registry.shutdown()
@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+
+"""SQLite对话存储模块
+
+该模块负责:
+1. 以WAL模式的SQLite数据库归档所有会话的消息与工具调用
+2. 按 会话/时间/工具名 建立索引，按会话恢复时只读取该会话的消息
+3. 对消息内容建立全文索引（FTS5），用于检索历史对话
+4. 提供与 HistoryJournal 相同接口的会话适配器，可直接作为历史记录管理器的存储后端
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Iterable, List, Optional
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 数据库结构
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (session_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_created ON messages (created_at);
+CREATE TABLE IF NOT EXISTS tool_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    call_id TEXT,
+    function TEXT NOT NULL,
+    tool_name TEXT NOT NULL,
+    arguments TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tool_calls_session ON tool_calls (session_id, seq);
+CREATE INDEX IF NOT EXISTS idx_tool_calls_name ON tool_calls (tool_name, created_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at);
+"""
+
+# 全文索引（外部内容表，由触发器与messages表保持同步）
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, content='messages', content_rowid='id', tokenize='{tokenizer}'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE OF content ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+# 代码块中的JSON（经典模式下助手消息的函数调用）
+_JSON_BLOCK = re.compile(r"```(?:json)?\n(.*?)\n```", re.DOTALL)
+
+
+def _content_text(content: Any) -> str:
+    """将消息内容转换为可检索的文本"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(
+            part.get("text", "") for part in content
+            if isinstance(part, dict) and part.get("type") == "text"
+        )
+    return "" if content is None else str(content)
+
+
+def extract_tool_calls(message: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """从助手消息中提取工具调用
+
+    原生模式读取 tool_calls 字段；经典模式解析内容中的JSON函数调用。
+    use_tool 调用以其目标MCP工具名作为 tool_name，其余以函数名作为 tool_name。
+
+    Args:
+        message: 历史消息
+
+    Returns:
+        [{"call_id", "function", "tool_name", "arguments"}, ...]
+    """
+    if message.get("role") != "assistant":
+        return []
+
+    calls = []
+    if message.get("tool_calls"):
+        for tool_call in message["tool_calls"]:
+            function = tool_call.get("function") or {}
+            name = function.get("name", "")
+            raw_arguments = function.get("arguments") or "{}"
+            tool_name = name
+            if name == "use_tool":
+                try:
+                    arguments = json.loads(raw_arguments)
+                except json.JSONDecodeError:
+                    arguments = {}
+                if isinstance(arguments, dict) and arguments.get("value"):
+                    tool_name = str(arguments["value"])
+            calls.append({
+                "call_id": tool_call.get("id"),
+                "function": name,
+                "tool_name": tool_name,
+                "arguments": raw_arguments,
+            })
+        return calls
+
+    content = _content_text(message.get("content"))
+    match = _JSON_BLOCK.search(content)
+    try:
+        parsed = json.loads(match.group(1) if match else content)
+    except (json.JSONDecodeError, TypeError):
+        return []
+    if not isinstance(parsed, dict) or not parsed.get("function"):
+        return []
+    function = str(parsed["function"])
+    tool_name = str(parsed.get("value") or function) if function == "use_tool" else function
+    arguments = parsed.get("tool_value", parsed) if function == "use_tool" else parsed
+    return [{
+        "call_id": None,
+        "function": function,
+        "tool_name": tool_name,
+        "arguments": json.dumps(arguments, ensure_ascii=False, default=str),
+    }]
+
+
+class SQLiteStore:
+    """所有会话共享的SQLite对话存储
+
+    单个连接由锁保护，可在多个写入线程间共享。每次写入（write）在持有锁期间执行一个会话的一批操作并立即提交，
+    因此后台写入器的一批操作对应一次事务提交，不同会话的写入不会进入同一个事务。
+    """
+
+    def __init__(self, path: str, synchronous: str = "NORMAL", busy_timeout: float = 5.0):
+        """初始化存储
+
+        Args:
+            path: 数据库文件路径
+            synchronous: SQLite synchronous 级别（OFF / NORMAL / FULL）
+            busy_timeout: 等待其他进程释放写锁的最长时间（秒）
+        """
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.executescript(_SCHEMA)
+        self.fts = self._create_fts()
+        self._conn.commit()
+
+        logger.info(f"SQLite对话存储初始化完成: {path}，全文索引: {self.fts or '不可用'}")
+
+    def _create_fts(self) -> Optional[str]:
+        """创建全文索引，优先使用trigram分词（支持中文子串检索）
+
+        Returns:
+            使用的分词器名称；当前SQLite不支持FTS5时返回None
+        """
+        for tokenizer in ("trigram", "unicode61"):
+            try:
+                self._conn.executescript(_FTS_SCHEMA.format(tokenizer=tokenizer))
+                return tokenizer
+            except sqlite3.OperationalError:
+                continue
+        logger.warning("当前SQLite不支持FTS5，消息检索将使用LIKE匹配")
+        return None
+
+    def _touch(self, session_id: str, delta: int = 0, count: Optional[int] = None) -> None:
+        """创建或更新会话记录"""
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO sessions (id, created_at, updated_at, message_count) VALUES (?, ?, ?, 0) "
+            "ON CONFLICT(id) DO NOTHING",
+            (session_id, now, now),
+        )
+        if count is None:
+            self._conn.execute(
+                "UPDATE sessions SET updated_at = ?, message_count = message_count + ? WHERE id = ?",
+                (now, delta, session_id),
+            )
+        else:
+            self._conn.execute(
+                "UPDATE sessions SET updated_at = ?, message_count = ? WHERE id = ?",
+                (now, count, session_id),
+            )
+
+    def _insert(self, session_id: str, seq: int, message: Dict[str, Any], now: float) -> None:
+        """插入一条消息及其工具调用"""
+        self._conn.execute(
+            "INSERT INTO messages (session_id, seq, role, content, data, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(session_id, seq) DO UPDATE SET "
+            "role = excluded.role, content = excluded.content, data = excluded.data",
+            (
+                session_id,
+                seq,
+                message.get("role", ""),
+                _content_text(message.get("content")),
+                json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=str),
+                now,
+            ),
+        )
+        self._insert_tool_calls(session_id, seq, message, now)
+
+    def _insert_tool_calls(self, session_id: str, seq: int, message: Dict[str, Any], now: float) -> None:
+        """插入消息中的工具调用"""
+        for call in extract_tool_calls(message):
+            self._conn.execute(
+                "INSERT INTO tool_calls (session_id, seq, call_id, function, tool_name, arguments, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, seq, call["call_id"], call["function"], call["tool_name"], call["arguments"], now),
+            )
+
+    def _append(self, session_id: str, seq: int, message: Dict[str, Any]) -> None:
+        """追加一条消息（调用方持有锁，未提交）"""
+        self._insert(session_id, seq, message, time.time())
+        self._touch(session_id, delta=1)
+
+    def _set(self, session_id: str, seq: int, message: Dict[str, Any]) -> None:
+        """替换会话中第seq条消息（调用方持有锁，未提交）"""
+        now = time.time()
+        self._conn.execute(
+            "UPDATE messages SET role = ?, content = ?, data = ? WHERE session_id = ? AND seq = ?",
+            (
+                message.get("role", ""),
+                _content_text(message.get("content")),
+                json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=str),
+                session_id,
+                seq,
+            ),
+        )
+        self._conn.execute(
+            "DELETE FROM tool_calls WHERE session_id = ? AND seq = ?", (session_id, seq)
+        )
+        self._insert_tool_calls(session_id, seq, message, now)
+        self._touch(session_id)
+
+    def _replace(self, session_id: str, messages: Iterable[Dict[str, Any]]) -> None:
+        """以完整消息列表替换会话内容（调用方持有锁，未提交）"""
+        self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        self._conn.execute("DELETE FROM tool_calls WHERE session_id = ?", (session_id,))
+        now = time.time()
+        count = 0
+        for seq, message in enumerate(messages):
+            self._insert(session_id, seq, message, now)
+            count += 1
+        self._touch(session_id, count=count)
+
+    def write(self, session_id: str, operations: Iterable[tuple]) -> None:
+        """在一个事务中执行会话的一批写操作并提交
+
+        Args:
+            session_id: 会话ID
+            operations: ("append", 序号, 消息) / ("set", 序号, 消息) / ("replace", 消息列表)
+        """
+        with self._lock:
+            try:
+                for operation in operations:
+                    kind = operation[0]
+                    if kind == "append":
+                        self._append(session_id, operation[1], operation[2])
+                    elif kind == "set":
+                        self._set(session_id, operation[1], operation[2])
+                    elif kind == "replace":
+                        self._replace(session_id, operation[1])
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def append(self, session_id: str, seq: int, message: Dict[str, Any]) -> None:
+        """追加一条消息并提交"""
+        self.write(session_id, [("append", seq, message)])
+
+    def set(self, session_id: str, seq: int, message: Dict[str, Any]) -> None:
+        """替换会话中第seq条消息并提交"""
+        self.write(session_id, [("set", seq, message)])
+
+    def replace(self, session_id: str, messages: Iterable[Dict[str, Any]]) -> None:
+        """以完整消息列表替换会话内容并提交"""
+        self.write(session_id, [("replace", messages)])
+
+    def archive_session(self, session_id: str) -> Optional[str]:
+        """将会话已有的消息改存到带时间戳的新会话ID下（立即提交），原会话ID从空白开始
+
+        用于不恢复历史记录的启动：上次运行的记录仍保留在归档中，可被检索。
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            归档使用的会话ID；会话不存在或没有消息时返回None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT updated_at, message_count FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is None or not row["message_count"]:
+                return None
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(row["updated_at"]))
+            archive_id = f"{session_id}@{stamp}"
+            suffix = 1
+            while self._conn.execute("SELECT 1 FROM sessions WHERE id = ?", (archive_id,)).fetchone():
+                suffix += 1
+                archive_id = f"{session_id}@{stamp}-{suffix}"
+            try:
+                self._conn.execute("UPDATE sessions SET id = ? WHERE id = ?", (archive_id, session_id))
+                self._conn.execute("UPDATE messages SET session_id = ? WHERE session_id = ?", (archive_id, session_id))
+                self._conn.execute("UPDATE tool_calls SET session_id = ? WHERE session_id = ?", (archive_id, session_id))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return archive_id
+
+    def load(self, session_id: str) -> List[Dict[str, Any]]:
+        """读取会话的全部消息（只扫描该会话的索引范围，与归档总量无关）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def search(
+        self, query: str, session_id: Optional[str] = None, limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """全文检索消息内容
+
+        Args:
+            query: 检索文本（按短语匹配）
+            session_id: 只检索指定会话，None表示所有会话
+            limit: 最多返回的条数
+
+        Returns:
+            [{"session_id", "seq", "role", "content", "created_at"}, ...]，按时间倒序
+        """
+        if self.fts and (self.fts != "trigram" or len(query) >= 3):
+            sql = (
+                "SELECT m.session_id, m.seq, m.role, m.content, m.created_at FROM messages_fts f "
+                "JOIN messages m ON m.id = f.rowid WHERE messages_fts MATCH ?"
+            )
+            params: List[Any] = ['"' + query.replace('"', '""') + '"']
+        else:
+            # 不支持FTS5或检索词短于trigram长度时退回LIKE匹配
+            escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            sql = (
+                "SELECT m.session_id, m.seq, m.role, m.content, m.created_at FROM messages m "
+                "WHERE m.content LIKE ? ESCAPE '\\'"
+            )
+            params = [f"%{escaped}%"]
+        if session_id is not None:
+            sql += " AND m.session_id = ?"
+            params.append(session_id)
+        sql += " ORDER BY m.created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def find_tool_calls(
+        self, tool_name: str, session_id: Optional[str] = None, limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """按工具名查询工具调用
+
+        Args:
+            tool_name: 工具名（use_tool 调用为目标MCP工具名）
+            session_id: 只查询指定会话，None表示所有会话
+            limit: 最多返回的条数
+
+        Returns:
+            [{"session_id", "seq", "call_id", "function", "tool_name", "arguments", "created_at"}, ...]，按时间倒序
+        """
+        sql = (
+            "SELECT session_id, seq, call_id, function, tool_name, arguments, created_at "
+            "FROM tool_calls WHERE tool_name = ?"
+        )
+        params: List[Any] = [tool_name]
+        if session_id is not None:
+            sql += " AND session_id = ?"
+            params.append(session_id)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def list_sessions(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """列出最近更新的会话"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, created_at, updated_at, message_count FROM sessions "
+                "ORDER BY updated_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_session(self, session_id: str) -> None:
+        """删除会话及其全部消息（立即提交）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM tool_calls WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._conn.commit()
+
+    def close(self) -> None:
+        """提交并关闭数据库连接"""
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+class SQLiteJournal:
+    """单个会话在SQLite存储中的视图，接口与 HistoryJournal 相同
+
+    消息按会话内序号存储，替换与重写都只涉及该会话的行；无需压缩，
+    加载时也不需要重放日志。未提交的操作缓存在本会话中，提交时在存储的锁内一次写入，
+    因此一个会话的提交不会带上其他会话写了一半的批次。
+    """
+
+    # 加载后无需重写（不存在不完整的日志尾部）
+    compact_on_load = False
+
+    def __init__(self, store: SQLiteStore, session_id: str):
+        """初始化会话视图
+
+        Args:
+            store: 共享的SQLite存储
+            session_id: 会话ID
+        """
+        self.store = store
+        self.session_id = session_id
+        # 由后台写入器按持久化级别设置；SQLite以事务提交代替fsync
+        self.fsync_every = 0
+        self.fsync_interval = 1.0
+        self.compact_every = 0
+        self.records = 0
+        # 会话中的消息数（下一条消息的序号）
+        self._count = 0
+        # 尚未提交的写操作
+        self._pending: List[tuple] = []
+
+    def append(self, message: Dict[str, Any], commit: bool = True) -> None:
+        """追加一条消息"""
+        self._pending.append(("append", self._count, message))
+        self._count += 1
+        if commit:
+            self.commit()
+
+    def set(self, index: int, message: Dict[str, Any], commit: bool = True) -> None:
+        """替换第index条消息"""
+        self._pending.append(("set", index, message))
+        if commit:
+            self.commit()
+
+    @property
+    def unsynced(self) -> int:
+        """尚未提交的操作数"""
+        return len(self._pending)
+
+    def commit(self) -> None:
+        """在一个事务中写入并提交缓存的操作"""
+        if self._pending:
+            operations, self._pending = self._pending, []
+            self.store.write(self.session_id, operations)
+
+    def sync(self) -> None:
+        """提交事务（WAL模式下由SQLite负责落盘）"""
+        self.commit()
+
+    def compact(self, messages: Iterable[Dict[str, Any]]) -> None:
+        """以完整历史记录重写该会话并提交"""
+        self._pending.append(("replace", messages))
+        self.commit()
+        self._count = len(messages)
+
+    def load(self) -> List[Dict[str, Any]]:
+        """读取该会话的历史记录"""
+        messages = self.store.load(self.session_id)
+        self._count = len(messages)
+        logger.info(f"已从SQLite加载会话 {self.session_id}，共 {len(messages)} 条消息")
+        return messages
+
+    def close(self) -> None:
+        """提交未完成的写入（共享的数据库连接由存储本身关闭）"""
+        self.commit()
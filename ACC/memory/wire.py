@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+"""请求消息（wire格式）缓存模块
+
+该模块负责:
+1. 维护与历史记录一一对应、可直接发送给API的消息列表
+2. 缓存每条消息的JSON序列化结果和token估算值，新消息追加时只处理新消息本身
+3. 由缓存的片段拼接请求体，避免每轮重新序列化全部历史
+4. 缓存可以冻结为快照，分叉的会话共享已有的片段
+"""
+
+import json
+import logging
+from collections import ChainMap
+from typing import Dict, Any, List, Optional, Tuple
+
+from ..tokens import estimate_message_tokens
+from .checkpoint import PersistentList, Segment, MAX_SEGMENT_DEPTH, fork_positions
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+
+def serialize_message(message: Dict[str, Any]) -> str:
+    """序列化单条消息（紧凑格式，保留非ASCII字符）"""
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+# 仅在历史记录中使用、不发送给API的字段
+INTERNAL_FIELDS = ("summary_of",)
+
+
+def to_wire_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """将历史记录中的消息转换为发送格式
+
+    用户消息的文本转换为内容对象列表，内部字段被移除，其余消息原样发送。
+    """
+    if message["role"] == "user" and isinstance(message.get("content"), str):
+        wire_message = dict(message)
+        wire_message["content"] = [{"type": "text", "text": message["content"]}]
+        return wire_message
+    if any(field in message for field in INTERNAL_FIELDS):
+        return {key: value for key, value in message.items() if key not in INTERNAL_FIELDS}
+    return message
+
+
+def encode_payload(payload: Dict[str, Any], messages_json: str) -> bytes:
+    """用预先拼接好的消息JSON组装请求体
+
+    Args:
+        payload: 不含messages字段的请求体
+        messages_json: 消息列表的JSON数组文本
+
+    Returns:
+        UTF-8编码的请求体
+    """
+    rest = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+    body = '{"messages":' + messages_json
+    body += "," + rest[1:] if rest != "{}" else "}"
+    return body.encode("utf-8")
+
+
+class WireMessages:
+    """可直接发送的消息列表，缓存每条消息的序列化片段与token估算"""
+
+    def __init__(self, snapshot: Optional[Tuple[Segment, Segment, Segment, Tuple[Dict[int, int], ...]]] = None):
+        """初始化消息列表
+
+        Args:
+            snapshot: 可选的缓存快照（freeze 的返回值），新列表与快照共享已有内容
+        """
+        if snapshot is None:
+            self.clear()
+            return
+        messages, fragments, tokens, positions = snapshot
+        self.messages = PersistentList.from_segment(messages)
+        self._fragments = PersistentList.from_segment(fragments)
+        self._tokens = PersistentList.from_segment(tokens)
+        self._positions = fork_positions(positions)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def append(self, message: Dict[str, Any]) -> None:
+        """追加一条历史消息（O(1)）"""
+        wire_message = to_wire_message(message)
+        self._positions[id(wire_message)] = len(self.messages)
+        self.messages.append(wire_message)
+        self._fragments.append(serialize_message(wire_message))
+        self._tokens.append(estimate_message_tokens(wire_message))
+
+    def set(self, index: int, message: Dict[str, Any]) -> None:
+        """替换指定位置的消息（如系统提示词更新）"""
+        self._positions.pop(id(self.messages[index]), None)
+        wire_message = to_wire_message(message)
+        self.messages[index] = wire_message
+        self._fragments[index] = serialize_message(wire_message)
+        self._tokens[index] = estimate_message_tokens(wire_message)
+        self._positions[id(wire_message)] = index
+
+    def rebuild(self, history: List[Dict[str, Any]]) -> None:
+        """按历史记录整体重建（仅在历史被重排或裁剪时使用）"""
+        self.clear()
+        for message in history:
+            self.append(message)
+
+    def clear(self) -> None:
+        """清空消息列表"""
+        self.messages = PersistentList()
+        self._fragments = PersistentList()
+        self._tokens = PersistentList()
+        # id(消息) -> 下标，用于按对象查找缓存
+        self._positions = ChainMap({})
+
+    def freeze(self) -> Tuple[Segment, Segment, Segment, Tuple[Dict[int, int], ...]]:
+        """冻结当前缓存，返回可共享的快照（只处理上次冻结之后的变更）"""
+        if len(self._positions.maps) >= MAX_SEGMENT_DEPTH:
+            # 索引链过深时合并
+            self._positions = ChainMap(dict(self._positions))
+        frozen_positions = tuple(self._positions.maps)
+        self._positions = self._positions.new_child()
+        return (
+            self.messages.freeze(),
+            self._fragments.freeze(),
+            self._tokens.freeze(),
+            frozen_positions,
+        )
+
+    def _position(self, message: Dict[str, Any]) -> int:
+        """查找消息在缓存中的下标，不在缓存中时返回-1"""
+        index = self._positions.get(id(message), -1)
+        if index >= 0 and self.messages[index] is message:
+            return index
+        return -1
+
+    def fragments_for(self, messages: List[Dict[str, Any]]) -> List[str]:
+        """获取消息列表的序列化片段，缓存中的消息直接复用"""
+        fragments = []
+        for message in messages:
+            index = self._position(message)
+            fragments.append(
+                self._fragments[index] if index >= 0 else serialize_message(message)
+            )
+        return fragments
+
+    def tokens_for(self, messages: List[Dict[str, Any]]) -> List[int]:
+        """获取消息列表中每条消息的token估算，缓存中的消息直接复用"""
+        tokens = []
+        for message in messages:
+            index = self._position(message)
+            tokens.append(
+                self._tokens[index] if index >= 0 else estimate_message_tokens(message)
+            )
+        return tokens
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+"""ACC运行指标模块
+
+该模块负责:
+1. 记录计数类指标（如请求次数、重试次数）
+2. 记录观测类指标（如延迟、字节数），汇总为次数/总和/最小/最大/最近值
+3. 提供指标快照，便于日志输出和调试
+"""
+
+import logging
+import threading
+from typing import Dict, Any
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+
+def _metric_key(name: str, labels: Dict[str, Any]) -> str:
+    """生成带标签的指标键，例如 llm.attempts{endpoint=main,outcome=success}"""
+    if not labels:
+        return name
+    label_text = ",".join(f"{key}={labels[key]}" for key in sorted(labels))
+    return f"{name}{{{label_text}}}"
+
+
+class MetricsRegistry:
+    """线程安全的进程内指标注册表"""
+
+    def __init__(self):
+        """初始化指标注册表"""
+        self._counters: Dict[str, float] = {}
+        self._observations: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1, **labels: Any) -> None:
+        """累加计数指标
+
+        Args:
+            name: 指标名称
+            value: 增量，默认为1
+            **labels: 指标标签
+        """
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """记录一次观测值
+
+        Args:
+            name: 指标名称
+            value: 观测值
+            **labels: 指标标签
+        """
+        key = _metric_key(name, labels)
+        with self._lock:
+            summary = self._observations.get(key)
+            if summary is None:
+                self._observations[key] = {
+                    "count": 1,
+                    "sum": value,
+                    "min": value,
+                    "max": value,
+                    "last": value,
+                }
+                return
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["min"] = min(summary["min"], value)
+            summary["max"] = max(summary["max"], value)
+            summary["last"] = value
+
+    def get_counter(self, name: str, **labels: Any) -> float:
+        """获取计数指标的当前值"""
+        with self._lock:
+            return self._counters.get(_metric_key(name, labels), 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """获取所有指标的快照
+
+        Returns:
+            包含counters和observations两部分的字典
+        """
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "observations": {
+                    key: dict(summary) for key, summary in self._observations.items()
+                },
+            }
+
+    def reset(self) -> None:
+        """清空所有指标"""
+        with self._lock:
+            self._counters.clear()
+            self._observations.clear()
+
+    def log_summary(self) -> None:
+        """将当前指标写入日志"""
+        snapshot = self.snapshot()
+        for key, value in sorted(snapshot["counters"].items()):
+            logger.info(f"[指标] {key} = {value}")
+        for key, summary in sorted(snapshot["observations"].items()):
+            average = summary["sum"] / summary["count"] if summary["count"] else 0
+            logger.info(
+                f"[指标] {key} 次数={summary['count']} 平均={average:.3f} "
+                f"最小={summary['min']:.3f} 最大={summary['max']:.3f}"
+            )
+
+
+# 创建全局指标注册表实例
+_metrics = None
+
+
+def get_metrics() -> MetricsRegistry:
+    """获取指标注册表实例
+
+    Returns:
+        指标注册表实例
+    """
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsRegistry()
+    return _metrics
@@ -67,10 +67,22 @@ Examples for each function:
      }}
    }}
 
+   To run several independent tools in one step (for example reading three files), list them in "calls" instead of "tool_value".
+   They are executed in parallel and all results are returned together in the next message:
+   {{
+     "function": "use_tool",
+     "value": "read_file",    // value is the first tool name
+     "calls": [
+       {{"value": "read_file", "tool_value": {{"path": "D:/a.txt"}}}},
+       {{"value": "read_file", "tool_value": {{"path": "D:/b.txt"}}}}
+     ]
+   }}
+   Only put calls in the same step when none of them depends on the result of another.
+
 5. tool_list - List tools
    {{
      "function": "tool_list",
-     "value": "tools"    // value must be "tools"
+     "value": "tools"    // "tools" lists all tools; keywords (e.g. "excel chart") search for matching tools
    }}
 
 </function>
@@ -721,6 +733,38 @@ IMPORTANT: This memory interaction workflow is MANDATORY for ALL user interactio
 </memory_interaction_workflow>
 """
 
+# prefix_cache 布局下替换系统提示词中的 {date_time}，实际时间放在最新消息的 <current_context> 中
+DATE_TIME_IN_CONTEXT = "(see DateTime in <current_context> of the latest message)"
+
+# 原生工具调用模式下替换系统提示词中的 <task_description> 部分
+NATIVE_TASK_DESCRIPTION = """<task_description>
+
+Every action is a call to one of the provided functions: "search_tool_info", "print_for_user", "need_user_input", "use_tool", "tool_list".
+Always respond with exactly one function call. Put the function's value in "value", the parameters of use_tool in "tool_value", and the next task description in "status".
+The only exception is use_tool: several independent use_tool calls (for example reading three files) may be issued in the same response. They are executed in parallel; only do this when none of them depends on the result of another.
+The JSON examples in this prompt show the arguments of these function calls; do not print them as text.
+
+Before using all the tools in the tool list, you must run the search_tool_info command to query the detailed call information and call format of the tool.
+
+The result of each function call is returned as the tool message of that call.
+
+</task_description>"""
+
+# schema_mode = "inline" 时，系统提示词中要求先调用 search_tool_info 的段落（正则）
+SEARCH_FIRST_PATTERNS = (
+    r"Before using all the tools in the tool list, you must run the search_tool_info command[^\n]*",
+    r"CRITICAL REQUIREMENT: Before calling ANY tool.*?restart the process correctly\.",
+    r"STRICT ENFORCEMENT: .*?any other tools\.",
+)
+
+# schema_mode = "inline" 时替换上述段落的说明
+INLINE_SCHEMA_RULE = """Call use_tool directly with the tool name and the arguments you intend to pass; you do not need to call search_tool_info first. The parameters of each tool are listed next to its name in the tool list ("?" marks optional parameters).
+ACC checks the arguments against the tool's input schema before running it. If they do not match, the tool is not executed and the reply contains the validation errors together with the full schema of the tool; correct the arguments and call use_tool again.
+Use search_tool_info only when the tool list does not give you enough information to choose the arguments."""
+
+# tools.list_mode = "ranked" 时附加在工具列表末尾，说明还有未列出的工具
+MORE_TOOLS_STUB = """... and {count} more tools are installed but not listed here. If none of the listed tools fits the task, call tool_list with keywords describing what you need (e.g. "excel chart") to search for matching tools, or with "tools" to list all of them."""
+
 MISS_FUCTION = """The "function" field you provided is not valid. Please select a valid "function" field.
 The "function" field can only have the following status values: "search_tool_info","print_for_user","need_user_input","use_tool","tool_list".
 
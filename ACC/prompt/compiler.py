@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""提示词模板编译模块
+
+该模块负责:
+1. 把含 {字段} 占位符的提示词模板一次性切分为固定片段和字段，渲染时只做一次拼接
+2. 预先填入不变的字段（partial），得到只剩易变字段的模板，每次请求只渲染易变字段
+
+与链式 str.replace 不同，填入的字段值不会再被当作模板解析，
+字段值中出现的 {date_time} 等文本会原样保留。
+"""
+
+import re
+from typing import Iterable, List
+
+
+class PromptTemplate:
+    """预编译的提示词模板
+
+    parts 比 fields 多一项，渲染结果为 parts[0] + 值(fields[0]) + parts[1] + ... + parts[-1]。
+    """
+
+    def __init__(self, parts: List[str], fields: List[str]):
+        self.parts = parts
+        self.fields = fields
+
+    @classmethod
+    def compile(cls, template: str, fields: Iterable[str]) -> "PromptTemplate":
+        """切分模板
+
+        Args:
+            template: 提示词模板
+            fields: 占位符名称（模板中写作 {名称}），其他花括号文本按原样保留
+
+        Returns:
+            编译后的模板
+        """
+        names = list(fields)
+        if not names:
+            return cls([template], [])
+        pattern = re.compile("|".join(re.escape(f"{{{name}}}") for name in names))
+        parts: List[str] = []
+        slots: List[str] = []
+        position = 0
+        for match in pattern.finditer(template):
+            parts.append(template[position:match.start()])
+            slots.append(match.group()[1:-1])
+            position = match.end()
+        parts.append(template[position:])
+        return cls(parts, slots)
+
+    def partial(self, **values: str) -> "PromptTemplate":
+        """填入部分字段，返回只剩其余字段的模板（相邻的固定片段合并为一段）"""
+        pieces: List[str] = [self.parts[0]]
+        parts: List[str] = []
+        fields: List[str] = []
+        for name, part in zip(self.fields, self.parts[1:]):
+            if name in values:
+                pieces.append(values[name])
+                pieces.append(part)
+            else:
+                parts.append("".join(pieces))
+                fields.append(name)
+                pieces = [part]
+        parts.append("".join(pieces))
+        return PromptTemplate(parts, fields)
+
+    def render(self, **values: str) -> str:
+        """渲染模板，所有剩余字段都必须给出"""
+        if not self.fields:
+            return self.parts[0]
+        pieces = [self.parts[0]]
+        for name, part in zip(self.fields, self.parts[1:]):
+            pieces.append(values[name])
+            pieces.append(part)
+        return "".join(pieces)
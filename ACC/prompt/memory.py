@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+# 压缩较早对话时使用的系统提示词
+COMPACTION_PROMPT = """You maintain the long-term memory of an AI agent called ACC.
+You receive the previous memory (may be empty) and the oldest part of the conversation that is about to leave the context window.
+Rewrite them into one updated memory that ACC can rely on instead of the original messages.
+
+Keep:
+- the user's goals, requests, preferences and constraints
+- decisions made, plans and their current progress
+- facts learned from tool results: names, paths, identifiers, numbers, errors and their causes
+- open questions and unfinished work
+
+Drop greetings, repeated instructions, reply format requirements and raw tool output that has already been used.
+Tool results should be reduced to the facts they established.
+Write plain text in the language of the conversation, as concise bullet points, no more than {max_words} words.
+Output only the memory."""
+
+# 固定在系统提示词之后的记忆消息
+MEMORY_PROMPT = """<memory>
+The earlier part of this conversation has been condensed into the following memory:
+{summary}
+</memory>"""
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""原生工具调用模式下发送给模型的函数定义"""
+
+import copy
+
+# 各函数通用的可选字段
+_STATUS_PROPERTY = {
+    "type": "string",
+    "description": "next task description, a complete sentence tell user what to do next",
+}
+
+ACC_FUNCTION_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "search_tool_info",
+            "description": "Get the detailed calling information and parameter schema of a tool. "
+            "Must be called before use_tool for every tool.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "value": {"type": "string", "description": "the tool name to query"},
+                    "status": _STATUS_PROPERTY,
+                },
+                "required": ["value"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "print_for_user",
+            "description": "Display a message to the user.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "value": {"type": "string", "description": "the message to display"},
+                    "status": _STATUS_PROPERTY,
+                },
+                "required": ["value"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "need_user_input",
+            "description": "Ask the user for input and wait for the reply.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "value": {"type": "string", "description": "the prompt message"},
+                    "status": _STATUS_PROPERTY,
+                },
+                "required": ["value"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "use_tool",
+            "description": "Execute a tool from the tool list with its parameters. "
+            "Independent use_tool calls may be issued together in one response and run in parallel.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "value": {"type": "string", "description": "the tool name"},
+                    "tool_value": {
+                        "type": "object",
+                        "description": "the parameters of the tool, as described by search_tool_info",
+                    },
+                    "status": _STATUS_PROPERTY,
+                },
+                "required": ["value", "tool_value"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "tool_list",
+            "description": "List the available tools, or search them by keywords.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "value": {
+                        "type": "string",
+                        "description": '"tools" to list all tools, or keywords describing the tool you need',
+                    },
+                    "status": _STATUS_PROPERTY,
+                },
+                "required": ["value"],
+            },
+        },
+    },
+]
+
+# ACC内置函数名称
+ACC_FUNCTION_NAMES = tuple(tool["function"]["name"] for tool in ACC_FUNCTION_TOOLS)
+
+# schema_mode = "inline" 时发送的函数定义：参数在本地按输入格式校验，不要求先调用 search_tool_info
+ACC_FUNCTION_TOOLS_INLINE = copy.deepcopy(ACC_FUNCTION_TOOLS)
+for _tool in ACC_FUNCTION_TOOLS_INLINE:
+    _function = _tool["function"]
+    if _function["name"] == "search_tool_info":
+        _function["description"] = (
+            "Get the detailed calling information and parameter schema of a tool. "
+            "Only needed when the parameters listed in the tool list are not enough to call the tool."
+        )
+    elif _function["name"] == "use_tool":
+        _function["parameters"]["properties"]["tool_value"]["description"] = (
+            "the parameters of the tool, as listed next to its name in the tool list; "
+            "they are validated against the tool's input schema before it runs"
+        )
+del _tool, _function
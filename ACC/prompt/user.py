@@ -3,10 +3,23 @@
 USER_PROMPT = """"user_status": "{{user_status_name}}",
 Please reply strictly in json format. The json format should be as follows:
 {{
-  "plan": "[steps array with id and title fields]",
-  "status": "[next task description, a complete sentence tell user what to do next]",
   "function": "[movement]",
   "value": "[value of function]",
-  "tool_value": "[value of use_tool]"
+  "tool_value": "[value of use_tool]",
+  "plan": "[steps array with id and title fields]",
+  "status": "[next task description, a complete sentence tell user what to do next]"
 }}
 """
+
+# 原生工具调用模式下只保留状态标记，回复格式由函数定义约束
+NATIVE_USER_PROMPT = """"user_status": "{{user_status_name}}"
+"""
+
+# 写入历史记录的状态标记：完整的回复格式说明只附加在最新一条消息上，不在历史中重复
+USER_STATUS_TAG = NATIVE_USER_PROMPT
+
+CURRENT_CONTEXT_PROMPT = """<current_context>
+DateTime: {date_time}
+user_status: {user_status}
+</current_context>
+"""
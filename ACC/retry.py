@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+"""ACC请求重试策略模块
+
+该模块负责:
+1. 指数退避加随机抖动的重试间隔计算
+2. 解析 429/503 响应中的 Retry-After 头
+3. 按状态码区分可重试与不可重试的错误
+4. 按端点维护熔断器，服务端持续故障时快速失败
+"""
+
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Dict, Optional, Iterable
+
+import aiohttp
+
+from .config import get_value
+from .transport import HTTPStatusError
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 默认可重试的HTTP状态码（请求超时、冲突、限流和服务端错误）
+DEFAULT_RETRY_STATUSES = (408, 409, 425, 429, 500, 502, 503, 504)
+
+# 熔断器状态
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+
+    def __init__(self, name: str, retry_in: float):
+        self.name = name
+        self.retry_in = retry_in
+        super().__init__(f"端点 {name} 已熔断，{retry_in:.1f}秒后允许探测请求")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After头
+
+    Args:
+        value: 头部值，可以是秒数或HTTP日期
+
+    Returns:
+        需要等待的秒数；无法解析时返回None
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RetryPolicy:
+    """重试策略：指数退避 + 抖动 + Retry-After + 状态码分类"""
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        multiplier: float = 2.0,
+        jitter: float = 0.5,
+        retry_statuses: Iterable[int] = DEFAULT_RETRY_STATUSES,
+        max_retry_after: float = 120.0,
+    ):
+        """初始化重试策略
+
+        Args:
+            max_attempts: 最大尝试次数（包含首次请求）
+            base_delay: 首次重试的基础等待时间（秒）
+            max_delay: 单次等待时间上限（秒）
+            multiplier: 每次重试的等待时间倍数
+            jitter: 抖动比例（0~1），实际等待时间在 [delay*(1-jitter), delay] 内随机
+            retry_statuses: 可重试的HTTP状态码
+            max_retry_after: 服务端Retry-After允许的最大等待时间（秒）
+        """
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        self.retry_statuses = frozenset(retry_statuses)
+        self.max_retry_after = max_retry_after
+
+    @classmethod
+    def from_config(cls) -> "RetryPolicy":
+        """从 [llm.retry] 配置创建重试策略"""
+        return cls(
+            max_attempts=get_value("llm.retry", "max_attempts", 4),
+            base_delay=get_value("llm.retry", "base_delay", 1.0),
+            max_delay=get_value("llm.retry", "max_delay", 30.0),
+            multiplier=get_value("llm.retry", "multiplier", 2.0),
+            jitter=get_value("llm.retry", "jitter", 0.5),
+            retry_statuses=get_value("llm.retry", "retry_statuses", DEFAULT_RETRY_STATUSES),
+            max_retry_after=get_value("llm.retry", "max_retry_after", 120.0),
+        )
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """判断错误是否值得重试
+
+        网络错误和超时总是可重试；HTTP错误仅在状态码属于可重试集合时重试，
+        400/401/403/404等客户端错误直接失败。
+        """
+        if isinstance(error, HTTPStatusError):
+            return error.status in self.retry_statuses
+        return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+    def compute_delay(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """计算第attempt次失败后的等待时间
+
+        Args:
+            attempt: 已失败的次数（从1开始）
+            error: 本次失败的错误，用于读取Retry-After
+
+        Returns:
+            等待秒数
+        """
+        if isinstance(error, HTTPStatusError) and error.status in (429, 503):
+            retry_after = parse_retry_after(error.headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(retry_after, self.max_retry_after)
+
+        delay = min(self.max_delay, self.base_delay * (self.multiplier ** (attempt - 1)))
+        return delay * (1 - self.jitter * random.random())
+
+
+class CircuitBreaker:
+    """单个端点的熔断器
+
+    连续失败达到阈值后进入打开状态，期间请求直接失败；超过重置时间后进入半开状态，
+    允许一个探测请求，成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """初始化熔断器
+
+        Args:
+            name: 端点名称
+            failure_threshold: 连续失败多少次后熔断
+            reset_timeout: 熔断持续时间（秒）
+        """
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = reset_timeout
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """判断当前是否允许发出请求"""
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = STATE_HALF_OPEN
+                self._probe_in_flight = False
+                logger.info(f"熔断器 [{self.name}] 进入半开状态，允许探测请求")
+            # 半开状态只放行一个探测请求
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def retry_in(self) -> float:
+        """距离允许下一次探测请求的秒数"""
+        with self._lock:
+            if self.state != STATE_OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self) -> None:
+        """记录一次成功请求"""
+        with self._lock:
+            if self.state != STATE_CLOSED:
+                logger.info(f"熔断器 [{self.name}] 已恢复")
+            self.state = STATE_CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """记录一次端点故障（网络错误、超时或5xx）"""
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != STATE_OPEN:
+                    logger.warning(
+                        f"熔断器 [{self.name}] 打开，连续失败 {self.consecutive_failures} 次，"
+                        f"{self.reset_timeout}秒内快速失败"
+                    )
+                self.state = STATE_OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """请求未产生端点健康结论（如4xx）时释放半开探测名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """判断错误是否表明端点本身故障（计入熔断器）
+
+    限流（429）和客户端错误（4xx）不代表端点宕机，不计入熔断。
+    """
+    if isinstance(error, HTTPStatusError):
+        return error.status >= 500
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+# 端点名称 -> 熔断器
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> Optional[CircuitBreaker]:
+    """获取指定端点的熔断器
+
+    Args:
+        name: 端点名称
+
+    Returns:
+        熔断器实例；如果 [llm.circuit_breaker] enable = false 则返回None
+    """
+    if not get_value("llm.circuit_breaker", "enable", True):
+        return None
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                name,
+                failure_threshold=get_value("llm.circuit_breaker", "failure_threshold", 5),
+                reset_timeout=get_value("llm.circuit_breaker", "reset_timeout", 30.0),
+            )
+            _breakers[name] = breaker
+        return breaker
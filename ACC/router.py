@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+
+"""ACC多端点LLM路由模块
+
+该模块负责:
+1. 管理 [[llm.endpoints]] 中配置的多个OpenAI兼容网关
+2. 按延迟EWMA与在途请求数选择端点
+3. 端点返回5xx或超时时立即切换到下一个端点
+4. 可选的对冲请求：超过p95延迟仍未返回时向第二个端点发送重复请求
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Set
+
+from .config import get_value
+from .metrics import get_metrics
+from .retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    get_circuit_breaker,
+    is_endpoint_failure,
+)
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 每个端点保留的最近延迟样本数（用于计算p95）
+LATENCY_WINDOW = 200
+
+
+class Endpoint:
+    """单个LLM端点及其运行统计"""
+
+    def __init__(self, name: str, base_url: str, api_key: str, model: str):
+        """初始化端点
+
+        Args:
+            name: 端点名称（用于日志、指标和熔断器）
+            base_url: OpenAI兼容API地址
+            api_key: API密钥
+            model: 该端点使用的模型名称
+        """
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+
+        # 延迟的指数加权移动平均（秒），尚无样本时为None
+        self.ewma_latency: Optional[float] = None
+        # 在途请求数
+        self.inflight = 0
+        # 最近的延迟样本
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        # 熔断器（可能被配置关闭）
+        self.breaker: Optional[CircuitBreaker] = get_circuit_breaker(name)
+
+    @property
+    def url(self) -> str:
+        """补全接口地址"""
+        return f"{self.base_url}/chat/completions"
+
+    def headers(self) -> Dict[str, str]:
+        """构建请求头"""
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}",
+        }
+
+    def available(self) -> bool:
+        """端点当前是否可用（熔断器未打开），不占用半开探测名额"""
+        return self.breaker is None or self.breaker.retry_in() <= 0
+
+    def score(self) -> float:
+        """路由评分，越小越优先
+
+        预计等待时间 = EWMA延迟 × (在途请求数 + 1)；没有延迟样本的端点评分为0，
+        优先获得探测流量。
+        """
+        if self.ewma_latency is None:
+            return 0.0
+        return self.ewma_latency * (self.inflight + 1)
+
+    def record_latency(self, latency: float, alpha: float) -> None:
+        """记录一次成功请求的延迟"""
+        self.latencies.append(latency)
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = alpha * latency + (1 - alpha) * self.ewma_latency
+
+    def p95(self) -> Optional[float]:
+        """最近延迟样本的p95（秒）"""
+        if not self.latencies:
+            return None
+        samples = sorted(self.latencies)
+        index = min(len(samples) - 1, int(len(samples) * 0.95))
+        return samples[index]
+
+
+class LLMRouter:
+    """在多个端点之间选择、故障切换和对冲请求"""
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        ewma_alpha: float = 0.3,
+        hedge: bool = False,
+        hedge_min_samples: int = 20,
+    ):
+        """初始化路由器
+
+        Args:
+            endpoints: 端点列表（至少一个）
+            ewma_alpha: EWMA平滑系数
+            hedge: 是否启用对冲请求
+            hedge_min_samples: 启用对冲前端点至少需要的延迟样本数
+        """
+        if not endpoints:
+            raise ValueError("LLM路由器至少需要一个端点")
+        self.endpoints = endpoints
+        self.ewma_alpha = ewma_alpha
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+
+    @classmethod
+    def from_config(cls, section: str = "llm") -> "LLMRouter":
+        """从配置创建路由器
+
+        优先读取 [[<section>.endpoints]] 列表；列表中缺省的字段继承 [<section>] 中的
+        base_url/api_key/model。未配置列表时使用 [<section>] 本身作为唯一端点。
+
+        Args:
+            section: 配置部分名称，如 "llm" 或 "llm.vision"
+        """
+        default_model = get_value(section, "model")
+        default_base_url = get_value(section, "base_url")
+        default_api_key = get_value(section, "api_key")
+        default_name = "vision" if section.endswith("vision") else "main"
+
+        endpoint_configs = get_value(section, "endpoints") or []
+        endpoints = []
+        for i, item in enumerate(endpoint_configs, 1):
+            base_url = item.get("base_url", default_base_url)
+            if not base_url:
+                logger.warning(f"跳过未配置base_url的端点: {item.get('name', i)}")
+                continue
+            endpoints.append(
+                Endpoint(
+                    name=item.get("name", f"{default_name}-{i}"),
+                    base_url=base_url,
+                    api_key=item.get("api_key", default_api_key),
+                    model=item.get("model", default_model),
+                )
+            )
+
+        if not endpoints and default_base_url:
+            endpoints.append(
+                Endpoint(default_name, default_base_url, default_api_key, default_model)
+            )
+
+        router = cls(
+            endpoints,
+            ewma_alpha=get_value("llm.router", "ewma_alpha", 0.3),
+            hedge=get_value("llm.router", "hedge", False),
+            hedge_min_samples=get_value("llm.router", "hedge_min_samples", 20),
+        )
+        logger.info(
+            f"LLM路由器 [{section}] 初始化完成，端点: "
+            f"{', '.join(endpoint.name for endpoint in endpoints)}"
+        )
+        return router
+
+    def ranked(self, exclude: Set[str] = frozenset()) -> List[Endpoint]:
+        """按评分排序的可用端点（排除已尝试过的）"""
+        candidates = [
+            endpoint
+            for endpoint in self.endpoints
+            if endpoint.name not in exclude and endpoint.available()
+        ]
+        return sorted(candidates, key=lambda endpoint: endpoint.score())
+
+    async def _attempt(
+        self, endpoint: Endpoint, operation: Callable[[Endpoint], Awaitable[Any]]
+    ) -> Any:
+        """在指定端点上执行一次请求，并更新统计、熔断器和指标"""
+        metrics = get_metrics()
+        if endpoint.breaker is not None and not endpoint.breaker.allow_request():
+            metrics.increment("llm.attempts", endpoint=endpoint.name, outcome="circuit_open")
+            raise CircuitOpenError(endpoint.name, endpoint.breaker.retry_in())
+
+        endpoint.inflight += 1
+        started = time.monotonic()
+        try:
+            result = await operation(endpoint)
+        except asyncio.CancelledError:
+            # 对冲请求中落败的一方被取消，不计入端点健康状况
+            if endpoint.breaker is not None:
+                endpoint.breaker.release()
+            metrics.increment("llm.attempts", endpoint=endpoint.name, outcome="cancelled")
+            raise
+        except Exception as e:
+            if endpoint.breaker is not None:
+                if is_endpoint_failure(e):
+                    endpoint.breaker.record_failure()
+                else:
+                    endpoint.breaker.release()
+            metrics.increment(
+                "llm.attempts",
+                endpoint=endpoint.name,
+                outcome="error",
+                status=getattr(e, "status", "network"),
+            )
+            raise
+        finally:
+            endpoint.inflight -= 1
+
+        latency = time.monotonic() - started
+        endpoint.record_latency(latency, self.ewma_alpha)
+        if endpoint.breaker is not None:
+            endpoint.breaker.record_success()
+        metrics.increment("llm.attempts", endpoint=endpoint.name, outcome="success")
+        metrics.observe("llm.attempt_latency", latency, endpoint=endpoint.name)
+        return result
+
+    async def _hedged_attempt(
+        self,
+        primary: Endpoint,
+        backup: Endpoint,
+        operation: Callable[[Endpoint], Awaitable[Any]],
+        delay: float,
+        tried: Set[str],
+    ) -> Any:
+        """对冲请求：主端点超过delay未返回时向备用端点发送重复请求，取先成功者
+
+        只有真正发出对冲请求时才将备用端点记入tried。
+        """
+        metrics = get_metrics()
+        primary_task = asyncio.ensure_future(self._attempt(primary, operation))
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done:
+            return primary_task.result()
+
+        logger.info(f"端点 {primary.name} 超过p95延迟 {delay:.2f}秒，向 {backup.name} 发送对冲请求")
+        metrics.increment("llm.hedged", endpoint=backup.name)
+        tried.add(backup.name)
+        backup_task = asyncio.ensure_future(self._attempt(backup, operation))
+        pending = {primary_task, backup_task}
+        last_error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup_task:
+                            metrics.increment("llm.hedge_wins", endpoint=backup.name)
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def execute(
+        self,
+        operation: Callable[[Endpoint], Awaitable[Any]],
+        is_retryable: Callable[[BaseException], bool],
+        hedge: bool = True,
+    ) -> Any:
+        """执行一轮请求：按评分依次尝试端点，端点故障时立即切换
+
+        Args:
+            operation: 以端点为参数的异步请求操作
+            is_retryable: 判断错误是否可以换端点重试
+            hedge: 本次请求是否允许对冲（流式请求不对冲）
+
+        Returns:
+            操作的返回值
+
+        Raises:
+            CircuitOpenError: 所有端点都处于熔断状态
+            Exception: 不可重试的错误，或本轮所有端点都失败时的最后一个错误
+        """
+        tried: Set[str] = set()
+        last_error: Optional[BaseException] = None
+
+        while True:
+            ranked = self.ranked(tried)
+            if not ranked:
+                if last_error is not None:
+                    raise last_error
+                # 所有端点均熔断
+                retry_in = min(
+                    (e.breaker.retry_in() for e in self.endpoints if e.breaker is not None),
+                    default=0.0,
+                )
+                raise CircuitOpenError(",".join(e.name for e in self.endpoints), retry_in)
+
+            primary = ranked[0]
+            tried.add(primary.name)
+            try:
+                p95 = primary.p95()
+                if (
+                    hedge
+                    and self.hedge
+                    and len(ranked) > 1
+                    and p95 is not None
+                    and len(primary.latencies) >= self.hedge_min_samples
+                ):
+                    return await self._hedged_attempt(
+                        primary, ranked[1], operation, p95, tried
+                    )
+                return await self._attempt(primary, operation)
+            except Exception as e:
+                if not is_retryable(e) and not isinstance(e, CircuitOpenError):
+                    raise
+                last_error = e
+                if self.ranked(tried):
+                    logger.warning(f"端点 {primary.name} 请求失败: {str(e)}，切换到下一个端点")
+                    get_metrics().increment("llm.failover", endpoint=primary.name)
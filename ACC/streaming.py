@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+"""ACC流式响应处理模块
+
+该模块负责:
+1. 增量解析模型输出中的JSON对象，顶层字段一旦完整即可取用
+2. 累积SSE流中的增量内容，还原为与非流式接口一致的响应结构
+3. 在 function/value/tool_value 就绪时通知调用方提前分发
+"""
+
+import asyncio
+import json
+import logging
+from typing import Dict, Any, List, Optional, AsyncIterator, Callable
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 分发所需的字段（calls 为同一轮并行执行的多个工具调用）
+DISPATCH_FIELDS = ("function", "value", "tool_value", "calls")
+
+
+class IncrementalJSONParser:
+    """增量JSON解析器
+
+    逐段接收文本，定位第一个顶层JSON对象（兼容 ```json 代码块），
+    每当一个顶层字段的值完整时立即解析并记录，无需等待整个对象结束。
+    """
+
+    def __init__(self, on_field: Optional[Callable[[str, Any], None]] = None):
+        """初始化解析器
+
+        Args:
+            on_field: 可选回调，顶层字段完成时以 (字段名, 值) 调用
+        """
+        self.on_field = on_field
+        # 已完成解析的顶层字段
+        self.fields: Dict[str, Any] = {}
+        # 顶层对象是否已经闭合
+        self.complete = False
+
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # 顶层键值解析状态
+        self._key_start: Optional[int] = None
+        self._current_key: Optional[str] = None
+        self._value_start: Optional[int] = None
+
+    def feed(self, text: str) -> None:
+        """追加一段文本并继续解析
+
+        Args:
+            text: 新到达的文本片段
+        """
+        if self.complete or not text:
+            return
+        self._buffer += text
+        buffer = self._buffer
+
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            pos = self._pos
+            self._pos += 1
+
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    # 顶层键结束
+                    if self._depth == 1 and self._value_start is None and self._key_start is not None:
+                        self._current_key = self._decode(buffer[self._key_start:pos + 1])
+                        self._key_start = None
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._value_start is None and self._current_key is None:
+                    self._key_start = pos
+            elif char == ":" and self._depth == 1 and self._current_key is not None and self._value_start is None:
+                self._value_start = self._pos
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_value(buffer, pos)
+                    self.complete = True
+                    return
+            elif char == "," and self._depth == 1:
+                self._finish_value(buffer, pos)
+
+    def _finish_value(self, buffer: str, end: int) -> None:
+        """结束当前顶层字段的值并记录"""
+        if self._current_key is None or self._value_start is None:
+            self._current_key = None
+            self._value_start = None
+            return
+
+        key = self._current_key
+        raw_value = buffer[self._value_start:end].strip()
+        self._current_key = None
+        self._value_start = None
+
+        try:
+            value = json.loads(raw_value)
+        except json.JSONDecodeError:
+            logger.debug(f"流式解析字段失败: {key} = {raw_value[:50]}")
+            return
+
+        self.fields[key] = value
+        if self.on_field:
+            self.on_field(key, value)
+
+    @staticmethod
+    def _decode(raw: str) -> Optional[str]:
+        """解码JSON字符串字面量"""
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+
+    def dispatch_ready(self) -> bool:
+        """判断分发所需字段是否已经就绪
+
+        function 与 value 完整即可分发；use_tool 还需要 calls 完整，
+        或 tool_value 完整且其后已开始其他字段（如 plan、status），或整个对象已闭合。
+        模型通常先输出 tool_value 再输出 calls，只有 tool_value 时不能确定后面没有 calls。
+        """
+        if "function" not in self.fields or "value" not in self.fields:
+            return False
+        if self.fields["function"] == "use_tool":
+            if "calls" in self.fields or self.complete:
+                return True
+            if "tool_value" not in self.fields:
+                return False
+            keys = list(self.fields)
+            later = keys[keys.index("tool_value") + 1:]
+            if self._current_key is not None:
+                later.append(self._current_key)
+            return any(key not in DISPATCH_FIELDS for key in later)
+        return True
+
+    def dispatch_fields(self) -> Dict[str, Any]:
+        """返回当前已就绪的分发字段"""
+        return {key: self.fields[key] for key in DISPATCH_FIELDS if key in self.fields}
+
+
+class StreamingCompletion:
+    """单次流式补全
+
+    在后台消费SSE事件，累积文本与工具调用增量，并在分发字段就绪时发出通知。
+    """
+
+    def __init__(self, events: AsyncIterator[str], debug: bool = False):
+        """初始化流式补全
+
+        Args:
+            events: SSE data字段内容的异步迭代器
+            debug: 是否输出调试日志
+        """
+        self.debug = debug
+        self.parser = IncrementalJSONParser(on_field=self._on_field)
+        self.content_parts: List[str] = []
+        self.tool_calls: Dict[int, Dict[str, Any]] = {}
+        self.finish_reason: Optional[str] = None
+        self.usage: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+
+        self._events = events
+        self._dispatch_event = asyncio.Event()
+        self._task = asyncio.ensure_future(self._consume())
+
+    def _on_field(self, key: str, value: Any) -> None:
+        """顶层字段完成回调"""
+        if self.debug:
+            logger.debug(f"流式字段就绪: {key}")
+        if self.parser.dispatch_ready():
+            self._dispatch_event.set()
+
+    async def _consume(self) -> None:
+        """消费SSE事件直到流结束"""
+        try:
+            async for data in self._events:
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    logger.debug(f"忽略无法解析的SSE数据: {data[:80]}")
+                    continue
+                self._apply_chunk(chunk)
+        except Exception as e:
+            self.error = e
+            logger.error(f"读取流式响应时出错: {str(e)}")
+        finally:
+            self._dispatch_event.set()
+
+    def _apply_chunk(self, chunk: Dict[str, Any]) -> None:
+        """合并一个增量数据块"""
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+            text = delta.get("content")
+            if text:
+                self.content_parts.append(text)
+                self.parser.feed(text)
+
+            for tool_delta in delta.get("tool_calls") or []:
+                index = tool_delta.get("index", 0)
+                tool_call = self.tool_calls.setdefault(
+                    index,
+                    {"id": None, "type": "function", "function": {"name": "", "arguments": ""}},
+                )
+                if tool_delta.get("id"):
+                    tool_call["id"] = tool_delta["id"]
+                function = tool_delta.get("function") or {}
+                if function.get("name"):
+                    tool_call["function"]["name"] += function["name"]
+                if function.get("arguments"):
+                    tool_call["function"]["arguments"] += function["arguments"]
+
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+
+    async def wait_dispatch(self) -> Optional[Dict[str, Any]]:
+        """等待分发字段就绪
+
+        Returns:
+            分发字段字典；如果流结束时仍未就绪则返回None
+        """
+        await self._dispatch_event.wait()
+        if self.parser.dispatch_ready() and not self.tool_calls:
+            return self.parser.dispatch_fields()
+        return None
+
+    async def wait_done(self) -> Dict[str, Any]:
+        """等待流结束并返回与非流式接口一致的响应结构
+
+        Raises:
+            Exception: 读取流时发生的错误
+        """
+        await self._task
+        if self.error is not None and not self.content_parts and not self.tool_calls:
+            raise self.error
+        return self.to_response()
+
+    def to_response(self) -> Dict[str, Any]:
+        """将已累积内容还原为非流式响应结构"""
+        message: Dict[str, Any] = {
+            "role": "assistant",
+            "content": "".join(self.content_parts),
+        }
+        if self.tool_calls:
+            message["tool_calls"] = [self.tool_calls[i] for i in sorted(self.tool_calls)]
+
+        response: Dict[str, Any] = {
+            "choices": [{"message": message, "finish_reason": self.finish_reason}]
+        }
+        if self.usage:
+            response["usage"] = self.usage
+        return response
@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+
+"""ACC token计量与上下文预算模块
+
+该模块负责:
+1. 离线估算消息的token数（无需联网或额外依赖）
+2. 维护常见模型的上下文窗口大小
+3. 请求发送前按上下文预算裁剪最早的非固定消息
+4. 按轮次记录服务端返回的usage字段
+"""
+
+import logging
+import re
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+from .config import get_value
+from .metrics import get_metrics
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 常见模型的上下文窗口（token数），按模型名前缀匹配，最长前缀优先
+CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-5": 400000,
+    "o1": 200000,
+    "o3": 200000,
+    "o4-mini": 200000,
+    "claude": 200000,
+    "gemini-1.5": 1048576,
+    "gemini-2": 1048576,
+    "deepseek": 65536,
+    "qwen": 131072,
+    "glm-4": 128000,
+    "moonshot-v1-8k": 8192,
+    "moonshot-v1-32k": 32768,
+    "moonshot-v1-128k": 131072,
+}
+
+# 未知模型的默认上下文窗口
+DEFAULT_CONTEXT_WINDOW = 32768
+
+# 未配置 max_tokens 时为输出预留的token数
+DEFAULT_OUTPUT_RESERVE = 4096
+
+# 每条消息的格式开销与回复引导开销（与OpenAI的计算方式一致）
+MESSAGE_OVERHEAD = 4
+REPLY_PRIMING = 3
+
+# 单张图片的估算token数
+IMAGE_TOKENS = 765
+
+# 中日韩字符大致按一个字符一个token计算
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+
+def estimate_text_tokens(text: str) -> int:
+    """估算一段文本的token数
+
+    中日韩字符每个按1个token计算，其余字符按约4个字符1个token计算。
+
+    Args:
+        text: 文本内容
+
+    Returns:
+        估算的token数
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def estimate_message_tokens(message: Dict[str, Any]) -> int:
+    """估算单条消息的token数（包含格式开销）
+
+    Args:
+        message: OpenAI格式的消息，content可以是字符串或内容对象列表
+
+    Returns:
+        估算的token数
+    """
+    tokens = MESSAGE_OVERHEAD
+    content = message.get("content")
+    if isinstance(content, str):
+        tokens += estimate_text_tokens(content)
+    elif isinstance(content, list):
+        for part in content:
+            if not isinstance(part, dict):
+                tokens += estimate_text_tokens(str(part))
+            elif part.get("type") == "image_url":
+                tokens += IMAGE_TOKENS
+            else:
+                tokens += estimate_text_tokens(part.get("text", ""))
+    elif content is not None:
+        tokens += estimate_text_tokens(str(content))
+
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function") or {}
+        tokens += estimate_text_tokens(function.get("name", ""))
+        tokens += estimate_text_tokens(function.get("arguments", ""))
+    return tokens
+
+
+def estimate_messages_tokens(messages: List[Dict[str, Any]]) -> int:
+    """估算消息列表的总token数"""
+    return sum(estimate_message_tokens(message) for message in messages) + REPLY_PRIMING
+
+
+def get_context_window(model: Optional[str]) -> int:
+    """查询模型的上下文窗口大小
+
+    [llm] context_window 配置优先；否则按模型名前缀查表（忽略 "openai/" 之类的供应商前缀）。
+
+    Args:
+        model: 模型名称
+
+    Returns:
+        上下文窗口的token数
+    """
+    configured = get_value("llm", "context_window")
+    if configured:
+        return int(configured)
+
+    name = (model or "").lower().rsplit("/", 1)[-1]
+    best = None
+    for prefix in CONTEXT_WINDOWS:
+        if name.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    if best is None:
+        return DEFAULT_CONTEXT_WINDOW
+    return CONTEXT_WINDOWS[best]
+
+
+def _has_tool_calls(message: Dict[str, Any]) -> bool:
+    """是否为发起工具调用的助手消息"""
+    return message.get("role") == "assistant" and bool(message.get("tool_calls"))
+
+
+def _starts_turn(message: Dict[str, Any]) -> bool:
+    """消息是否为可单独删除的轮次起点"""
+    return message.get("role") == "user" or _has_tool_calls(message)
+
+
+def _prepend_note(message: Dict[str, Any], note: str) -> Dict[str, Any]:
+    """返回在内容开头加上说明的消息副本（不修改原消息）"""
+    content = message.get("content")
+    if isinstance(content, list):
+        return dict(message, content=[{"type": "text", "text": note}] + content)
+    return dict(message, content=f"{note}\n\n{content or ''}")
+
+
+class ContextBudgeter:
+    """上下文预算器
+
+    发送前估算请求的token数，超出预算时按轮次删除最早的非固定消息。
+    系统消息和最后一条消息（本轮输入）始终保留；被删除的消息用一条说明代替。
+    裁剪只作用于本次请求，不修改历史记录。
+    """
+
+    def __init__(self, context_window: int, output_reserve: int, safety_margin: float = 0.05):
+        """初始化上下文预算器
+
+        Args:
+            context_window: 模型上下文窗口（token数）
+            output_reserve: 为输出预留的token数
+            safety_margin: 为估算误差预留的比例（0~1）
+        """
+        self.context_window = context_window
+        self.output_reserve = output_reserve
+        self.safety_margin = min(max(safety_margin, 0.0), 0.5)
+        self.input_budget = max(
+            0, int(context_window * (1 - self.safety_margin)) - output_reserve
+        )
+
+    @classmethod
+    def from_config(cls, model: Optional[str], max_tokens: Optional[int]) -> "ContextBudgeter":
+        """根据模型和 [llm] 配置创建预算器
+
+        Args:
+            model: 模型名称
+            max_tokens: 配置的最大输出token数，最多占用上下文窗口的一半
+        """
+        context_window = get_context_window(model)
+        output_reserve = int(max_tokens) if max_tokens else DEFAULT_OUTPUT_RESERVE
+        output_reserve = min(output_reserve, context_window // 2)
+        budgeter = cls(
+            context_window,
+            output_reserve,
+            safety_margin=get_value("llm", "context_safety_margin", 0.05),
+        )
+        logger.info(
+            f"上下文预算: 窗口 {context_window}，输出预留 {output_reserve}，"
+            f"输入预算 {budgeter.input_budget} tokens"
+        )
+        return budgeter
+
+    def fit(
+        self, messages: List[Dict[str, Any]], costs: Optional[List[int]] = None
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """将消息列表裁剪到输入预算以内
+
+        Args:
+            messages: 本次请求的消息列表
+            costs: 可选的每条消息token估算（如历史记录层缓存的值），未提供时现场估算
+
+        Returns:
+            (裁剪后的消息列表, 估算的输入token数)
+        """
+        if costs is None:
+            costs = [estimate_message_tokens(message) for message in messages]
+        total = sum(costs) + REPLY_PRIMING
+        metrics = get_metrics()
+        metrics.observe("llm.estimated_prompt_tokens", total)
+        if total <= self.input_budget:
+            return messages, total
+
+        # 最后一条消息必须保留；它是工具结果时，发起这些调用的助手消息及其间的工具结果也必须保留，
+        # 否则请求中会出现没有对应 tool_calls 的工具消息
+        keep_from = len(messages) - 1
+        while keep_from > 0 and messages[keep_from].get("role") == "tool":
+            keep_from -= 1
+        if keep_from == len(messages) - 1 or not _has_tool_calls(messages[keep_from]):
+            keep_from = len(messages) - 1
+        removable = [
+            i for i, message in enumerate(messages[:keep_from])
+            if message.get("role") != "system"
+        ]
+
+        # 按轮次删除：每次删除从最早的消息到下一个轮次起点（用户消息，或带 tool_calls 的助手消息）之前的全部消息，
+        # 助手的工具调用与其工具结果一起删除，避免留下没有对应请求的助手回复或工具结果
+        dropped = set()
+        note = self._elision_note(0)
+        budget = self.input_budget - estimate_message_tokens(note)
+        position = 0
+        while total > budget and position < len(removable):
+            index = removable[position]
+            dropped.add(index)
+            total -= costs[index]
+            position += 1
+            while position < len(removable) and not _starts_turn(messages[removable[position]]):
+                dropped.add(removable[position])
+                total -= costs[removable[position]]
+                position += 1
+
+        if not dropped:
+            return messages, total
+
+        note = self._elision_note(len(dropped))
+        total += estimate_message_tokens(note)
+        fitted = []
+        pending_note = False
+        inserted = False
+        for i, message in enumerate(messages):
+            if i in dropped:
+                if not inserted:
+                    pending_note = inserted = True
+                continue
+            if pending_note:
+                pending_note = False
+                if message.get("role") == "user":
+                    # 紧接着的是用户消息时合并到其开头，避免连续两条用户消息
+                    message = _prepend_note(message, note["content"])
+                else:
+                    fitted.append(note)
+            fitted.append(message)
+
+        metrics.increment("llm.context_trimmed_messages", len(dropped))
+        if total > self.input_budget:
+            logger.warning(
+                f"裁剪后请求仍超出上下文预算: {total}/{self.input_budget} tokens"
+            )
+        else:
+            logger.info(
+                f"请求超出上下文预算，已省略最早的 {len(dropped)} 条消息，"
+                f"估算输入 {total}/{self.input_budget} tokens"
+            )
+        return fitted, total
+
+    @staticmethod
+    def _elision_note(count: int) -> Dict[str, Any]:
+        """代替被省略消息的说明
+
+        以用户消息发送：部分兼容接口不接受不在开头的系统消息，且开头的系统提示词需要保持不变以命中前缀缓存。
+        """
+        return {
+            "role": "user",
+            "content": f"[为控制上下文长度，已省略较早的 {count} 条对话记录]",
+        }
+
+
+class UsageTracker:
+    """按轮次记录服务端返回的token用量"""
+
+    def __init__(self, max_turns: int = 1000):
+        """初始化用量记录器
+
+        Args:
+            max_turns: 最多保留的轮次记录数
+        """
+        self.turns = deque(maxlen=max_turns)
+        self.totals = {
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_tokens": 0,
+            "total_tokens": 0,
+        }
+
+    def record(
+        self, usage: Optional[Dict[str, Any]], estimated_prompt_tokens: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """记录一轮请求的用量
+
+        Args:
+            usage: 响应中的usage字段
+            estimated_prompt_tokens: 本地估算的输入token数，用于校准估算误差
+
+        Returns:
+            本轮的用量记录；响应不含usage时返回None
+        """
+        if not usage:
+            return None
+
+        details = usage.get("prompt_tokens_details") or {}
+        turn = {
+            "prompt_tokens": usage.get("prompt_tokens", 0) or 0,
+            "completion_tokens": usage.get("completion_tokens", 0) or 0,
+            "cached_tokens": details.get("cached_tokens", 0) or 0,
+            "total_tokens": usage.get("total_tokens", 0) or 0,
+            "estimated_prompt_tokens": estimated_prompt_tokens,
+        }
+        self.turns.append(turn)
+        for key in self.totals:
+            self.totals[key] += turn[key]
+
+        metrics = get_metrics()
+        metrics.observe("llm.usage.prompt_tokens", turn["prompt_tokens"])
+        metrics.observe("llm.usage.completion_tokens", turn["completion_tokens"])
+        metrics.observe("llm.usage.cached_tokens", turn["cached_tokens"])
+        if estimated_prompt_tokens and turn["prompt_tokens"]:
+            metrics.observe(
+                "llm.usage.estimate_ratio", estimated_prompt_tokens / turn["prompt_tokens"]
+            )
+
+        logger.info(
+            f"本轮token用量: 输入 {turn['prompt_tokens']}（缓存 {turn['cached_tokens']}），"
+            f"输出 {turn['completion_tokens']}，预估输入 {estimated_prompt_tokens}"
+        )
+        return turn
+
+
+# 创建全局用量记录器实例
+_usage_tracker = None
+
+
+def get_usage_tracker() -> UsageTracker:
+    """获取用量记录器实例
+
+    Returns:
+        用量记录器实例
+    """
+    global _usage_tracker
+    if _usage_tracker is None:
+        _usage_tracker = UsageTracker()
+    return _usage_tracker
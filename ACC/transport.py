@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+"""ACC HTTP传输模块
+
+该模块负责:
+1. 维护基于aiohttp的长连接池，主模型与视觉模型端点共享同一个连接池
+2. 提供可等待的JSON请求接口，请求进行中事件循环可以继续调度其他任务
+3. 提供流式（SSE）响应读取接口
+4. 为同步调用方提供后台事件循环，保证同步包装同样复用长连接
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from typing import Dict, Any, Optional, Coroutine, AsyncIterator, Union
+
+import aiohttp
+
+from .config import get_value
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+
+class HTTPStatusError(Exception):
+    """服务端返回了非2xx状态码"""
+
+    def __init__(self, status: int, body: str, headers: Optional[Dict[str, str]] = None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+        super().__init__(f"HTTP {status}: {body[:500]}")
+
+
+class TransportResponse:
+    """HTTP响应结果（已读取完整响应体）"""
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def text(self) -> str:
+        """以UTF-8解码响应体"""
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        """将响应体解析为JSON对象"""
+        return json.loads(self.body)
+
+
+class StreamResponse:
+    """流式HTTP响应，按行读取SSE数据"""
+
+    def __init__(self, response: aiohttp.ClientResponse):
+        self._response = response
+        self.status = response.status
+        self.headers = dict(response.headers)
+
+    async def sse_data(self) -> AsyncIterator[str]:
+        """逐条产出SSE事件中的data字段内容
+
+        忽略注释行和非data字段，遇到 [DONE] 结束。
+        """
+        try:
+            async for raw_line in self._response.content:
+                line = raw_line.decode("utf-8", errors="replace").strip()
+                if not line or line.startswith(":") or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                yield data
+        finally:
+            self.release()
+
+    def release(self) -> None:
+        """释放连接回连接池"""
+        self._response.release()
+
+
+def _body_arguments(payload: Union[Dict[str, Any], bytes]) -> Dict[str, Any]:
+    """根据请求体类型生成aiohttp的参数：字节串原样发送，字典由aiohttp序列化"""
+    if isinstance(payload, bytes):
+        return {"data": payload}
+    return {"json": payload}
+
+
+class HTTPTransport:
+    """异步HTTP传输层
+
+    每个事件循环持有一个共享的 aiohttp.ClientSession，连接在请求之间保持复用，
+    避免每轮对话都重新建立TCP+TLS连接。
+    """
+
+    def __init__(self):
+        """初始化传输层"""
+        # 连接池配置
+        self.pool_size = get_value("llm", "pool_size", 10)
+        self.keepalive_timeout = get_value("llm", "keepalive_timeout", 60)
+        # 请求超时配置（秒）
+        self.timeout = get_value("llm", "timeout", 300)
+        self.connect_timeout = get_value("llm", "connect_timeout", 10)
+
+        # 事件循环 -> 会话
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        # 同步包装使用的后台事件循环
+        self._sync_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sync_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        logger.info(
+            f"HTTP传输层初始化完成，连接池大小: {self.pool_size}，"
+            f"请求超时: {self.timeout}秒"
+        )
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取当前事件循环对应的会话，不存在时创建"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.timeout, sock_connect=self.connect_timeout
+            )
+            session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self._sessions[loop] = session
+            logger.debug("已为当前事件循环创建新的HTTP连接池")
+        return session
+
+    async def post_json(
+        self, url: str, headers: Dict[str, str], payload: Union[Dict[str, Any], bytes]
+    ) -> TransportResponse:
+        """发送JSON POST请求并读取完整响应
+
+        Args:
+            url: 请求地址
+            headers: 请求头
+            payload: 请求体，可以是字典或已序列化的JSON字节串
+
+        Returns:
+            响应结果，调用方负责检查状态码
+
+        Raises:
+            aiohttp.ClientError: 网络错误
+            asyncio.TimeoutError: 请求超时
+        """
+        session = self._get_session()
+        async with session.post(url, headers=headers, **_body_arguments(payload)) as response:
+            body = await response.read()
+            return TransportResponse(response.status, dict(response.headers), body)
+
+    async def open_stream(
+        self, url: str, headers: Dict[str, str], payload: Union[Dict[str, Any], bytes]
+    ) -> StreamResponse:
+        """发送JSON POST请求并返回流式响应
+
+        Args:
+            url: 请求地址
+            headers: 请求头
+            payload: 请求体，可以是字典或已序列化的JSON字节串（调用方负责设置 stream: true）
+
+        Returns:
+            流式响应，调用方需读取完毕或调用release
+
+        Raises:
+            HTTPStatusError: 服务端返回非2xx状态码
+            aiohttp.ClientError: 网络错误
+            asyncio.TimeoutError: 请求超时
+        """
+        session = self._get_session()
+        response = await session.post(url, headers=headers, **_body_arguments(payload))
+        if response.status >= 400:
+            body = await response.read()
+            response.release()
+            raise HTTPStatusError(
+                response.status,
+                body.decode("utf-8", errors="replace"),
+                dict(response.headers),
+            )
+        return StreamResponse(response)
+
+    def _ensure_sync_loop(self) -> asyncio.AbstractEventLoop:
+        """启动（或复用）同步包装使用的后台事件循环线程"""
+        with self._lock:
+            if self._sync_loop is None or self._sync_loop.is_closed():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="ACC-LLM-Transport", daemon=True
+                )
+                thread.start()
+                self._sync_loop = loop
+                self._sync_thread = thread
+            return self._sync_loop
+
+    def in_sync_loop(self) -> bool:
+        """当前是否运行在同步包装使用的后台事件循环线程中"""
+        return self._sync_thread is not None and threading.current_thread() is self._sync_thread
+
+    def run_sync(self, coro: Coroutine) -> Any:
+        """在后台事件循环中运行协程并阻塞等待结果
+
+        同步API只是该方法的薄包装。后台循环常驻，因此同步调用同样复用长连接。
+
+        Args:
+            coro: 要运行的协程
+
+        Returns:
+            协程的返回值
+        """
+        loop = self._ensure_sync_loop()
+        if threading.current_thread() is self._sync_thread:
+            coro.close()
+            raise RuntimeError("不能在传输层后台线程中调用同步接口")
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        return future.result()
+
+    async def close(self) -> None:
+        """关闭当前事件循环的会话以及后台事件循环"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.pop(loop, None)
+        if session is not None and not session.closed:
+            await session.close()
+
+        with self._lock:
+            sync_loop = self._sync_loop
+            self._sync_loop = None
+            self._sync_thread = None
+        if sync_loop is not None and not sync_loop.is_closed():
+            sync_session = self._sessions.pop(sync_loop, None)
+            if sync_session is not None and not sync_session.closed:
+                future = asyncio.run_coroutine_threadsafe(sync_session.close(), sync_loop)
+                await asyncio.wrap_future(future)
+            sync_loop.call_soon_threadsafe(sync_loop.stop)
+
+        logger.info("HTTP连接池已关闭")
+
+
+# 创建全局传输层实例
+_transport = None
+
+
+def get_transport() -> HTTPTransport:
+    """获取HTTP传输层实例
+
+    Returns:
+        HTTP传输层实例
+    """
+    global _transport
+    if _transport is None:
+        _transport = HTTPTransport()
+    return _transport
+
+
+async def close_transport() -> None:
+    """关闭全局HTTP传输层（程序退出时调用）"""
+    global _transport
+    if _transport is not None:
+        await _transport.close()
+        _transport = None
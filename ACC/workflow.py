@@ -13,7 +13,7 @@ import os
 from typing import Dict, Any, List, Optional
 
 from ACC.config import get_value
-from ACC.llm import send_message
+from ACC.llm import send_message, send_message_async
 from ACC.prompt import SYSTEM_PROMPT  # 添加导入SYSTEM_PROMPT
 
 # 配置日志记录器
@@ -60,6 +60,9 @@ class WorkflowManager:
         user_input: str,
         system_prompt: Optional[str] = None,
         user_status: str = "user_message",
+        volatile_context: Optional[str] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_results: Optional[Dict[str, str]] = None,
     ) -> Dict[str, Any]:
         """启动工作流程
 
@@ -67,6 +70,9 @@ class WorkflowManager:
             user_input: 用户输入
             system_prompt: 可选的自定义系统提示词
             user_status: 用户状态名称，默认为"user_message"
+            volatile_context: 可选的易变上下文（时间等），附加在本次请求末尾且不写入历史
+            tools: 可选的函数定义（原生工具调用模式），默认使用 self.tools
+            tool_results: 可选的并行工具调用结果（工具调用ID -> 结果文本）
 
         Returns:
             工作流程结果
@@ -75,10 +81,42 @@ class WorkflowManager:
         prompt = system_prompt or SYSTEM_PROMPT
 
         # 发送消息到LLM，添加用户状态参数
-        response = send_message(prompt, user_input, self.tools, user_status=user_status)
+        response = send_message(
+            prompt,
+            user_input,
+            tools if tools is not None else self.tools,
+            user_status=user_status,
+            volatile_context=volatile_context,
+            tool_results=tool_results,
+        )
 
         return response
 
+    async def start_async(
+        self,
+        user_input: str,
+        system_prompt: Optional[str] = None,
+        user_status: str = "user_message",
+        volatile_context: Optional[str] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_results: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        """启动工作流程（异步版本，在当前事件循环中等待LLM响应）
+
+        参数与 start 相同。
+
+        Returns:
+            工作流程结果
+        """
+        return await send_message_async(
+            system_prompt or SYSTEM_PROMPT,
+            user_input,
+            tools if tools is not None else self.tools,
+            user_status=user_status,
+            volatile_context=volatile_context,
+            tool_results=tool_results,
+        )
+
     def execute_step(self, step_data: Dict[str, Any]) -> Dict[str, Any]:
         """执行工作流程步骤
 
@@ -8,6 +8,7 @@
 3. 提供系统级的工具函数
 """
 
+import atexit
 import logging
 import os
 from typing import Dict, Any
@@ -15,6 +16,7 @@ from typing import Dict, Any
 from ACC import load_config, get_config
 from ACC.agent import get_acc_agent
 from ACC.workflow import get_workflow_manager
+from ACC.memory import close_history
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
@@ -38,6 +40,9 @@ def initialize_system() -> Dict[str, Any]:
     acc_agent = get_acc_agent()
     logger.info("ACC代理初始化成功")
 
+    # 进程退出时写完后台队列中的历史记录（重复调用无副作用）
+    atexit.register(shutdown_system)
+
     # 返回系统状态
     return {
         "config": config,
@@ -47,6 +52,16 @@ def initialize_system() -> Dict[str, Any]:
     }
 
 
+def shutdown_system() -> None:
+    """关闭系统
+
+    写完后台队列中的历史记录并关闭各会话的历史记录写入线程与存储（不涉及日志文件）。
+    initialize_system 会将其注册为进程退出时的清理函数，也可以提前显式调用。
+    """
+    close_history()
+    logger.info("历史记录已保存")
+
+
 def get_workspace_path() -> str:
     """获取工作空间路径
 
@@ -9,6 +9,9 @@ import datetime
 from ACC.interaction.cli import show_welcome_message
 from ACC.system.initializer import initialize
 from ACC.core.runner import run_main_loop
+from ACC.transport import close_transport
+from ACC.metrics import get_metrics
+from ACC.memory import close_history
 
 # 配置全局日志系统
 # DEBUG级别记录所有日志，同时输出到文件和控制台
@@ -66,6 +69,18 @@ async def async_main():
             error_msg = f"关闭连接时出错: {str(e)}"
             logging.error(error_msg)
             print(error_msg)
+        # 关闭LLM长连接池
+        try:
+            await close_transport()
+        except Exception as e:
+            logging.error(f"关闭LLM连接池时出错: {str(e)}")
+        # 写完后台队列中的历史记录
+        try:
+            close_history()
+        except Exception as e:
+            logging.error(f"保存历史记录时出错: {str(e)}")
+        # 输出本次运行的指标汇总
+        get_metrics().log_summary()
 
 
 def main():
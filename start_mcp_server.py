@@ -47,6 +47,7 @@ logger = logging.getLogger("MCP_SERVER")
 # 导入MCP相关模块
 from ACC.mcp import MCPManager
 from ACC.core.tool_discovery import ToolDiscovery
+from ACC.core.tool_index import ToolIndex
 
 # 在导入部分之后，全局变量定义之前添加这两个函数
 
@@ -78,6 +79,8 @@ def replace_username_in_config(config, username):
 mcp_manager = None
 server_processes = {}
 tool_registry = {}
+# 工具注册表索引（注册表更新时重建）
+tool_index = ToolIndex(tool_registry)
 
 # API服务器配置
 API_HOST = "127.0.0.1"
@@ -106,7 +109,7 @@ async def wait_for_sse_server(host, port, max_retries=10, retry_interval=1.0):
 
 async def discover_tools(mcp_manager):
     """发现并注册所有可用工具"""
-    global tool_registry
+    global tool_registry, tool_index
     
     logger.info("开始发现MCP服务器工具...")
     
@@ -127,6 +130,7 @@ async def discover_tools(mcp_manager):
     
     # 保存工具注册表
     tool_registry = discover.tool_registry
+    tool_index = ToolIndex(tool_registry)
     
     logger.info(f"工具发现完成，共发现 {len(tool_registry)} 个工具")
     
@@ -452,19 +456,11 @@ async def handle_call_tool(request):
         found_tool = None
         found_tool_info = None
         
-        # 1. 首先尝试直接匹配完整工具ID
-        if tool_name in tool_registry:
-            found_tool = tool_name
-            found_tool_info = tool_registry[tool_name]
-        else:
-            # 2. 尝试查找不带服务器ID前缀的工具名称
-            for registry_tool_name, registry_tool_info in tool_registry.items():
-                # 检查工具名称是否匹配（忽略服务器ID前缀）
-                if registry_tool_name.endswith(f":{tool_name}") or registry_tool_name.split(":")[-1] == tool_name:
-                    found_tool = registry_tool_name
-                    found_tool_info = registry_tool_info
-                    logger.debug(f"找到匹配工具: {found_tool}，原始请求工具名: {tool_name}")
-                    break
+        # 通过索引查找：完整工具ID或不带服务器ID前缀的工具名称
+        resolved = tool_index.resolve(tool_name, fuzzy=False)
+        if resolved:
+            found_tool, found_tool_info, _ = resolved
+            logger.debug(f"找到匹配工具: {found_tool}，原始请求工具名: {tool_name}")
         
         if not found_tool or not found_tool_info:
             return web.json_response({"error": f"工具 {tool_name} 不存在"}, status=404)